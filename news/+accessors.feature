@@ -0,0 +1,2 @@
+How the field behind a keyword index is read and written is decided by ``IKeywordFieldStrategy`` adapters, once per content class and portal_type in a request.
+Register your own adapter to support other kinds of content.
@@ -0,0 +1 @@
+Log every merge, deletion and rule upload in a compact persistent log, with the updated objects and how long it took, and browse it on the new ``prefs_keywords_log`` page.
@@ -0,0 +1,2 @@
+``change()`` and ``delete()`` process objects in chunks of ``config.BATCH_SIZE``.
+Pass ``commit=True`` to commit every chunk, retry chunks that raise a ConflictError and resume an interrupted operation from a persistent checkpoint.
@@ -0,0 +1 @@
+Add a benchmark of the keyword operations and the control panel on generated sites with Zipf-distributed keywords, writing its results as JSON.
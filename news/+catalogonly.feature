@@ -0,0 +1 @@
+Merges and deletes compute every object's new keywords from the keyword index and only load the objects whose keywords actually change.
@@ -0,0 +1 @@
+Keyword counts are now read for the whole index in one pass and cached with the keyword list. The keyword manager can order keywords by how often they are used.
@@ -0,0 +1 @@
+Added a duplicate keywords report, which groups keywords that only differ in case, accents, whitespace or trailing punctuation and merges a group with one click.
@@ -0,0 +1 @@
+Add a "Scroll through all keywords" grid to the Keyword Manager, which fetches the keywords in view from a new ``prefs_keywords_rows`` JSON view.
@@ -0,0 +1,2 @@
+Merges and deletes can be queued to run in the background.
+The ``keywords-worker`` script, or a form posted to the ``prefs_keywords_worker`` view, runs queued operations and ``prefs_keywords_progress`` reports their progress as JSON.
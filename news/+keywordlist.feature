@@ -0,0 +1 @@
+The sorted keyword list of an index is cached until the index changes, and patched instead of rebuilt after merges and deletes.
@@ -0,0 +1 @@
+Lease the keywords of a running merge, deletion, rules upload or revert, so overlapping operations are rejected or wait in the queue instead of conflicting with each other.
@@ -0,0 +1 @@
+Without python-Levenshtein, similar keywords are scored by a built-in bit-parallel matcher giving the same scores as Levenshtein instead of by difflib, so results no longer depend on the installed packages.
@@ -0,0 +1 @@
+The list of managed keyword indexes and the field name behind an index are looked up once per request.
@@ -0,0 +1 @@
+List keywords page by page without copying the whole keyword list, and jump to the keywords starting with a given letter.
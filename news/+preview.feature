@@ -0,0 +1 @@
+Added a preview of renaming or deleting keywords. It shows how many objects of which types would be updated and how long that would take, computed from the catalog indexes without loading any object.
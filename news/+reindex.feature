@@ -0,0 +1,2 @@
+Merges and deletes only reindex ``SearchableText`` for objects whose text index holds the removed keywords.
+Text reindexing can be deferred to the background worker with ``config.DEFERRED_REINDEX`` and the time spent per index can be logged with ``config.TIME_REINDEX``.
@@ -0,0 +1 @@
+Add plone.restapi services to list keywords with cursor pagination, field selection and ETag validation, and to merge or delete keywords. They are only registered if plone.restapi is installed.
@@ -0,0 +1 @@
+Record the keywords each object lost and gained in a logged operation, and revert the operation from the operations log, leaving alone the objects changed since.
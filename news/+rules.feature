@@ -0,0 +1 @@
+Rename and delete rules can be uploaded as a CSV or JSON file and applied in one pass, updating every affected object only once.
@@ -0,0 +1 @@
+On a subsite, the Keyword Manager only lists and counts the keywords of the content below it.
@@ -0,0 +1 @@
+Score similar keywords with a batch scoring engine: the keywords are lowercased once, the similar keywords of a page are scored in one call and large jobs are spread over worker processes.
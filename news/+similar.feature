@@ -0,0 +1 @@
+Similar keywords are now precomputed for the whole index and only loaded when "Show similar keywords" is checked, instead of being scored within each page on every page view.
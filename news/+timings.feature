@@ -0,0 +1 @@
+Time the stages of the keyword operations, notify them as ``IKeywordTimingEvent`` and sum them up on a new "Timings" page of the control panel.
@@ -0,0 +1 @@
+Export the keywords of an index as CSV or JSON Lines, streamed in chunks, and import large keyword lists and rule files as streams.
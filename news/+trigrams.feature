@@ -0,0 +1 @@
+Searching keywords in the control panel now uses a trigram index of the keywords, and only scores the keywords similar enough to the search string. Run the upgrade step to build the index on existing sites.
@@ -0,0 +1,135 @@
+"""Strategies to read and write the field behind a keyword index.
+
+A strategy adapts one content object and works out an accessor which is
+then reused for all objects of the same class and portal_type, see
+KeywordManager.getAccessor(). Register a more specific IKeywordFieldStrategy
+adapter to support other kinds of content.
+"""
+
+from abc import ABC
+from abc import abstractmethod
+from Acquisition import aq_base
+from plone.dexterity.interfaces import IDexterityContent
+from Products.PloneKeywordManager.interfaces import IKeywordFieldAccessor
+from Products.PloneKeywordManager.interfaces import IKeywordFieldStrategy
+from zope.component import adapter
+from zope.interface import implementer
+from zope.interface import Interface
+
+
+def _heuristicName(fieldName):
+    """getSubject -> subject"""
+    if fieldName.startswith("get"):
+        fieldName = fieldName.lstrip("get_")
+    return fieldName[0].lower() + fieldName[1:]
+
+
+def getFieldValue(obj, fieldName):
+    fieldVal = getattr(obj, fieldName, ())
+    if not fieldVal and fieldName.startswith("get"):
+        fieldVal = getattr(obj, _heuristicName(fieldName), ())
+
+    if callable(fieldVal):
+        return fieldVal()
+    else:
+        return fieldVal
+
+
+@implementer(IKeywordFieldAccessor)
+class FieldAccessor(ABC):
+    """Base accessor, reads the indexed attribute. Subclasses write it."""
+
+    def __init__(self, fieldName):
+        self.fieldName = fieldName
+
+    def get(self, obj):
+        return getFieldValue(obj, self.fieldName)
+
+    @abstractmethod
+    def set(self, obj, value):
+        """Writes the keywords of obj."""
+
+
+class MethodAccessor(FieldAccessor):
+    """Writes through a setter method, e.g. setSubject of DublinCore."""
+
+    def __init__(self, fieldName, setterName):
+        super().__init__(fieldName)
+        self.setterName = setterName
+
+    def set(self, obj, value):
+        getattr(obj, self.setterName)(value)
+
+
+class AttributeAccessor(FieldAccessor):
+    """Writes the attribute directly, for Dexterity content."""
+
+    def __init__(self, fieldName, attributeName):
+        super().__init__(fieldName)
+        self.attributeName = attributeName
+
+    def set(self, obj, value):
+        setattr(aq_base(obj), self.attributeName, value)
+
+
+class ArchetypesAccessor(FieldAccessor):
+    """Writes through the mutator of an Archetypes field."""
+
+    def __init__(self, fieldName, atFieldName):
+        super().__init__(fieldName)
+        self.atFieldName = atFieldName
+
+    def set(self, obj, value):
+        obj.getField(self.atFieldName).getMutator(obj)(value)
+
+
+class NoopAccessor(FieldAccessor):
+    """Writes nothing, the object only needs to be reindexed."""
+
+    def set(self, obj, value):
+        pass
+
+
+@implementer(IKeywordFieldStrategy)
+@adapter(Interface)
+class KeywordFieldStrategy:
+    """Uses the DublinCore setter if there is one, else the Archetypes field."""
+
+    def __init__(self, context):
+        self.context = context
+
+    def accessor(self, indexName, fieldName):
+        # DefaultDublinCoreImpl:
+        setterName = "set" + indexName
+        if getattr(aq_base(self.context), setterName, None) is not None:
+            return MethodAccessor(fieldName, setterName)
+        return self.fieldAccessor(fieldName)
+
+    def fieldAccessor(self, fieldName):
+        # Anything left is maybe AT content
+        getField = getattr(aq_base(self.context), "getField", None)
+        if getField is None:
+            return None
+        for name in (fieldName, fieldName.lower()):
+            if getField(name):
+                return ArchetypesAccessor(fieldName, name)
+        if fieldName.startswith("get"):
+            name = _heuristicName(fieldName)
+            if getField(name) is not None:
+                return ArchetypesAccessor(fieldName, name)
+        return None
+
+
+@adapter(IDexterityContent)
+class DexterityKeywordFieldStrategy(KeywordFieldStrategy):
+    def fieldAccessor(self, fieldName):
+        return AttributeAccessor(fieldName, _heuristicName(fieldName))
+
+
+class CommentKeywordFieldStrategy(KeywordFieldStrategy):
+    """Comments acquire the keywords of the commented object, they only
+    need to be reindexed.
+    """
+
+    def fieldAccessor(self, fieldName):
+        return NoopAccessor(fieldName)
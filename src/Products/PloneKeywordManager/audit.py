@@ -0,0 +1,254 @@
+"""An append-only log of the keyword operations.
+
+Entries are kept in a LOBTree keyed by the time of the operation in
+microseconds. An entry is a small tuple holding the number of updated
+objects but not their UIDs, so years of operations stay compact. The log
+is read newest first with maxKey(), without loading older buckets.
+
+The UIDs and the keywords each object lost and gained are kept under the
+same key in a second LOBTree, so the operation can be reverted. UIDs are
+packed into 16 bytes each and objects sharing the same change are
+grouped, a merge of thousands of objects holds a single group.
+They are written chunk by chunk, in the transaction updating the objects,
+into an IOBTree of the groups of every chunk. The log of an operation
+which has been interrupted after committing some chunks still holds their
+changes and can be reverted.
+"""
+
+from BTrees.IOBTree import IOBTree
+from BTrees.LOBTree import LOBTree
+from collections import namedtuple
+from plone import api
+from Products.PloneKeywordManager.storage import get_storage
+from Products.PloneKeywordManager.storage import query_storage
+
+import time
+
+AUDIT = "audit"
+DELTAS = "deltas"
+
+LogEntry = namedtuple(
+    "LogEntry",
+    (
+        "key",
+        "time",
+        "operation",
+        "index",
+        "keywords",
+        "new",
+        "user",
+        "path",
+        "duration",
+        "count",
+    ),
+)
+
+
+def pack_uids(uids):
+    """Packs UUID4 hex strings into bytes of 16 bytes per UID. Returns a
+    tuple if some UID is not hexadecimal."""
+    try:
+        packed = b"".join(bytes.fromhex(uid) for uid in uids)
+    except (TypeError, ValueError):
+        return tuple(uids)
+    if len(packed) != 16 * len(uids):
+        return tuple(uids)
+    return packed
+
+
+def unpack_uids(packed):
+    """The UIDs packed by pack_uids()."""
+    if not isinstance(packed, bytes):
+        return list(packed)
+    return [packed[i : i + 16].hex() for i in range(0, len(packed), 16)]
+
+
+def log_operation(
+    operation, indexName, keywords, new, path, count, duration, user=None
+):
+    """Appends an operation to the log and returns its key.
+
+    ``keywords`` are the keywords operated on and ``new`` the new keyword,
+    None for a deletion or a tuple of new keywords for rules. ``count`` is
+    the number of updated objects.
+    """
+    if user is None:
+        user = api.user.get_current().getId()
+    log = get_storage(AUDIT, factory=LOBTree)
+    key = int(time.time() * 1e6)
+    while key in log:
+        key += 1
+    log[key] = (
+        operation,
+        indexName,
+        tuple(keywords),
+        new,
+        user,
+        path,
+        round(duration, 3),
+        count,
+    )
+    return key
+
+
+class OperationLog:
+    """Logs the objects an operation updates and the keywords each of them
+    lost and gained.
+
+    add() writes the changes of a chunk of objects within the current
+    transaction, the entry of the operation is created along with the first
+    chunk. save() completes it with the duration once the operation is
+    done.
+    """
+
+    def __init__(self, operation, indexName, keywords, new, path):
+        self.operation = operation
+        self.indexName = indexName
+        self.keywords = keywords
+        self.new = new
+        self.path = path
+        self.key = None
+        self.duration = 0.0
+
+    def _entry(self):
+        """The key of the entry of the operation, created if needed."""
+        log = get_storage(AUDIT, factory=LOBTree)
+        # the entry is gone if the transaction creating it has been aborted
+        if self.key is None or self.key not in log:
+            self.key = log_operation(
+                self.operation,
+                self.indexName,
+                self.keywords,
+                self.new,
+                self.path,
+                0,
+                self.duration,
+            )
+        return self.key
+
+    def add(self, changes):
+        """Logs the (uid, removed, added) changes of a chunk of objects."""
+        if not changes:
+            return
+        key = self._entry()
+        groups = {}
+        for uid, removed, added in changes:
+            delta = (tuple(sorted(removed)), tuple(sorted(added)))
+            groups.setdefault(delta, []).append(uid)
+        deltas = get_storage(DELTAS, factory=LOBTree)
+        chunks = deltas.get(key)
+        if chunks is None:
+            chunks = deltas[key] = IOBTree()
+        chunks[chunks.maxKey() + 1 if chunks else 0] = tuple(
+            (delta, pack_uids(uids)) for delta, uids in groups.items()
+        )
+        log = get_storage(AUDIT, factory=LOBTree)
+        record = log[key]
+        log[key] = record[:7] + (record[7] + len(changes),)
+
+    @property
+    def count(self):
+        """The number of objects logged so far."""
+        log = query_storage(AUDIT)
+        if self.key is None or log is None or self.key not in log:
+            return 0
+        return log[self.key][7]
+
+    def save(self):
+        """Completes the entry of the operation and returns its key."""
+        key = self._entry()
+        deltas = get_storage(DELTAS, factory=LOBTree)
+        if key not in deltas:
+            deltas[key] = ()
+        log = get_storage(AUDIT, factory=LOBTree)
+        record = log[key]
+        log[key] = record[:6] + (round(self.duration, 3), record[7])
+        return key
+
+
+def get_deltas(key):
+    """Returns the (removed, added, uids) changes of the logged operation
+    ``key``, None if they have not been recorded."""
+    deltas = query_storage(DELTAS)
+    if deltas is None or key not in deltas:
+        return None
+    groups = deltas[key]
+    if isinstance(groups, tuple):
+        # saved at once
+        return [
+            (removed, added, unpack_uids(uids)) for (removed, added), uids in groups
+        ]
+    merged = {}
+    for chunk in groups.values():
+        for delta, uids in chunk:
+            merged.setdefault(delta, []).extend(unpack_uids(uids))
+    return [(removed, added, uids) for (removed, added), uids in merged.items()]
+
+
+def _entry(key, record):
+    return LogEntry(key, key / 1e6, *record)
+
+
+def get_entry(key):
+    log = query_storage(AUDIT)
+    if log is None or key not in log:
+        return None
+    return _entry(key, log[key])
+
+
+def _matches(record, operation, indexName, keyword, user):
+    if operation and record[0] != operation:
+        return False
+    if indexName and record[1] != indexName:
+        return False
+    if user and record[4] != user:
+        return False
+    if keyword:
+        keyword = keyword.lower()
+        new = record[3]
+        values = list(record[2]) + (list(new) if isinstance(new, tuple) else [new])
+        return any(keyword in v.lower() for v in values if v)
+    return True
+
+
+def read_log(
+    size=50,
+    before=None,
+    since=None,
+    operation=None,
+    indexName=None,
+    keyword=None,
+    user=None,
+):
+    """Returns up to ``size`` log entries, newest first, and the key to pass
+    as ``before`` for the next page, None if there is none.
+
+    Entries older than ``before`` (a key) and not older than ``since`` (a
+    timestamp) are read. ``operation``, ``indexName`` and ``user`` select
+    entries by equality, ``keyword`` by a case-insensitive substring of
+    their keywords.
+    """
+    log = query_storage(AUDIT)
+    if log is None or not len(log):
+        return [], None
+    low = None if since is None else int(since * 1e6)
+    entries = []
+    key = before
+    while len(entries) < size:
+        try:
+            key = log.maxKey() if key is None else log.maxKey(key - 1)
+        except ValueError:
+            # no older entry
+            return entries, None
+        if low is not None and key < low:
+            return entries, None
+        record = log[key]
+        if _matches(record, operation, indexName, keyword, user):
+            entries.append(_entry(key, record))
+    try:
+        older = log.maxKey(key - 1)
+    except ValueError:
+        return entries, None
+    if low is not None and older < low:
+        return entries, None
+    return entries, key
@@ -0,0 +1,145 @@
+from BTrees.IIBTree import IITreeSet
+from persistent import Persistent
+from plone import api
+from Products.CMFCore.indexing import processQueue
+from Products.PloneKeywordManager import config
+from Products.PloneKeywordManager import logger
+from Products.PloneKeywordManager.storage import get_storage
+from Products.PloneKeywordManager.storage import query_storage
+from ZODB.POSException import ConflictError
+
+import hashlib
+import time
+import transaction
+
+CHECKPOINTS = "checkpoints"
+
+
+class Checkpoint(Persistent):
+    """Remembers the catalog records an operation has already processed,
+    so an interrupted operation can be resumed.
+    """
+
+    def __init__(self):
+        self.done = IITreeSet()
+        self.started = time.time()
+
+
+def checkpoint_key(*parts):
+    """Build a stable key identifying an operation from its parameters."""
+    return hashlib.sha1(repr(parts).encode("utf-8")).hexdigest()
+
+
+def get_checkpoint(key):
+    checkpoints = get_storage(CHECKPOINTS)
+    checkpoint = checkpoints.get(key)
+    if checkpoint is None:
+        checkpoint = checkpoints[key] = Checkpoint()
+    return checkpoint
+
+
+def clear_checkpoint(key):
+    checkpoints = query_storage(CHECKPOINTS)
+    if checkpoints is not None and key in checkpoints:
+        del checkpoints[key]
+
+
+class BatchProcessor:
+    """Calls ``process`` for every catalog brain, chunk by chunk.
+
+    After every chunk the indexing queue is processed and either a savepoint
+    is made (the default) or, with ``commit=True``, the transaction is
+    committed. Committed chunks that raise a ConflictError are retried up to
+    ``retries`` times. ``checkpoint`` is the key of a checkpoint, see
+    get_checkpoint(): records it already contains are skipped and processed
+    records are added to it, so it is committed along with every chunk.
+    ``progress`` is called with the number of brains handled so far and the
+    total before every chunk is saved. The time spent processing the
+    indexing queue and saving the chunks is added to ``timing``, a
+    timing.Timing.
+    """
+
+    def __init__(
+        self,
+        batch_size=None,
+        commit=False,
+        retries=None,
+        checkpoint=None,
+        progress=None,
+        timing=None,
+    ):
+        self.batch_size = batch_size or config.BATCH_SIZE
+        self.commit = commit
+        self.retries = config.CONFLICT_RETRIES if retries is None else retries
+        self.checkpoint = checkpoint
+        self.progress = progress
+        self.timing = timing
+
+    def __call__(self, brains, process, store=None):
+        """Returns the results of ``process`` for the brains that have been
+        processed, in the chunks that have been saved. ``store`` is called
+        with the results of every chunk before it is saved, to write them
+        within the same transaction.
+
+        A chunk is processed again when it is retried, its results are only
+        kept once it has been saved.
+        """
+        results = []
+        total = len(brains)
+        for start in range(0, total, self.batch_size):
+            chunk = brains[start : start + self.batch_size]
+            handled = start + len(chunk)
+            if self.checkpoint is not None:
+                done = get_checkpoint(self.checkpoint).done
+                chunk = [b for b in chunk if b.getRID() not in done]
+            if chunk:
+                results.extend(
+                    self._processChunk(chunk, process, store, handled, total)
+                )
+        return results
+
+    def _processChunk(self, chunk, process, store, handled, total):
+        attempt = 0
+        while True:
+            try:
+                results = [process(brain) for brain in chunk]
+                start = time.perf_counter()
+                processQueue()
+                start = self._add("catalog", start)
+                if store is not None:
+                    store(results)
+                if self.checkpoint is not None:
+                    # looked up again, an aborted attempt also drops a
+                    # checkpoint created in its transaction
+                    checkpoint = get_checkpoint(self.checkpoint)
+                    checkpoint.done.update([b.getRID() for b in chunk])
+                if self.progress is not None:
+                    self.progress(handled, total)
+                if self.commit:
+                    transaction.commit()
+                else:
+                    transaction.savepoint(optimistic=True)
+                    self._minimizeCache()
+                self._add("commit", start)
+                return results
+            except ConflictError:
+                if not self.commit or attempt >= self.retries:
+                    raise
+                attempt += 1
+                transaction.abort()
+                logger.info(
+                    "Conflict while processing a batch of %d objects, retry %d/%d",
+                    len(chunk),
+                    attempt,
+                    self.retries,
+                )
+
+    def _add(self, stage, start):
+        if self.timing is None:
+            return start
+        return self.timing.add(stage, start)
+
+    def _minimizeCache(self):
+        jar = getattr(api.portal.get(), "_p_jar", None)
+        if jar is not None:
+            jar.cacheGC()
@@ -0,0 +1,158 @@
+from datetime import datetime
+from plone import api
+from Products.Five import BrowserView
+from Products.PloneKeywordManager import keywordmanagerMessageFactory as _
+from Products.PloneKeywordManager.audit import get_entry
+from Products.PloneKeywordManager.audit import read_log
+from Products.PloneKeywordManager.browser.prefs_keywords_view import PrefsKeywordsView
+from Products.PloneKeywordManager.interfaces import IKeywordManager
+from Products.PloneKeywordManager.jobs import enqueue
+from Products.PloneKeywordManager.locks import OperationLocked
+from zope.component import getUtility
+from ZTUtils import make_query
+
+
+class KeywordLogView(BrowserView):
+    """
+    Lists the logged keyword operations, newest first, a page at a time
+    """
+
+    filters = ("operation", "field", "keyword", "user", "since")
+    operations = ("change", "delete", "rules", "revert")
+
+    def __init__(self, context, request):
+        super().__init__(context, request)
+        self.pkm = getUtility(IKeywordManager)
+        self._page = None
+
+    def __call__(self):
+        if self.request.form.get("form.button.Revert", ""):
+            return self.revert()
+        return self.index()
+
+    def revert(self):
+        """
+        Reverts the logged operation of the "key" request parameter, in the
+        background if asked to.
+        """
+        url = f"{self.context.absolute_url()}/prefs_keywords_log"
+        try:
+            key = int(self.request.get("key", ""))
+        except ValueError:
+            key = None
+        entry = get_entry(key) if key is not None else None
+        if entry is None:
+            api.portal.show_message(
+                _("The operation to revert has not been found"),
+                request=self.request,
+                type="error",
+            )
+            return self.request.RESPONSE.redirect(url)
+
+        if self.request.form.get("background", False):
+            job = enqueue("revert", entry.keywords, indexName=entry.index, log_key=key)
+            msg = _(
+                "msg_queued_revert",
+                default="Queued reverting the operation, it runs in the background.",
+            )
+            api.portal.show_message(msg, request=self.request, type="info")
+            return self.request.RESPONSE.redirect(
+                f"{self.context.absolute_url()}/prefs_keywords_view?job={job.id}"
+            )
+
+        try:
+            reverted = self.pkm.revert(key)
+        except OperationLocked as e:
+            api.portal.show_message(
+                PrefsKeywordsView.lockedMessage(e), request=self.request, type="error"
+            )
+            return self.request.RESPONSE.redirect(url)
+        except ValueError:
+            api.portal.show_message(
+                _("This operation cannot be reverted"),
+                request=self.request,
+                type="error",
+            )
+            return self.request.RESPONSE.redirect(url)
+        msg = _(
+            "msg_reverted",
+            default="Reverted the operation for ${num} object(s).",
+            mapping={"num": reverted},
+        )
+        api.portal.show_message(
+            msg, request=self.request, type="info" if reverted else "warning"
+        )
+        return self.request.RESPONSE.redirect(url)
+
+    def getKeywordIndexes(self):
+        return self.pkm.getKeywordIndexes()
+
+    def since(self):
+        """
+        the timestamp of the "since" request parameter, a YYYY-MM-DD date
+        """
+        since = self.request.get("since", "")
+        if not since:
+            return None
+        try:
+            return datetime.strptime(since, "%Y-%m-%d").timestamp()
+        except ValueError:
+            return None
+
+    def getPage(self):
+        """
+        :return: the entries of the page and the key of the next page
+        """
+        if self._page is None:
+            try:
+                before = int(self.request.get("before", "") or 0) or None
+                size = int(self.request.get("b_size", 50))
+            except ValueError:
+                before, size = None, 50
+            self._page = read_log(
+                size=size,
+                before=before,
+                since=self.since(),
+                operation=self.request.get("operation") or None,
+                indexName=self.request.get("field") or None,
+                keyword=self.request.get("keyword") or None,
+                user=self.request.get("user") or None,
+            )
+        return self._page
+
+    def getEntries(self):
+        return self.getPage()[0]
+
+    def nextUrl(self):
+        """
+        the url of the next page, None on the last page
+        """
+        before = self.getPage()[1]
+        if before is None:
+            return None
+        query = {
+            name: self.request[name]
+            for name in self.filters
+            if self.request.get(name, False)
+        }
+        query["before"] = before
+        return f"{self.context.absolute_url()}/prefs_keywords_log?{make_query(**query)}"
+
+    def formatTime(self, entry):
+        return datetime.fromtimestamp(entry.time).strftime("%Y-%m-%d %H:%M:%S")
+
+    def formatNew(self, entry):
+        if isinstance(entry.new, tuple):
+            return ", ".join(
+                f"{old} -> {new}" if new else f"-{old}"
+                for old, new in zip(entry.keywords, entry.new)
+            )
+        return entry.new or ""
+
+    def throughput(self, entry):
+        """
+        the number of objects updated per second, None if not measurable
+        """
+        if not entry.count or not entry.duration:
+            return None
+        return round(entry.count / entry.duration, 1)
@@ -0,0 +1,25 @@
+from Products.CMFPlone.PloneBatch import Batch
+from Products.Five import BrowserView
+from Products.PloneKeywordManager.interfaces import IKeywordManager
+from zope.component import getUtility
+
+
+class KeywordDuplicatesView(BrowserView):
+    """
+    Lists the keywords which only differ in case, accents, whitespace or
+    trailing punctuation, so they can be merged with one click
+    """
+
+    def __init__(self, context, request):
+        super().__init__(context, request)
+        self.pkm = getUtility(IKeywordManager)
+
+    def getKeywordIndexes(self):
+        return self.pkm.getKeywordIndexes()
+
+    def getGroups(self, indexName, b_start=0, b_size=50):
+        """
+        :param indexName: the name of the index to look for duplicates in
+        :return: a Batch of the groups of duplicate keywords, most used first
+        """
+        return Batch(self.pkm.getDuplicateKeywords(indexName), b_size, b_start)
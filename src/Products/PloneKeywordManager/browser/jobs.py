@@ -0,0 +1,51 @@
+from plone.protect import CheckAuthenticator
+from Products.Five import BrowserView
+from Products.PloneKeywordManager.jobs import FAILED
+from Products.PloneKeywordManager.jobs import get_job
+from Products.PloneKeywordManager.jobs import pending_jobs
+from Products.PloneKeywordManager.jobs import run_worker
+from zExceptions import Forbidden
+
+import json
+
+
+class KeywordJobsProgressView(BrowserView):
+    """
+    Reports the progress of queued keyword operations as JSON
+    """
+
+    def __call__(self):
+        job_id = self.request.get("job", None)
+        if job_id:
+            job = get_job(job_id)
+            if job is None:
+                self.request.response.setStatus(404)
+                data = {"id": job_id, "status": FAILED, "errors": ["Unknown job"]}
+            else:
+                data = job.progress()
+        else:
+            data = [job.progress() for job in pending_jobs()]
+        return self.json(data)
+
+    def json(self, data):
+        self.request.response.setHeader("Content-Type", "application/json")
+        self.request.response.setHeader("Cache-Control", "no-cache")
+        return json.dumps(data)
+
+
+class KeywordJobsWorkerView(KeywordJobsProgressView):
+    """
+    Runs the queued keyword operations, then the deferred reindexing, then
+    links the keywords new to the vocabularies, see jobs.run_worker().
+    Cron should rather run the ``keywords-worker`` script, see worker.py.
+    """
+
+    def __call__(self):
+        if self.request.get("REQUEST_METHOD", "GET") != "POST":
+            raise Forbidden("Run the worker with a form or the keywords-worker script")
+        CheckAuthenticator(self.request)
+        limit = self.request.get("limit", None)
+        if limit is not None:
+            limit = int(limit)
+        data = [job.progress() for job in run_worker(limit=limit)]
+        return self.json(data)
@@ -1,14 +1,28 @@
 from plone import api
+from plone.i18n.normalizer.interfaces import IIDNormalizer
 from Products.CMFPlone.PloneBatch import Batch
 from Products.Five import BrowserView
 from Products.Five.browser.pagetemplatefile import ViewPageTemplateFile
+from Products.PloneKeywordManager import config
 from Products.PloneKeywordManager import keywordmanagerMessageFactory as _
 from Products.PloneKeywordManager import logger
 from Products.PloneKeywordManager.compat import to_str
 from Products.PloneKeywordManager.interfaces import IKeywordManager
+from Products.PloneKeywordManager.jobs import enqueue
+from Products.PloneKeywordManager.locks import OperationLocked
+from Products.PloneKeywordManager.rules import guess_format
+from Products.PloneKeywordManager.rules import iter_rules
+from Products.PloneKeywordManager.rules import parse_rules
+from Products.PloneKeywordManager.scope import scope_path
+from Products.PloneKeywordManager.transfer import import_keywords
+from Products.PloneKeywordManager.transfer import iter_keywords
 from zope.component import getUtility
 from ZTUtils import make_query
 
+import io
+import json
+import transaction
+
 
 class PrefsKeywordsView(BrowserView):
     """
@@ -17,14 +31,31 @@ class PrefsKeywordsView(BrowserView):
 
     template = ViewPageTemplateFile("prefs_keywords_view.pt")
 
+    # values of the "order" request parameter: (sort_on, reverse)
+    orders = {
+        "keyword": ("keyword", False),
+        "most_used": ("count", True),
+        "least_used": ("count", False),
+    }
+
     def __init__(self, context, request):
         super().__init__(context, request)
         self.pkm = getUtility(IKeywordManager)
+        self._counts = {}
+        self._similar = {}
 
     def __call__(self):
-        if not self.request.form.get(
-            "form.button.Merge", ""
-        ) and not self.request.form.get("form.button.Delete", ""):
+        if self.request.form.get("form.button.ApplyRules", ""):
+            return self.uploadRules()
+
+        if not any(
+            self.request.form.get(button, "")
+            for button in (
+                "form.button.Merge",
+                "form.button.Delete",
+                "form.button.Preview",
+            )
+        ):
             return self.template({})
 
         keywords = self.request.get("keywords", None)
@@ -38,6 +69,9 @@ class PrefsKeywordsView(BrowserView):
             message = _("Please select a valid keyword field")
             return self.doReturn(message, "error")
 
+        if "form.button.Preview" in self.request.form:
+            return self.previewKeywords(keywords, field)
+
         if "form.button.Merge" in self.request.form:
             # We should assume there is a 'changeto' filled
             changeto = self.request.get("changeto", None)
@@ -45,9 +79,13 @@ class PrefsKeywordsView(BrowserView):
                 message = _("Please provide a new term")
                 return self.doReturn(message, "error")
 
+            if self.request.form.get("background", False):
+                return self.enqueueJob("change", keywords, field, changeto)
             return self.changeKeywords(keywords, changeto, field)
 
         if "form.button.Delete" in self.request.form:
+            if self.request.form.get("background", False):
+                return self.enqueueJob("delete", keywords, field)
             return self.deleteKeywords(keywords, field)
 
     def getNavrootUrl(self):
@@ -58,21 +96,37 @@ class PrefsKeywordsView(BrowserView):
         :param indexName the name of the index we want to get all keywords for.
         :param b_start: Batching support - page to start from
         :param b_size: Batching support - size of page
-        :return: a Products.CMFPlone Batch object containing the entire list of keywords.
+        :return: a Products.CMFPlone Batch object over the keywords, the ones
+            starting with the "prefix" request parameter if given.
+        """
+        return Batch(self.getKeywordList(indexName), b_size, b_start)
+
+    def getKeywordList(self, indexName):
+        """
+        :return: the keywords listed for the request parameters, a lazy
+            sequence unless searching
         """
         search_string = self.request.get("s", None)
+        sort_on, reverse = self.orders.get(
+            self.request.get("order", None), self.orders["keyword"]
+        )
 
         if not search_string:
-            keywords = self.pkm.getKeywords(indexName=indexName)
+            # a lazy sequence, the batch only reads the keywords it shows
+            keywords = self.pkm.getKeywordSequence(
+                indexName=indexName,
+                sort_on=sort_on,
+                reverse=reverse,
+                prefix=self.request.get("prefix", None),
+                context=self.context,
+            )
         else:
-            all = self.pkm.getKeywords(indexName=indexName)
             max_results = 100000  # I don't want to limit the results here... this is simply a big number.
             score = 0.5
-            keywords = self.pkm.getScoredMatches(
-                search_string, all, max_results, score, context=self.context
+            keywords = self.pkm.searchKeywords(
+                search_string, indexName, max_results, score, context=self.context
             )
-
-        return Batch(keywords, b_size, b_start)
+        return keywords
 
     def getNumObjects(self, keyword, indexName):
         """
@@ -80,16 +134,110 @@ class PrefsKeywordsView(BrowserView):
         :param keyword: string
         :return: int
         """
-        return self.pkm.getKeywordLength(keyword, indexName)
+        counts = self._counts.get(indexName)
+        if counts is None:
+            # counted for all keywords at once, not once per keyword on the page
+            counts = self._counts[indexName] = self.pkm.getKeywordCounts(
+                indexName, context=self.context
+            )
+        return counts.get(keyword, 0)
 
     def getKeywordIndexes(self):
         return self.pkm.getKeywordIndexes()
 
+    def getInitials(self, indexName):
+        return self.pkm.getInitials(indexName, context=self.context)
+
+    def getScopePath(self):
+        """
+        the path keywords and counts are restricted to, None for the portal
+        """
+        return scope_path(self.context)
+
+    def prefixUrl(self, prefix):
+        """
+        the url of this page listing the keywords starting with prefix
+        """
+        query = {}
+        for name in ("field", "order", "similar", "grid"):
+            if self.request.get(name, False):
+                query[name] = self.request[name]
+        if prefix:
+            query["prefix"] = prefix
+        return (
+            f"{self.context.absolute_url()}/prefs_keywords_view?{make_query(**query)}"
+        )
+
     def getScoredMatches(self, keyword, batch, num_similar, score):
         return self.pkm.getScoredMatches(
             keyword, batch, num_similar, score, context=self.context
         )
 
+    def getSimilarKeywords(self, keyword, indexName, batch, num_similar, score):
+        """
+        The keywords of the whole index most similar to keyword. Without a
+        vocabulary for the index, the keywords of the batch are scored.
+        """
+        num_similar = int(num_similar)
+        similar = self.pkm.getSimilarKeywords(keyword, indexName, num_similar)
+        if similar is None:
+            similar = self._scoreBatch(batch, num_similar, float(score))[keyword]
+        return similar
+
+    def _scoreBatch(self, batch, num_similar, score):
+        """The similar keywords of all keywords of the batch, scored in one
+        call instead of once per keyword shown."""
+        key = (num_similar, score)
+        if key not in self._similar:
+            keywords = list(batch)
+            scored = self.pkm.scoreManyMatches(keywords, keywords, score, num_similar)
+            self._similar[key] = {
+                word: [item for lscore, item in matches]
+                for word, matches in scored.items()
+            }
+        return self._similar[key]
+
+    def showSimilarUrl(self, show):
+        """
+        the url of this page with similar keywords shown or hidden
+        """
+        query = {}
+        for name in ("field", "s", "b_start", "order", "prefix", "grid"):
+            if self.request.get(name, False):
+                query[name] = self.request[name]
+        if show:
+            query["similar"] = "1"
+        return (
+            f"{self.context.absolute_url()}/prefs_keywords_view?{make_query(**query)}"
+        )
+
+    def showGridUrl(self, show):
+        """
+        the url of this page with the keywords listed in a scrolling grid
+        or in pages
+        """
+        query = {}
+        for name in ("field", "s", "order", "prefix", "similar"):
+            if self.request.get(name, False):
+                query[name] = self.request[name]
+        if show:
+            query["grid"] = "1"
+        return (
+            f"{self.context.absolute_url()}/prefs_keywords_view?{make_query(**query)}"
+        )
+
+    def rowsUrl(self, field):
+        """
+        the url of the rows of the grid, see KeywordRowsView
+        """
+        query = {"field": field}
+        for name in ("s", "order", "prefix"):
+            if self.request.get(name, False):
+                query[name] = self.request[name]
+        return (
+            f"{self.context.absolute_url()}/prefs_keywords_rows?{make_query(**query)}"
+        )
+
     def changeKeywords(self, keywords, changeto, field):
         """
         All keywords listed in the list 'keywords' are deleted from the field 'field' and it's KeywordIndex.
@@ -108,9 +256,14 @@ class PrefsKeywordsView(BrowserView):
 
           we should also rebuild the index, but hey... that's work.
         """
-        changed_objects = self.pkm.change(
-            keywords, changeto, context=self.context, indexName=field
-        )
+        stats = {} if config.TIME_REINDEX else None
+        try:
+            changed_objects = self.pkm.change(
+                keywords, changeto, context=self.context, indexName=field, stats=stats
+            )
+        except OperationLocked as e:
+            return self.doReturn(self.lockedMessage(e), "error")
+        self.logStats(stats)
         msg = _(
             "msg_changed_keywords",
             default="Changed ${from} to ${to} for ${num} object(s).",
@@ -128,9 +281,14 @@ class PrefsKeywordsView(BrowserView):
         return self.doReturn(msg, msg_type)
 
     def deleteKeywords(self, keywords, field):
-        deleted_objects = self.pkm.delete(
-            keywords, context=self.context, indexName=field
-        )
+        stats = {} if config.TIME_REINDEX else None
+        try:
+            deleted_objects = self.pkm.delete(
+                keywords, context=self.context, indexName=field, stats=stats
+            )
+        except OperationLocked as e:
+            return self.doReturn(self.lockedMessage(e), "error")
+        self.logStats(stats)
         msg = _(
             "msg_deleted_keywords",
             default="Deleted ${keywords} for ${num} object(s).",
@@ -144,7 +302,168 @@ class PrefsKeywordsView(BrowserView):
 
         return self.doReturn(msg, msg_type)
 
-    def doReturn(self, message="", msg_type=""):
+    def uploadRules(self):
+        """
+        Applies the rename rules of an uploaded CSV, JSON or JSON Lines file,
+        see Products.PloneKeywordManager.rules, or imports the keywords of
+        the file
+        """
+        field = self.request.get("field", None)
+        if not field or field not in self.pkm.getKeywordIndexes():
+            message = _("Please select a valid keyword field")
+            return self.doReturn(message, "error")
+
+        upload = self.request.form.get("rules_file", None)
+        if not upload:
+            message = _("Please upload a file with at least one rule")
+            return self.doReturn(message, "error")
+        filename = getattr(upload, "filename", "") or ""
+        if self.request.form.get("import_mode", "rules") == "keywords":
+            return self.importKeywords(upload, filename, field)
+
+        start = upload.read(64).decode("utf-8", "ignore")
+        upload.seek(0)
+        format = guess_format(filename, start)
+        background = self.request.form.get("background", False)
+        stats = {} if config.TIME_REINDEX else None
+        try:
+            if format == "json":
+                rules = parse_rules(upload.read(), format)
+            else:
+                # read line by line, only the rules are kept in memory
+                lines = io.TextIOWrapper(upload, encoding="utf-8-sig", newline="")
+                rules = dict(iter_rules(lines, format))
+        except ValueError as e:
+            transaction.abort()
+            message = _(
+                "msg_invalid_rules",
+                default="Could not read the rules: ${error}",
+                mapping={"error": str(e)},
+            )
+            return self.doReturn(message, "error")
+        num = len(rules)
+        if not num:
+            message = _("Please upload a file with at least one rule")
+            return self.doReturn(message, "error")
+
+        if background:
+            job = enqueue(
+                "rules", list(rules), indexName=field, context=self.context, rules=rules
+            )
+            msg = _(
+                "msg_queued_rules",
+                default="Queued ${num} rule(s), they are applied in the background.",
+                mapping={"num": num},
+            )
+            return self.doReturn(msg, "info", job=job.id)
+
+        # all rules are applied together, once the whole file has been read
+        try:
+            changed_objects = self.pkm.applyRules(
+                rules, context=self.context, indexName=field, stats=stats
+            )
+        except OperationLocked as e:
+            return self.doReturn(self.lockedMessage(e), "error")
+        except ValueError as e:
+            transaction.abort()
+            message = _(
+                "msg_rules_failed",
+                default="Could not apply the rules: ${error}",
+                mapping={"error": str(e)},
+            )
+            return self.doReturn(message, "error")
+        self.logStats(stats)
+        msg = _(
+            "msg_applied_rules",
+            default="Applied ${rules} rule(s) to ${num} object(s).",
+            mapping={"rules": num, "num": changed_objects},
+        )
+        return self.doReturn(msg, "info" if changed_objects else "warning")
+
+    def importKeywords(self, upload, filename, field):
+        """
+        Imports the keywords of an uploaded text file (one keyword per line)
+        or of a CSV or JSON Lines export
+        """
+        if field != "Subject":
+            message = _("Keywords can only be imported into the Subject field")
+            return self.doReturn(message, "error")
+        format = filename.lower().rsplit(".", 1)[-1]
+        lines = io.TextIOWrapper(upload, encoding="utf-8-sig", newline="")
+        try:
+            added = import_keywords(api.portal.get(), iter_keywords(lines, format))
+        except (ValueError, KeyError) as e:
+            message = _(
+                "msg_invalid_keywords",
+                default="Could not read the keywords: ${error}",
+                mapping={"error": str(e)},
+            )
+            return self.doReturn(message, "error")
+        msg = _(
+            "msg_imported_keywords",
+            default="Imported ${num} new keyword(s).",
+            mapping={"num": added},
+        )
+        return self.doReturn(msg, "info" if added else "warning")
+
+    def previewKeywords(self, keywords, field):
+        """
+        Shows what renaming (if 'changeto' is filled) or deleting the keywords
+        would do, without changing anything
+        """
+        changeto = self.request.get("changeto", None)
+        if changeto:
+            preview = self.pkm.change(
+                keywords, changeto, context=self.context, indexName=field, preview=True
+            )
+        else:
+            preview = self.pkm.delete(
+                keywords, context=self.context, indexName=field, preview=True
+            )
+        preview["keywords"] = keywords
+        preview["changeto"] = changeto
+        return self.template(preview=preview)
+
+    @staticmethod
+    def lockedMessage(error):
+        """
+        the message telling that keywords are leased by another operation,
+        also shown by the operations log
+        """
+        return _(
+            "msg_keywords_locked",
+            default="${keyword} is being changed by another operation of "
+            "${user}, please try again later or run the operation in the "
+            "background.",
+            mapping={"keyword": to_str(error.keyword), "user": error.lease.user},
+        )
+
+    def logStats(self, stats):
+        if not stats:
+            return
+        for name, seconds in sorted(stats.get("reindex", {}).items()):
+            logger.info("Reindexing %s took %.3f seconds", name, seconds)
+        for name, count in sorted(stats.get("skipped", {}).items()):
+            logger.info("Skipped reindexing %s for %d object(s)", name, count)
+        for name, count in sorted(stats.get("deferred", {}).items()):
+            logger.info("Deferred reindexing %s for %d object(s)", name, count)
+
+    def enqueueJob(self, operation, keywords, field, changeto=None):
+        """
+        Queue the operation to be run by the worker, see jobs.run_worker(),
+        instead of running it within this request.
+        """
+        job = enqueue(
+            operation, keywords, changeto, indexName=field, context=self.context
+        )
+        msg = _(
+            "msg_queued_keywords",
+            default="Queued the operation on ${keywords}, it runs in the background.",
+            mapping={"keywords": ",".join(to_str(keywords))},
+        )
+        return self.doReturn(msg, "info", job=job.id)
+
+    def doReturn(self, message="", msg_type="", job=None):
         """
         set the message and return
         """
@@ -154,6 +473,9 @@ class PrefsKeywordsView(BrowserView):
         logger.info(self.context.translate(message))
         navroot_url = api.portal.get_navigation_root(self.context).absolute_url()
         url = f"{navroot_url}/prefs_keywords_view"
+        if self.request.get("duplicates", False):
+            # merged from the duplicates report
+            url = f"{navroot_url}/prefs_keywords_duplicates"
 
         query = dict()
         if self.request.get("field", False):
@@ -162,5 +484,58 @@ class PrefsKeywordsView(BrowserView):
             query["s"] = self.request["s"]
         if self.request.get("b_start", False):
             query["b_start"] = self.request["b_start"]
+        if self.request.get("order", False):
+            query["order"] = self.request["order"]
+        if self.request.get("prefix", False):
+            query["prefix"] = self.request["prefix"]
+        if self.request.get("similar", False):
+            query["similar"] = "1"
+        if self.request.get("grid", False):
+            query["grid"] = "1"
+        if job is not None:
+            query["job"] = job
 
         self.request.RESPONSE.redirect(f"{url}?{make_query(**query)}")
+
+
+class KeywordRowsView(PrefsKeywordsView):
+    """
+    A range of the keywords listed in the control panel as JSON, for its
+    scrolling grid: only the rows in view are read and counted.
+
+    Returns ``{"total": ..., "start": ..., "rows": [[keyword, count, id],
+    ...]}`` for the ``b_size`` keywords from ``b_start``, at most
+    ``max_size``. The id is the keyword normalized for an HTML id.
+    """
+
+    max_size = 500
+
+    def __call__(self):
+        field = self.request.get("field", "Subject")
+        if field not in self.pkm.getKeywordIndexes():
+            return self.json({"error": f"No keyword index {field}"}, 404)
+        try:
+            start = max(int(self.request.get("b_start", 0)), 0)
+            size = min(int(self.request.get("b_size", 100)), self.max_size)
+        except ValueError:
+            return self.json({"error": "b_start and b_size must be integers"}, 400)
+
+        keywords = self.getKeywordList(field)
+        rows = keywords[start : start + size]
+        counts = self.pkm.getKeywordCounts(field, rows, context=self.context)
+        normalize = getUtility(IIDNormalizer).normalize
+        return self.json(
+            {
+                "total": len(keywords),
+                "start": start,
+                "rows": [
+                    [keyword, counts[keyword], normalize(keyword)] for keyword in rows
+                ],
+            }
+        )
+
+    def json(self, data, status=200):
+        self.request.response.setStatus(status)
+        self.request.response.setHeader("Content-Type", "application/json")
+        self.request.response.setHeader("Cache-Control", "no-cache")
+        return json.dumps(data, separators=(",", ":"))
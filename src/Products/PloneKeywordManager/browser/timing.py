@@ -0,0 +1,83 @@
+from datetime import datetime
+from plone import api
+from plone.protect import CheckAuthenticator
+from Products.Five import BrowserView
+from Products.PloneKeywordManager import keywordmanagerMessageFactory as _
+from Products.PloneKeywordManager.timing import stats
+from zExceptions import Forbidden
+
+
+class KeywordTimingsView(BrowserView):
+    """
+    Shows where the keyword operations of this process spent their time
+    """
+
+    buttons = ("form.button.Start", "form.button.Stop", "form.button.Reset")
+
+    def __call__(self):
+        form = self.request.form
+        if not any(form.get(button, "") for button in self.buttons):
+            return self.index()
+        # the buttons change the state of the whole process, not the database
+        # plone.protect would guard
+        if self.request.get("REQUEST_METHOD", "GET") != "POST":
+            raise Forbidden("Use the buttons of the timings page")
+        CheckAuthenticator(self.request)
+        if form.get("form.button.Start", ""):
+            stats.collecting = True
+            message = _("Collecting the timings of the keyword operations")
+        elif form.get("form.button.Stop", ""):
+            stats.collecting = False
+            message = _("Stopped collecting the timings")
+        elif form.get("form.button.Reset", ""):
+            stats.reset()
+            message = _("The timings have been reset")
+        api.portal.show_message(message, request=self.request, type="info")
+        return self.request.RESPONSE.redirect(
+            f"{self.context.absolute_url()}/prefs_keywords_timings"
+        )
+
+    def collecting(self):
+        return stats.collecting
+
+    def since(self):
+        return datetime.fromtimestamp(stats.since).strftime("%Y-%m-%d %H:%M:%S")
+
+    def getStats(self):
+        """
+        :return: the totals of every operation, with the milliseconds per
+            call and the share of the time spent in each stage. Time not
+            spent in any stage is listed as "other".
+        """
+        result = []
+        for totals in stats.summary():
+            calls = totals["calls"]
+            duration = totals["duration"]
+            durations = totals["durations"]
+            other = duration - sum(durations.values())
+            if other > 0:
+                durations["other"] = other
+            result.append(
+                {
+                    "operation": totals["operation"],
+                    "calls": calls,
+                    "seconds": round(duration, 3),
+                    "average": round(duration / calls * 1000, 2),
+                    "max": round(totals["max"] * 1000, 2),
+                    "stages": [
+                        {
+                            "name": name,
+                            "seconds": round(seconds, 3),
+                            "average": round(seconds / calls * 1000, 2),
+                            "percent": (
+                                round(seconds / duration * 100, 1) if duration else 0
+                            ),
+                        }
+                        for name, seconds in sorted(
+                            durations.items(), key=lambda item: -item[1]
+                        )
+                    ],
+                    "counters": sorted(totals["counters"].items()),
+                }
+            )
+        return result
@@ -0,0 +1,38 @@
+from Products.Five import BrowserView
+from Products.PloneKeywordManager.interfaces import IKeywordManager
+from Products.PloneKeywordManager.transfer import export_chunks
+from zope.component import getUtility
+
+CONTENT_TYPES = {
+    "csv": "text/csv; charset=utf-8",
+    "jsonl": "application/x-ndjson; charset=utf-8",
+}
+
+
+class KeywordExportView(BrowserView):
+    """
+    Streams the keywords of one (?field=) or all keyword indexes with the
+    number of objects using them, as CSV or JSON Lines (?format=jsonl)
+    """
+
+    def __call__(self):
+        pkm = getUtility(IKeywordManager)
+        format = self.request.get("format", "csv")
+        if format not in CONTENT_TYPES:
+            format = "csv"
+        indexNames = pkm.getKeywordIndexes()
+        field = self.request.get("field", None)
+        if field:
+            if field not in indexNames:
+                self.request.response.setStatus(400)
+                return f"{field} is not a valid field"
+            indexNames = [field]
+
+        response = self.request.response
+        response.setHeader("Content-Type", CONTENT_TYPES[format])
+        response.setHeader(
+            "Content-Disposition", f'attachment; filename="keywords.{format}"'
+        )
+        for chunk in export_chunks(indexNames, format):
+            response.write(chunk.encode("utf-8"))
+        return b""
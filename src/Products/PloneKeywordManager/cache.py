@@ -0,0 +1,214 @@
+from zope.annotation.interfaces import IAnnotations
+from zope.globalrequest import getRequest
+
+import bisect
+import functools
+import transaction
+
+REQUEST_CACHE_KEY = "Products.PloneKeywordManager.cache"
+
+
+def request_cache(name):
+    """Returns a dictionary that lives as long as the current request. Outside
+    of a request a new, empty dictionary is returned every time.
+    """
+    request = getRequest()
+    if request is None:
+        return {}
+    return IAnnotations(request).setdefault(REQUEST_CACHE_KEY, {}).setdefault(name, {})
+
+
+def request_memoize(func):
+    """Memoizes a method of the keyword manager for the current request.
+
+    The manager is a global utility, so the cache lives on the request. The
+    positional arguments make up the key. Outside of a request nothing is
+    cached.
+    """
+
+    @functools.wraps(func)
+    def memoized(self, *args):
+        cache = request_cache(func.__name__)
+        key = args
+        try:
+            return cache[key]
+        except KeyError:
+            value = cache[key] = func(self, *args)
+            return value
+
+    return memoized
+
+
+def clear_request_cache():
+    """Forget what has been memoized for the current request, e.g. after
+    indexes have been added to the catalog.
+    """
+    request = getRequest()
+    if request is not None:
+        IAnnotations(request).pop(REQUEST_CACHE_KEY, None)
+
+
+# Sorted keyword lists, per index and shared by all threads. A list is
+# valid for the committed state of the index it has been built from.
+_keyword_lists = {}
+
+
+class KeywordList:
+    def __init__(self, state, keywords, counts=None):
+        self.state = state
+        self.keywords = keywords
+        # built on first use
+        self.counts = counts
+        self.orders = {}
+
+
+def sort_key(keyword):
+    """Case-insensitive order, ties in the order of the index."""
+    return (keyword.lower(), keyword)
+
+
+def _index_key(index):
+    jar = index._p_jar
+    if jar is None or index._p_oid is None:
+        return None
+    return (jar.db().database_name, index._p_oid)
+
+
+def index_state(index):
+    """Identifies the committed state of an index by its counter and the
+    serial of the counter object. Returns None if the index has been changed
+    in the current transaction, that state may still be aborted.
+    """
+    counter = getattr(index, "_counter", None)
+    if counter is None:
+        return (0, None)
+    return counter_state(counter)
+
+
+def counter_state(counter):
+    """Identifies the committed state of a BTrees.Length counter by its
+    value and serial, see index_state()."""
+    if counter._p_changed:
+        return None
+    savepoint = getattr(counter._p_jar, "_savepoint_storage", None)
+    if savepoint is not None and counter._p_oid in savepoint.index:
+        return None
+    return (counter(), counter._p_serial)
+
+
+def row_length(row):
+    """Number of objects in a row of KeywordIndex._index. Old indexes may
+    still store a single record id as an int.
+    """
+    if isinstance(row, int):
+        return 1
+    return len(row)
+
+
+def _entry(index):
+    key = _index_key(index)
+    state = index_state(index)
+    entry = _keyword_lists.get(key)
+    if entry is not None and state is not None and entry.state == state:
+        return entry
+
+    keywords = [k for k in index.uniqueValues() if k is not None]
+    keywords.sort(key=sort_key)
+    entry = KeywordList(state, tuple(keywords))
+    if key is not None and state is not None:
+        _keyword_lists[key] = entry
+    return entry
+
+
+def sorted_keywords(index):
+    """Returns the keywords of a KeywordIndex as a tuple, sorted
+    case-insensitively. The tuple is cached until the index changes.
+    """
+    return _entry(index).keywords
+
+
+def keyword_counts(index):
+    """Returns a dictionary of the number of objects per keyword, built in
+    one pass over the index and cached along with the keyword list.
+    """
+    return _counted(_entry(index), index).counts
+
+
+def _counted(entry, index):
+    if entry.counts is None:
+        entry.counts = {
+            keyword: row_length(row)
+            for keyword, row in index._index.items()
+            if keyword is not None
+        }
+    return entry
+
+
+def keywords_by_count(index, reverse=False):
+    """Returns the keywords ordered by the number of objects, least used
+    first or, with ``reverse``, most used first. Keywords used equally
+    often keep the case-insensitive order.
+    """
+    return count_order(_counted(_entry(index), index), reverse)
+
+
+def count_order(entry, reverse=False):
+    """Returns the keywords of a KeywordList with counts ordered by count,
+    see keywords_by_count(). The order is kept in the list.
+    """
+    order = entry.orders.get(reverse)
+    if order is None:
+        counts = entry.counts
+        sign = -1 if reverse else 1
+        order = entry.orders[reverse] = tuple(
+            sorted(entry.keywords, key=lambda k: sign * counts.get(k, 0))
+        )
+    return order
+
+
+def patch_sorted_keywords(index, state, keywords):
+    """Updates the cached list of an index after an operation, that started
+    when the index was in ``state``, added or removed some of ``keywords``.
+
+    The patched list is cached once the transaction has been committed. If
+    the cached list was not up to date when the operation started, it is
+    left alone to be rebuilt on the next access.
+    """
+    key = _index_key(index)
+    entry = _keyword_lists.get(key)
+    if state is None or entry is None or entry.state != state:
+        return
+    current = list(entry.keywords)
+    for keyword in set(keywords):
+        if not isinstance(keyword, str):
+            continue
+        position = bisect.bisect_left(current, sort_key(keyword), key=sort_key)
+        listed = position < len(current) and current[position] == keyword
+        indexed = keyword in index._index
+        if indexed and not listed:
+            current.insert(position, keyword)
+        elif listed and not indexed:
+            del current[position]
+    patched = tuple(current)
+    counts = None
+    if entry.counts is not None:
+        # only the rows of the touched keywords have changed
+        counts = dict(entry.counts)
+        for keyword in set(keywords):
+            if not isinstance(keyword, str):
+                continue
+            row = index._index.get(keyword)
+            if row is None:
+                counts.pop(keyword, None)
+            else:
+                counts[keyword] = row_length(row)
+    counter = index.getCounter()
+
+    def store(committed):
+        # only if nothing else changed the index in the same transaction
+        if committed and index.getCounter() == counter:
+            state = index_state(index)
+            if state is not None:
+                _keyword_lists[key] = KeywordList(state, patched, counts)
+
+    transaction.get().addAfterCommitHook(store)
@@ -16,5 +16,63 @@ IGNORE_INDEXES = [
 # keywords on objects. Most people won't need this.
 ALWAYS_REINDEX = (
     # 'Subject',
-    "SearchableText",
 )
+
+# Text indexes that are reindexed when merging or deleting keywords only if
+# the words of the removed keywords are indexed for the object, i.e. if the
+# object's text indexer includes the keywords.
+REINDEX_IF_INDEXED = ("SearchableText",)
+
+# Indexes whose reindexing is left to the background worker instead of
+# being done while merging or deleting, e.g. ("SearchableText",).
+DEFERRED_REINDEX = ()
+
+# Number of objects change() and delete() process before they make a
+# savepoint or, when asked to, commit the transaction.
+BATCH_SIZE = 500
+
+# How often a committed batch is retried after a ConflictError.
+CONFLICT_RETRIES = 3
+
+# Seconds after which the lease of a keyword operation on its keywords
+# expires, unless the operation reports progress, see locks.py.
+LEASE_TIMEOUT = 900
+
+# Seconds the worker keeps finished and failed jobs, for their progress to
+# be shown, before removing them, see jobs.prune_jobs().
+JOB_RETENTION = 7 * 24 * 3600
+
+# Sum up the timings of the keyword operations in each process from its
+# start, see timing.py. Collecting can also be started on the timings page
+# of the control panel.
+COLLECT_TIMINGS = False
+
+# Log the time spent reindexing each index after merging or deleting keywords
+# in the control panel. Indexes are then reindexed one by one, which is slower.
+TIME_REINDEX = False
+
+# Fuzzy keyword searches only score the keywords whose trigrams are at least
+# this similar (Dice coefficient) to the trigrams of the search string.
+TRIGRAM_SIMILARITY = 0.3
+
+# Number of similar keywords kept for each keyword, and the score they
+# need to reach, see getScoredMatches().
+SIMILAR_KEYWORDS = 7
+SIMILARITY_SCORE = 0.6
+
+# Scoring jobs of the background worker comparing more word/keyword pairs
+# than this are spread over at most SCORING_PROCESSES worker processes, see
+# scoring.parallel_scoring(). Requests never start processes.
+PARALLEL_SCORING = 5000000
+SCORING_PROCESSES = 2
+
+# Number of paths a preview of a keyword operation lists.
+PREVIEW_SAMPLE = 10
+
+# Weight of the latest run in the moving average of the time it takes to
+# update one object, used to estimate how long an operation will take.
+COST_WEIGHT = 0.3
+
+# Number of keywords imported into one carrier document, see
+# transfer.import_keywords().
+IMPORT_CHUNK = 1000
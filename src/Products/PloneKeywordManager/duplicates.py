@@ -0,0 +1,55 @@
+"""Finds keywords that only differ in case, accents, whitespace or
+trailing punctuation.
+"""
+
+import unicodedata
+
+
+def normalize(keyword):
+    """Returns the form two keywords share if they are duplicates:
+    casefolded, without diacritics, with whitespace collapsed and trailing
+    punctuation removed.
+    """
+    decomposed = unicodedata.normalize("NFKD", keyword.casefold())
+    stripped = "".join(c for c in decomposed if not unicodedata.combining(c))
+    collapsed = " ".join(stripped.split())
+    end = len(collapsed)
+    while end and unicodedata.category(collapsed[end - 1]).startswith("P"):
+        end -= 1
+    # keywords made of punctuation only are kept as they are
+    return collapsed[:end].rstrip() or collapsed
+
+
+def duplicate_groups(keywords, counts, total=None):
+    """Groups the keywords by their normalized form.
+
+    Returns a list of dictionaries, one for each group of two or more
+    keywords, with the most used groups first. ``keywords`` lists the
+    keywords of a group, most used first, ``target`` is the most used one
+    and ``total`` the number of objects using any of them, as returned by
+    ``total(keywords)``. By default the counts of the keywords are added.
+    """
+    if total is None:
+
+        def total(members):
+            return sum(counts.get(k, 0) for k in members)
+
+    buckets = {}
+    for keyword in keywords:
+        buckets.setdefault(normalize(keyword), []).append(keyword)
+
+    groups = []
+    for normalized, members in buckets.items():
+        if len(members) < 2:
+            continue
+        members.sort(key=lambda k: -counts.get(k, 0))
+        groups.append(
+            {
+                "normalized": normalized,
+                "keywords": members,
+                "target": members[0],
+                "total": total(members),
+            }
+        )
+    groups.sort(key=lambda group: (-group["total"], group["normalized"]))
+    return groups
@@ -2,18 +2,94 @@
 # See also LICENSE.txt
 # $Id$
 
+from zope.interface import Attribute
 from zope.interface import Interface
 
 
 class IKeywordManager(Interface):
     """A utility that allows to manage keywords"""
 
-    def change(old_keywords, new_keyword):
+    def change(
+        old_keywords,
+        new_keyword,
+        context=None,
+        indexName="Subject",
+        batch_size=None,
+        commit=False,
+        progress=None,
+        preview=False,
+    ):
         """Updates all objects using the old_keywords.
 
         Objects using the old_keywords will be using the new_keywords
-        afterwards.
+        afterwards. With ``commit`` the objects are committed in batches of
+        ``batch_size`` and an interrupted operation can be resumed.
+        ``progress`` is called with the number of objects done and the total.
+        With ``preview`` nothing is changed, the number of affected objects,
+        their portal types, some of their paths and the estimated runtime
+        are returned as a dictionary.
         """
 
-    def delete(keywords):
+    def delete(
+        keywords,
+        context=None,
+        indexName="Subject",
+        batch_size=None,
+        commit=False,
+        progress=None,
+        preview=False,
+    ):
         """Removes the keywords from all objects using it."""
+
+    def applyRules(
+        rules,
+        context=None,
+        indexName="Subject",
+        batch_size=None,
+        commit=False,
+        progress=None,
+        preview=False,
+    ):
+        """Applies a mapping of old keywords to new keywords, or to None to
+        delete them, updating every affected object once."""
+
+    def revert(
+        key,
+        batch_size=None,
+        commit=False,
+        progress=None,
+    ):
+        """Reverts an operation of the audit log, leaving alone the objects
+        whose keywords have changed since."""
+
+
+class IKeywordFieldAccessor(Interface):
+    """Reads and writes the field behind a keyword index on any object of
+    one kind (class and portal_type)"""
+
+    def get(obj):
+        """Returns the value of the field of obj."""
+
+    def set(obj, value):
+        """Sets the field of obj to value."""
+
+
+class IKeywordFieldStrategy(Interface):
+    """Adapts a content object to tell how objects of its kind store the
+    field behind a keyword index"""
+
+    def accessor(indexName, fieldName):
+        """Returns an IKeywordFieldAccessor for the field ``fieldName``
+        indexed by ``indexName``, or None if the field cannot be written.
+        """
+
+
+class IKeywordTimingEvent(Interface):
+    """Notified after a keyword operation with the time spent in its
+    stages, see timing.py"""
+
+    operation = Attribute("The method timed, e.g. change or getKeywords")
+    indexName = Attribute("The keyword index operated on")
+    duration = Attribute("The seconds the whole operation took")
+    durations = Attribute("A dict of the seconds spent in each stage")
+    counters = Attribute("A dict of counters, e.g. of the objects updated")
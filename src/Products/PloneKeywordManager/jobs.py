@@ -0,0 +1,288 @@
+from persistent import Persistent
+from persistent.list import PersistentList
+from plone import api
+from Products.PloneKeywordManager import config
+from Products.PloneKeywordManager import logger
+from Products.PloneKeywordManager.interfaces import IKeywordManager
+from Products.PloneKeywordManager.locks import OperationLocked
+from Products.PloneKeywordManager.scoring import parallel_scoring
+from Products.PloneKeywordManager.storage import get_storage
+from Products.PloneKeywordManager.storage import query_storage
+from Products.PloneKeywordManager.vocabulary import update_vocabularies
+from zope.component import getUtility
+
+import time
+import transaction
+import uuid
+
+JOBS = "jobs"
+REINDEX = "reindex"
+
+PENDING = "pending"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+
+class Job(Persistent):
+    """A keyword operation waiting to be run by the worker."""
+
+    # for the "revert" operation, the key of the logged operation
+    log_key = None
+    # when a running job last reported progress
+    heartbeat = None
+
+    def __init__(
+        self,
+        operation,
+        keywords,
+        new_keyword=None,
+        indexName="Subject",
+        path=None,
+        rules=None,
+        log_key=None,
+    ):
+        # ids sort in the order the jobs have been created
+        self.id = f"{time.time_ns():020d}-{uuid.uuid4().hex[:8]}"
+        self.operation = operation
+        self.keywords = tuple(keywords)
+        self.new_keyword = new_keyword
+        self.indexName = indexName
+        self.path = path
+        # for the "rules" operation, see KeywordManager.applyRules()
+        self.rules = dict(rules) if rules is not None else None
+        self.log_key = log_key
+        self.user = api.user.get_current().getId()
+        self.status = PENDING
+        self.done = 0
+        self.total = 0
+        self.errors = PersistentList()
+        self.created = time.time()
+        self.started = None
+        self.finished = None
+
+    def update(self, done, total):
+        self.done = done
+        self.total = total
+        self.heartbeat = time.time()
+
+    def stalled(self, now=None):
+        """Tells whether the job is running but has not reported progress
+        for config.LEASE_TIMEOUT seconds, i.e. its worker died. The leases
+        of its keywords have expired by then, see locks.py."""
+        if self.status != RUNNING:
+            return False
+        if now is None:
+            now = time.time()
+        last = self.heartbeat or self.started or self.created
+        return now - last > config.LEASE_TIMEOUT
+
+    def progress(self):
+        """Returns the state of the job as a dictionary."""
+        rate = eta = None
+        if self.started is not None:
+            elapsed = (self.finished or time.time()) - self.started
+            if elapsed > 0 and self.done:
+                rate = self.done / elapsed
+                if self.status == RUNNING:
+                    eta = (self.total - self.done) / rate
+        return {
+            "id": self.id,
+            "operation": self.operation,
+            "keywords": list(self.keywords),
+            "new_keyword": self.new_keyword,
+            "field": self.indexName,
+            "status": self.status,
+            "done": self.done,
+            "total": self.total,
+            "rate": rate,
+            "eta": eta,
+            "errors": list(self.errors),
+        }
+
+
+def enqueue(
+    operation,
+    keywords,
+    new_keyword=None,
+    indexName="Subject",
+    context=None,
+    rules=None,
+    log_key=None,
+):
+    """Queues a "change", "delete", "rules" or "revert" operation and
+    returns the job."""
+    path = None
+    if context is not None:
+        path = "/".join(context.getPhysicalPath())
+    job = Job(operation, keywords, new_keyword, indexName, path, rules, log_key)
+    get_storage(JOBS)[job.id] = job
+    return job
+
+
+def get_job(job_id):
+    jobs = query_storage(JOBS)
+    if jobs is None:
+        return None
+    return jobs.get(job_id)
+
+
+def pending_jobs():
+    """Returns the jobs waiting to be run: the pending ones and the running
+    ones whose worker died, which resume where they stopped."""
+    jobs = query_storage(JOBS)
+    if jobs is None:
+        return []
+    now = time.time()
+    return [job for job in jobs.values() if job.status == PENDING or job.stalled(now)]
+
+
+def run_job(job):
+    """Runs a job with the permissions of the user that queued it.
+
+    Batches are committed as they are processed, so the progress of the
+    job can be followed from other requests. A job whose keywords are
+    leased by another operation is left pending, see locks.py. A job whose
+    worker died is run again once it has stalled, see Job.stalled().
+    """
+    portal = api.portal.get()
+    pkm = getUtility(IKeywordManager)
+    if job.status == RUNNING:
+        # committed batches are skipped, see BatchProcessor
+        logger.info("Resuming stalled keyword job %s", job.id)
+    job.status = RUNNING
+    job.started = job.heartbeat = time.time()
+    transaction.commit()
+
+    try:
+        context = None
+        if job.path is not None:
+            context = portal.unrestrictedTraverse(job.path)
+        user = api.user.get(userid=job.user)
+        if user is None:
+            raise ValueError(f"User {job.user} not found")
+        with api.env.adopt_user(user=user), parallel_scoring():
+            if job.operation == "change":
+                count = pkm.change(
+                    job.keywords,
+                    job.new_keyword,
+                    context=context,
+                    indexName=job.indexName,
+                    commit=True,
+                    progress=job.update,
+                )
+            elif job.operation == "revert":
+                count = pkm.revert(job.log_key, commit=True, progress=job.update)
+            elif job.operation == "rules":
+                count = pkm.applyRules(
+                    job.rules,
+                    context=context,
+                    indexName=job.indexName,
+                    commit=True,
+                    progress=job.update,
+                )
+            else:
+                count = pkm.delete(
+                    job.keywords,
+                    context=context,
+                    indexName=job.indexName,
+                    commit=True,
+                    progress=job.update,
+                )
+    except OperationLocked as e:
+        # left for the next run of the worker
+        transaction.abort()
+        logger.info("Keyword job %s postponed: %s", job.id, e)
+        job.status = PENDING
+        job.started = None
+        transaction.commit()
+        return job
+    except Exception as e:
+        transaction.abort()
+        logger.exception("Keyword job %s failed", job.id)
+        job.status = FAILED
+        job.errors.append(f"{e.__class__.__name__}: {e}")
+    else:
+        job.done = job.total = count
+        job.status = DONE
+    job.finished = time.time()
+    transaction.commit()
+    return job
+
+
+def process_jobs(limit=None):
+    """Runs pending jobs in the order they have been queued, see
+    run_worker(). Returns the jobs that have been run.
+    """
+    processed = []
+    for job in pending_jobs():
+        if limit is not None and len(processed) >= limit:
+            break
+        processed.append(run_job(job))
+    return processed
+
+
+def prune_jobs(now=None):
+    """Removes the jobs which have finished or failed more than
+    config.JOB_RETENTION seconds ago. Returns the number of removed jobs.
+    """
+    jobs = query_storage(JOBS)
+    if jobs is None:
+        return 0
+    if now is None:
+        now = time.time()
+    expired = [
+        job.id
+        for job in jobs.values()
+        if job.status in (DONE, FAILED)
+        and now - (job.finished or job.created) > config.JOB_RETENTION
+    ]
+    for job_id in expired:
+        del jobs[job_id]
+    return len(expired)
+
+
+def run_worker(limit=None):
+    """Runs the pending jobs, then the deferred reindexing, then links the
+    keywords new to the vocabularies and removes the old jobs. This is the
+    worker behind the ``prefs_keywords_worker`` view and the
+    ``keywords-worker`` script. Returns the jobs that have been run.
+    """
+    processed = process_jobs(limit=limit)
+    process_reindex_queue()
+    update_vocabularies()
+    prune_jobs()
+    transaction.commit()
+    return processed
+
+
+def defer_reindex(obj, idxs):
+    """Queues obj to have the indexes ``idxs`` reindexed by the worker."""
+    queue = get_storage(REINDEX)
+    path = "/".join(obj.getPhysicalPath())
+    queue[path] = tuple(set(queue.get(path, ())).union(idxs))
+
+
+def process_reindex_queue(limit=None):
+    """Reindexes the objects queued by defer_reindex().
+
+    Commits after every config.BATCH_SIZE objects. Returns the number of
+    objects that have been reindexed.
+    """
+    queue = query_storage(REINDEX)
+    if queue is None:
+        return 0
+    portal = api.portal.get()
+    count = 0
+    for path in list(queue.keys()):
+        if limit is not None and count >= limit:
+            break
+        idxs = queue.pop(path)
+        obj = portal.unrestrictedTraverse(path, None)
+        if obj is not None:
+            obj.reindexObject(idxs=list(idxs))
+        count += 1
+        if count % config.BATCH_SIZE == 0:
+            transaction.commit()
+    transaction.commit()
+    return count
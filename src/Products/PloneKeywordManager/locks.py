@@ -0,0 +1,229 @@
+"""Leases keeping concurrent keyword operations apart.
+
+Two overlapping merges, or a form submitted twice, used to update the
+same objects in parallel transactions. One of them ended in a
+ConflictError and was retried, redoing all of its work. Now an operation
+first leases the keywords it touches and is rejected if another operation
+holds a lease on one of them. Queued operations wait for the next run of
+the worker instead.
+
+Leases are acquired and released in transactions of their own, so they
+are seen by other requests while the operation is still running. They are
+kept in an OOBTree keyed by (index, keyword): operations on other keywords
+write other keys, which the BTree conflict resolution merges, while two
+operations leasing the same keyword at once conflict on it and the loser
+sees the lease when it retries. A lease expires after
+config.LEASE_TIMEOUT seconds, in case its operation died, and is renewed
+while the operation reports progress.
+
+An operation committing its own chunks releases its lease once it is
+done. Any other operation holds it until the transaction of the request
+is committed or aborted, so its changes are visible before the keywords
+can be leased again. Later operations of the same transaction are not
+locked out by these leases.
+"""
+
+from BTrees.OOBTree import OOBTree
+from collections import namedtuple
+from contextlib import contextmanager
+from plone import api
+from Products.PloneKeywordManager import config
+from Products.PloneKeywordManager import logger
+from Products.PloneKeywordManager.storage import get_storage
+from Products.PloneKeywordManager.storage import query_storage
+
+import time
+import transaction
+import uuid
+
+LEASES = "leases"
+
+Lease = namedtuple("Lease", ("id", "path", "user", "expires"))
+
+
+class OperationLocked(ValueError):
+    """Raised when a keyword is leased by another operation."""
+
+    def __init__(self, indexName, keyword, lease):
+        self.indexName = indexName
+        self.keyword = keyword
+        self.lease = lease
+        super().__init__(
+            f"The keyword {keyword} of {indexName} is being changed by "
+            f"another operation of {lease.user}"
+        )
+
+
+def _nested(path, other):
+    """Tells whether the objects below two paths, None for the whole site,
+    overlap."""
+    if path is None or other is None:
+        return True
+    return path == other or path.startswith(other + "/") or other.startswith(path + "/")
+
+
+def find_lease(leases, indexName, keywords, path=None, now=None, ignore=()):
+    """Returns the (keyword, Lease) of the first unexpired lease on one of
+    the keywords for objects overlapping ``path``, None if there is none.
+    The leases whose id is in ``ignore`` are skipped.
+    """
+    if leases is None:
+        return None
+    if now is None:
+        now = time.time()
+    for keyword in keywords:
+        for record in leases.get((indexName, keyword), ()):
+            lease = Lease(*record)
+            if lease.id in ignore:
+                continue
+            if lease.expires > now and _nested(path, lease.path):
+                return keyword, lease
+    return None
+
+
+def _run(func, portal=None):
+    """Calls func with the portal in a transaction of its own, retried on
+    conflicts, and returns its result. Without a database, e.g. for a
+    portal that has not been stored, func is called within the current
+    transaction.
+    """
+    if portal is None:
+        portal = api.portal.get()
+    jar = portal._p_jar
+    if jar is None:
+        return func(portal)
+    manager = transaction.TransactionManager()
+    connection = jar.db().open(transaction_manager=manager)
+    try:
+        for attempt in manager.attempts(config.CONFLICT_RETRIES + 1):
+            with attempt:
+                result = func(connection.get(portal._p_oid))
+        return result
+    finally:
+        connection.close()
+
+
+def _held(txn):
+    """The ids of the leases released when ``txn`` ends."""
+    try:
+        return txn.data(_held)
+    except KeyError:
+        held = set()
+        txn.set_data(_held, held)
+        return held
+
+
+class OperationLease:
+    """The lease of an operation on the keywords of an index."""
+
+    def __init__(self, indexName, keywords, path=None, user=None):
+        self.id = uuid.uuid4().hex
+        self.indexName = indexName
+        self.keywords = tuple(sorted(set(keywords)))
+        self.path = path
+        if user is None:
+            user = api.user.get_current().getId()
+        self.user = user
+        self.expires = 0
+        # kept for releasing the lease once the site is no longer set up
+        self.portal = api.portal.get()
+
+    def _write(self, portal, leases):
+        # this lease replaces itself and the expired leases of each keyword
+        now = time.time()
+        for keyword in self.keywords:
+            key = (self.indexName, keyword)
+            records = tuple(
+                record
+                for record in leases.get(key, ())
+                if record[0] != self.id and record[3] > now
+            )
+            if self.expires:
+                records += ((self.id, self.path, self.user, self.expires),)
+            if records:
+                leases[key] = records
+            elif key in leases:
+                del leases[key]
+
+    def acquire(self):
+        """Leases the keywords, raises OperationLocked if one of them is
+        leased by another operation."""
+        held = _held(transaction.get())
+
+        def acquire(portal):
+            leases = get_storage(LEASES, factory=OOBTree, portal=portal)
+            found = find_lease(
+                leases, self.indexName, self.keywords, self.path, ignore=held
+            )
+            if found is not None:
+                raise OperationLocked(self.indexName, *found)
+            self.expires = time.time() + config.LEASE_TIMEOUT
+            self._write(portal, leases)
+
+        _run(acquire, self.portal)
+
+    def renew(self):
+        """Extends the lease if half of it has passed."""
+        if self.expires - time.time() > config.LEASE_TIMEOUT / 2:
+            return
+
+        def renew(portal):
+            self.expires = time.time() + config.LEASE_TIMEOUT
+            self._write(portal, get_storage(LEASES, factory=OOBTree, portal=portal))
+
+        _run(renew, self.portal)
+
+    def release(self):
+        if not self.expires:
+            return
+
+        def release(portal):
+            leases = query_storage(LEASES, portal=portal)
+            if leases is not None:
+                self.expires = 0
+                self._write(portal, leases)
+
+        _run(release, self.portal)
+
+    def _release(self, *args):
+        # a transaction hook, the lease expires if it cannot be released
+        try:
+            self.release()
+        except Exception:
+            logger.exception("Could not release the lease %s", self.id)
+
+    def releaseWith(self, txn):
+        """Releases the lease once the transaction ``txn`` is committed or
+        aborted."""
+        _held(txn).add(self.id)
+        txn.addAfterCommitHook(self._release)
+        txn.addAfterAbortHook(self._release)
+
+    def watch(self, progress=None):
+        """Returns a progress callback renewing the lease, calling
+        ``progress`` if given."""
+
+        def watch(done, total):
+            self.renew()
+            if progress is not None:
+                progress(done, total)
+
+        return watch
+
+
+@contextmanager
+def leased(indexName, keywords, path=None, commit=False):
+    """Holds an OperationLease on the keywords while the block runs, or
+    until the current transaction ends unless the block commits its own
+    changes, see ``commit`` of KeywordManager.change().
+    """
+    lease = OperationLease(indexName, keywords, path)
+    lease.acquire()
+    if not commit:
+        lease.releaseWith(transaction.get())
+        yield lease
+        return
+    try:
+        yield lease
+    finally:
+        lease.release()
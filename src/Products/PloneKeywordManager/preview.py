@@ -0,0 +1,123 @@
+"""Estimates the impact of a keyword operation from the catalog indexes,
+without loading any object.
+"""
+
+from BTrees.IIBTree import IISet
+from BTrees.IIBTree import intersection
+from BTrees.IIBTree import multiunion
+from plone import api
+from Products.CMFCore.indexing import processQueue
+from Products.PloneKeywordManager import config
+from Products.PloneKeywordManager.storage import get_storage
+from Products.PloneKeywordManager.storage import query_storage
+
+import itertools
+
+COSTS = "costs"
+
+
+def _rows(index, keywords):
+    rows = []
+    for keyword in keywords:
+        row = index._index.get(keyword)
+        if row is not None:
+            rows.append(row)
+    return multiunion(rows)
+
+
+def _query(catalog, indexName, query, rids):
+    index = catalog._catalog.indexes.get(indexName)
+    if index is None:
+        return rids
+    result = index._apply_index({indexName: query})
+    if result is None:
+        return rids
+    return intersection(rids, result[0])
+
+
+def _allowed(catalog, rids):
+    """The rids the current user may find, like the catalog query does."""
+    user = api.user.get_current()
+    roles = catalog._listAllowedRolesAndUsers(user)
+    return _query(catalog, "allowedRolesAndUsers", roles, rids)
+
+
+def preview(indexName, keywords, newKeywords, path=None, sample=None):
+    """Returns what an operation on the objects using ``keywords`` would do.
+
+    ``newKeywords`` computes the keywords an object ends up with, as for
+    KeywordManager._process(). The objects are found by intersecting the
+    rows of the keyword index with the path index and the objects the
+    current user may see. The result is a dictionary with
+
+    - ``found``: the number of objects using the keywords,
+    - ``changed``: the number of objects whose keywords would change,
+    - ``portal_types``: the number of changed objects per portal type,
+    - ``paths``: the paths of up to ``sample`` (by default
+      config.PREVIEW_SAMPLE) changed objects,
+    - ``estimate``: the estimated runtime in seconds, see record_cost(), or
+      None without earlier runs.
+    """
+    if sample is None:
+        sample = config.PREVIEW_SAMPLE
+    processQueue()
+    catalog = api.portal.get_tool("portal_catalog")
+    index = catalog._catalog.getIndex(indexName)
+    rids = _rows(index, keywords)
+    if path is not None:
+        rids = _query(catalog, "path", {"query": path}, rids)
+    rids = _allowed(catalog, rids)
+
+    changed = IISet()
+    for rid in rids:
+        indexed = index.getEntryForObject(rid, None)
+        if indexed is None:
+            # unknown, the object would be loaded
+            changed.insert(rid)
+            continue
+        indexed = set(indexed)
+        if newKeywords(indexed) != indexed:
+            changed.insert(rid)
+
+    portal_types = {}
+    type_index = catalog._catalog.indexes.get("portal_type")
+    if type_index is not None:
+        for portal_type, row in type_index._index.items():
+            if isinstance(row, int):
+                row = IISet([row])
+            count = len(intersection(changed, row))
+            if count:
+                portal_types[portal_type] = count
+
+    paths = [catalog.getpath(rid) for rid in itertools.islice(changed, sample)]
+    cost = estimated_cost(indexName)
+    return {
+        "found": len(rids),
+        "changed": len(changed),
+        "portal_types": portal_types,
+        "paths": paths,
+        "estimate": None if cost is None else cost * len(changed),
+    }
+
+
+def record_cost(indexName, seconds, count):
+    """Records the time it took to update ``count`` objects, the estimated
+    cost per object follows a moving average of the recorded runs.
+    """
+    if not count:
+        return
+    costs = get_storage(COSTS)
+    cost = seconds / count
+    previous = costs.get(indexName)
+    if previous is not None:
+        cost = previous + config.COST_WEIGHT * (cost - previous)
+    costs[indexName] = cost
+
+
+def estimated_cost(indexName):
+    """The estimated seconds it takes to update one object, None if no run
+    has been recorded."""
+    costs = query_storage(COSTS)
+    if costs is None:
+        return None
+    return costs.get(indexName)
@@ -0,0 +1,122 @@
+"""Cursor based pagination of keyword lists and validators of the index
+state, independent of plone.restapi.
+"""
+
+from email.utils import formatdate
+from persistent.TimeStamp import TimeStamp
+from Products.PloneKeywordManager.cache import sort_key
+
+import base64
+import bisect
+import hashlib
+import json
+import re
+
+# the entity tags of an If-None-Match list, which may contain commas
+ENTITY_TAG = re.compile(r'(?:W/)?"[^"]*"')
+
+
+def encode_cursor(keyword, count):
+    """An opaque cursor pointing after ``keyword``, used ``count`` times."""
+    data = json.dumps([keyword, count]).encode("utf-8")
+    return base64.urlsafe_b64encode(data).decode("ascii")
+
+
+def decode_cursor(cursor):
+    """Returns the (keyword, count) of a cursor, raises ValueError if it is
+    not valid."""
+    try:
+        keyword, count = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+    except (TypeError, ValueError, UnicodeError) as e:
+        raise ValueError(f"Invalid cursor: {e}")
+    if not isinstance(keyword, str) or not isinstance(count, int):
+        raise ValueError("Invalid cursor")
+    return keyword, count
+
+
+def order_key(sort_on, reverse):
+    """The key of (keyword, count) pairs the keyword lists of
+    KeywordManager.getKeywords() are sorted on, ascending unless the list is
+    reversed and sorted on keywords.
+    """
+    if sort_on == "count":
+        sign = -1 if reverse else 1
+        return lambda item: (sign * item[1], sort_key(item[0]))
+    return lambda item: sort_key(item[0])
+
+
+def page(keywords, counts, size, cursor=None, sort_on="keyword", reverse=False):
+    """Returns the keywords following ``cursor`` in the ``keywords``
+    sequence, at most ``size`` of them, and the cursor of the next page or
+    None.
+
+    ``keywords`` is a sequence as returned by
+    KeywordManager.getKeywordSequence() with the same ``sort_on``, always in
+    ascending keyword order when sorted on keywords: the reverse order is
+    read from its end. ``counts`` maps the keywords to the number of objects
+    using them. The position of a cursor is found by bisection, it remains
+    valid if keywords are added or removed meanwhile.
+    """
+    key = order_key(sort_on, reverse)
+    backwards = sort_on != "count" and reverse
+
+    def item_key(keyword):
+        return key((keyword, counts.get(keyword, 0)))
+
+    if cursor is None:
+        start, end = 0, size
+        if backwards:
+            start, end = len(keywords) - size, len(keywords)
+    else:
+        after = key(decode_cursor(cursor))
+        if backwards:
+            end = bisect.bisect_left(keywords, after, key=item_key)
+            start = end - size
+        else:
+            start = bisect.bisect_right(keywords, after, key=item_key)
+            end = start + size
+    start = max(start, 0)
+    items = list(keywords[start:end])
+    more = start > 0 if backwards else end < len(keywords)
+    if backwards:
+        items.reverse()
+    next_cursor = None
+    if items and more:
+        last = items[-1]
+        next_cursor = encode_cursor(last, counts.get(last, 0))
+    return items, next_cursor
+
+
+def validators(states, variant=None):
+    """Returns the ETag and Last-Modified header values for the (counter,
+    serial) states of KeywordManager.getKeywordsState(), (None, None) if
+    they are not known. ``variant`` is hashed into the ETag, it tells apart
+    the responses for other parameters.
+    """
+    if states is None:
+        return None, None
+    parts = [
+        str(counter) if serial is None else f"{counter}-{serial.hex()}"
+        for counter, serial in states
+    ]
+    if variant is not None:
+        parts.append(hashlib.sha1(variant.encode("utf-8")).hexdigest()[:16])
+    etag = f'W/"{"-".join(parts)}"'
+    serials = [serial for counter, serial in states if serial is not None]
+    if not serials:
+        return etag, None
+    modified = formatdate(TimeStamp(max(serials)).timeTime(), usegmt=True)
+    return etag, modified
+
+
+def etag_matches(header, etag):
+    """Tells whether an If-None-Match ``header`` matches ``etag``: it is
+    "*" or lists an entity tag equal to it by the weak comparison of
+    RFC 7232, ignoring the W/ prefixes.
+    """
+    if not header or etag is None:
+        return False
+    if header.strip() == "*":
+        return True
+    opaque = etag.removeprefix("W/")
+    return any(tag.removeprefix("W/") == opaque for tag in ENTITY_TAG.findall(header))
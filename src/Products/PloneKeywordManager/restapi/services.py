@@ -0,0 +1,225 @@
+"""plone.restapi services of the keyword manager:
+
+- ``GET @keywords`` lists the keyword indexes,
+- ``GET @keywords/{index}`` lists the keywords of an index, a page at a time,
+- ``POST @keywords/{index}/merge`` and ``POST @keywords/{index}/delete``
+  merge or delete keywords.
+"""
+
+from plone.protect.interfaces import IDisableCSRFProtection
+from plone.restapi.deserializer import json_body
+from plone.restapi.services import Service
+from Products.PloneKeywordManager.interfaces import IKeywordManager
+from Products.PloneKeywordManager.jobs import enqueue
+from Products.PloneKeywordManager.locks import OperationLocked
+from Products.PloneKeywordManager.restapi.pagination import etag_matches
+from Products.PloneKeywordManager.restapi.pagination import page
+from Products.PloneKeywordManager.restapi.pagination import validators
+from Products.PloneKeywordManager.scope import scope_path
+from zExceptions import BadRequest
+from zExceptions import HTTPConflict
+from zExceptions import NotFound
+from zope.component import getUtility
+from zope.interface import alsoProvides
+from zope.interface import implementer
+from zope.publisher.interfaces import IPublishTraverse
+from ZTUtils import make_query
+
+import json
+
+DEFAULT_SIZE = 100
+MAX_SIZE = 1000
+FIELDS = ("keyword", "count", "similar")
+DEFAULT_FIELDS = ("keyword", "count")
+ORDERS = ("keyword", "count")
+
+
+@implementer(IPublishTraverse)
+class KeywordsService(Service):
+    def __init__(self, context, request):
+        super().__init__(context, request)
+        self.pkm = getUtility(IKeywordManager)
+        self.params = []
+
+    def publishTraverse(self, request, name):
+        self.params.append(name)
+        return self
+
+    @property
+    def base_url(self):
+        return f"{self.context.absolute_url()}/@keywords"
+
+    def index_name(self):
+        indexName = self.params[0]
+        if indexName not in self.pkm.getKeywordIndexes():
+            raise NotFound(f"No keyword index {indexName}")
+        return indexName
+
+
+class KeywordsGet(KeywordsService):
+    def reply(self):
+        if not self.params:
+            return self.reply_indexes()
+        if len(self.params) > 1:
+            raise NotFound("/".join(self.params))
+        return self.reply_keywords(self.index_name())
+
+    def reply_indexes(self):
+        counts = {
+            indexName: len(self.pkm.getKeywordCounts(indexName, context=self.context))
+            for indexName in self.pkm.getKeywordIndexes()
+        }
+        return {
+            "@id": self.base_url,
+            "items": [
+                {
+                    "@id": f"{self.base_url}/{indexName}",
+                    "index": indexName,
+                    "items_total": total,
+                }
+                for indexName, total in counts.items()
+            ],
+        }
+
+    def reply_keywords(self, indexName):
+        form = self.request.form
+        sort_on = form.get("sort_on", "keyword")
+        if sort_on not in ORDERS:
+            raise BadRequest(f"Cannot sort keywords on {sort_on}")
+        reverse = form.get("sort_order", "ascending") in ("descending", "reverse")
+        try:
+            size = min(int(form.get("b_size", DEFAULT_SIZE)), MAX_SIZE)
+        except ValueError:
+            raise BadRequest("b_size must be an integer")
+        fields = form.get("fields", DEFAULT_FIELDS)
+        if isinstance(fields, str):
+            fields = fields.split(",")
+        unknown = set(fields) - set(FIELDS)
+        if unknown:
+            raise BadRequest(f"Unknown fields {', '.join(sorted(unknown))}")
+
+        prefix = form.get("prefix") or None
+        cursor = form.get("cursor") or None
+        states = self.pkm.getKeywordsState(indexName, similar="similar" in fields)
+        if scope_path(self.context) is not None:
+            # moving content changes the scoped keywords, not the index
+            states = None
+        variant = json.dumps(
+            [
+                "/".join(self.context.getPhysicalPath()),
+                sort_on,
+                reverse,
+                size,
+                prefix,
+                cursor,
+                sorted(set(fields)),
+            ]
+        )
+        etag, modified = validators(states, variant)
+        if etag is not None:
+            self.request.response.setHeader("ETag", etag)
+            if modified is not None:
+                self.request.response.setHeader("Last-Modified", modified)
+            if etag_matches(self.request.getHeader("If-None-Match"), etag):
+                return self.reply_no_content(status=304)
+
+        counts = self.pkm.getKeywordCounts(indexName, context=self.context)
+        # read from the end for the reverse keyword order, see page()
+        keywords = self.pkm.getKeywordSequence(
+            indexName,
+            sort_on=sort_on,
+            reverse=reverse and sort_on == "count",
+            prefix=prefix,
+            context=self.context,
+        )
+        try:
+            items, cursor = page(
+                keywords,
+                counts,
+                size,
+                cursor,
+                sort_on=sort_on,
+                reverse=reverse,
+            )
+        except ValueError as e:
+            raise BadRequest(str(e))
+
+        result = {
+            "@id": self.request.getURL(),
+            "index": indexName,
+            "items_total": len(keywords),
+            "items": [self.serialize(indexName, k, counts, fields) for k in items],
+        }
+        if cursor is not None:
+            query = dict(form, cursor=cursor)
+            result["batching"] = {
+                "@id": result["@id"],
+                "next": f"{self.base_url}/{indexName}?{make_query(query)}",
+            }
+        return result
+
+    def serialize(self, indexName, keyword, counts, fields):
+        item = {}
+        if "keyword" in fields:
+            item["keyword"] = keyword
+        if "count" in fields:
+            item["count"] = counts.get(keyword, 0)
+        if "similar" in fields:
+            similar = self.pkm.getSimilarKeywords(keyword, indexName)
+            item["similar"] = similar or []
+        return item
+
+
+class KeywordsPost(KeywordsService):
+    def reply(self):
+        if len(self.params) != 2 or self.params[1] not in ("merge", "delete"):
+            raise NotFound("/".join(self.params))
+        indexName = self.index_name()
+        operation = self.params[1]
+
+        alsoProvides(self.request, IDisableCSRFProtection)
+        data = json_body(self.request)
+        keywords = data.get("keywords")
+        if (
+            not isinstance(keywords, list)
+            or not keywords
+            or not all(isinstance(k, str) for k in keywords)
+        ):
+            raise BadRequest("keywords must be a non-empty list of strings")
+        target = data.get("target")
+        if operation == "merge" and not (isinstance(target, str) and target):
+            raise BadRequest("target must be a non-empty string")
+
+        if data.get("background"):
+            job = enqueue(
+                "change" if operation == "merge" else "delete",
+                keywords,
+                target,
+                indexName=indexName,
+                context=self.context,
+            )
+            self.request.response.setStatus(202)
+            return {"job": job.id}
+
+        preview = bool(data.get("preview"))
+        try:
+            if operation == "merge":
+                result = self.pkm.change(
+                    keywords,
+                    target,
+                    context=self.context,
+                    indexName=indexName,
+                    preview=preview,
+                )
+            else:
+                result = self.pkm.delete(
+                    keywords,
+                    context=self.context,
+                    indexName=indexName,
+                    preview=preview,
+                )
+        except OperationLocked as e:
+            raise HTTPConflict(str(e))
+        if preview:
+            return {"preview": result}
+        return {"updated": result}
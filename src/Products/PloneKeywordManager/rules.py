@@ -0,0 +1,104 @@
+"""Reads rename rules for KeywordManager.applyRules() from CSV or JSON.
+
+CSV files have one rule per row, the old keyword and the new one. An empty
+or missing new keyword deletes the old one. A first row reading
+``old,new`` is skipped.
+
+JSON files hold either an object mapping old keywords to new ones, or a
+list of ``[old, new]`` pairs. ``null`` deletes the old keyword.
+
+JSON Lines files hold one ``[old, new]`` pair or ``{"old": ..., "new": ...}``
+object per line. CSV and JSON Lines can be read as a stream, see
+iter_rules().
+"""
+
+import csv
+import io
+import json
+
+
+def _rule(old, new):
+    if not isinstance(old, str) or not (new is None or isinstance(new, str)):
+        raise ValueError(f"Invalid rule: {old!r} -> {new!r}")
+    old = old.strip()
+    new = new.strip() if new is not None else None
+    if not old:
+        return None
+    return old, new or None
+
+
+def _pair(rule):
+    if isinstance(rule, dict):
+        rule = (rule.get("old"), rule.get("new"))
+    if not isinstance(rule, (list, tuple)) or len(rule) != 2:
+        raise ValueError(f"Invalid rule: {rule!r}")
+    return rule
+
+
+def iter_rules(lines, format="csv"):
+    """Yields the (old, new) rules of ``lines``, an iterable of text lines
+    such as an open file, one at a time. ``format`` is "csv" or "jsonl".
+    Raises ValueError on invalid data.
+    """
+    if format == "csv":
+        for i, row in enumerate(csv.reader(lines)):
+            if not row or (
+                i == 0 and [c.strip().lower() for c in row] == ["old", "new"]
+            ):
+                continue
+            if len(row) > 2:
+                raise ValueError(f"Invalid rule on line {i + 1}: {row!r}")
+            rule = _rule(row[0], row[1] if len(row) > 1 else None)
+            if rule is not None:
+                yield rule
+    elif format == "jsonl":
+        for i, line in enumerate(lines):
+            if not line.strip():
+                continue
+            try:
+                old, new = _pair(json.loads(line))
+            except ValueError as e:
+                raise ValueError(f"Invalid rule on line {i + 1}: {e}")
+            rule = _rule(old, new)
+            if rule is not None:
+                yield rule
+    else:
+        raise ValueError(f"Unknown format {format}")
+
+
+def guess_format(filename, start=""):
+    """Guesses the format of a rules file from its name or its start."""
+    filename = (filename or "").lower()
+    for extension in ("jsonl", "json", "csv"):
+        if filename.endswith("." + extension):
+            return extension
+    return "json" if start.lstrip()[:1] in ("{", "[") else "csv"
+
+
+def parse_rules(data, format=None):
+    """Returns the rules in ``data`` (text or bytes) as a dictionary of
+    old keyword -> new keyword or None. ``format`` is "csv", "json" or
+    "jsonl", it is guessed from the data if not given. Raises ValueError on
+    invalid data.
+    """
+    if isinstance(data, bytes):
+        data = data.decode("utf-8-sig")
+    if format is None:
+        format = guess_format(None, data)
+    if format != "json":
+        return dict(iter_rules(io.StringIO(data), format))
+
+    try:
+        rules = json.loads(data)
+    except ValueError as e:
+        raise ValueError(f"Invalid JSON: {e}")
+    if isinstance(rules, dict):
+        rules = rules.items()
+    elif not isinstance(rules, list):
+        raise ValueError(f"Invalid rules: {rules!r}")
+    parsed = {}
+    for rule in rules:
+        rule = _rule(*_pair(rule))
+        if rule is not None:
+            parsed[rule[0]] = rule[1]
+    return parsed
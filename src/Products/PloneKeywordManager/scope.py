@@ -0,0 +1,70 @@
+"""Keywords and counts restricted to the objects below a folder, e.g. the
+navigation root of a subsite.
+
+The rows of the keyword index are intersected with the result of the path
+index, once per request.
+"""
+
+from BTrees.IIBTree import IISet
+from BTrees.IIBTree import intersection
+from plone import api
+from Products.PloneKeywordManager.cache import KeywordList
+from Products.PloneKeywordManager.cache import request_cache
+from Products.PloneKeywordManager.cache import sort_key
+
+
+def scope_path(context):
+    """The path of ``context`` if keywords are scoped to it, None for the
+    portal or no context."""
+    if context is None:
+        return None
+    path = "/".join(context.getPhysicalPath())
+    if path == "/".join(api.portal.get().getPhysicalPath()):
+        return None
+    return path
+
+
+def path_rids(catalog, path):
+    """The record ids of the objects at or below ``path``."""
+    result = catalog._catalog.getIndex("path")._apply_index({"path": {"query": path}})
+    return IISet() if result is None else result[0]
+
+
+def scoped_counts(index, rids):
+    """Returns the number of objects of ``rids`` per keyword of the index.
+
+    With fewer objects than keywords the keywords of each object are
+    counted, otherwise each row of the index is intersected with ``rids``.
+    """
+    counts = {}
+    if len(rids) < len(index):
+        for rid in rids:
+            for keyword in index.getEntryForObject(rid, None) or ():
+                if keyword is not None:
+                    counts[keyword] = counts.get(keyword, 0) + 1
+        return counts
+    for keyword, row in index._index.items():
+        if keyword is None:
+            continue
+        if isinstance(row, int):
+            count = 1 if row in rids else 0
+        else:
+            count = len(intersection(row, rids))
+        if count:
+            counts[keyword] = count
+    return counts
+
+
+def scoped_keywords(index, path):
+    """Returns a KeywordList of the keywords used below ``path`` with their
+    counts, computed once per request and state of the index.
+    """
+    cache = request_cache("scoped_keywords")
+    key = (index.getId(), path, index.getCounter())
+    entry = cache.get(key)
+    if entry is None:
+        catalog = api.portal.get_tool("portal_catalog")
+        counts = scoped_counts(index, path_rids(catalog, path))
+        keywords = tuple(sorted(counts, key=sort_key))
+        entry = cache[key] = KeywordList(None, keywords, counts)
+    return entry
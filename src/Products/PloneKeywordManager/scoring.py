@@ -0,0 +1,242 @@
+"""Scores many words against a list of keywords at once.
+
+KeywordManager.scoreMatches() used to score a single word, lowercasing
+each keyword again for every word. A Scorer lowercases the keywords once
+and scores any number of words against them, so the similar keywords of
+a whole page are scored in a single call.
+
+Keywords are scored with Levenshtein.ratio() if python-Levenshtein is
+installed, by a built-in matcher giving the same scores otherwise.
+
+Within the background worker, see parallel_scoring(), jobs comparing
+more word/keyword pairs than config.PARALLEL_SCORING are split into
+partitions of the keywords, scored by a pool of worker processes. The
+workers are spawned rather than forked, they do not share the database
+connections or threads of the Zope process. Requests always score in
+their own thread.
+"""
+
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from Products.PloneKeywordManager import config
+from Products.PloneKeywordManager import logger
+
+import multiprocessing
+import os
+import threading
+
+try:
+    import Levenshtein
+
+    USE_LEVENSHTEIN = True
+except ImportError:
+    USE_LEVENSHTEIN = False
+
+# set in the thread of the background worker, see parallel_scoring()
+_worker = threading.local()
+
+# Strings up to this length are matched faster than their characters are
+# counted, only longer strings are compared by their characters first.
+HISTOGRAM_LENGTH = 24
+
+
+def _similarity(common, lensum):
+    # computed like Levenshtein.ratio(), for identical floats
+    if not lensum:
+        return 1.0
+    return 1.0 - (lensum - 2 * common) / lensum
+
+
+class Pattern:
+    """A word prepared for the bit-parallel matcher, which scores like
+    Levenshtein.ratio() when python-Levenshtein is not installed.
+
+    That ratio is based on the edit distance counting insertions and
+    deletions, which is the summed length minus twice the longest common
+    subsequence. The subsequence is computed bit-parallel (Allison-Dix,
+    Hyyrö): one bit per character of the word, one integer operation per
+    character of the other string.
+    """
+
+    def __init__(self, word):
+        self.word = word
+        self.length = len(word)
+        self.full = (1 << self.length) - 1
+        self.masks = {}
+        for i, char in enumerate(word):
+            self.masks[char] = self.masks.get(char, 0) | 1 << i
+        self.histogram = Counter(word)
+
+    def common(self, other):
+        """The length of the longest common subsequence with other."""
+        masks = self.masks
+        full = self.full
+        v = full
+        for char in other:
+            m = masks.get(char)
+            if m is not None:
+                u = v & m
+                v = ((v + u) | (v - u)) & full
+        return self.length - v.bit_count()
+
+    def ratio(self, other, cutoff=None, histogram=None):
+        """The similarity of the word and other, between 0 and 1. Returns
+        None if it is not better than cutoff.
+
+        Strings too different in length, or for longer strings in their
+        characters, are rejected before matching them. ``histogram`` is
+        the Counter of the characters of other if it is known.
+        """
+        length = len(other)
+        lensum = self.length + length
+        if cutoff is not None:
+            if _similarity(min(self.length, length), lensum) <= cutoff:
+                return None
+            if length > HISTOGRAM_LENGTH:
+                if histogram is None:
+                    histogram = Counter(other)
+                shared = 0
+                for char, count in self.histogram.items():
+                    shared += min(count, histogram.get(char, 0))
+                if _similarity(shared, lensum) <= cutoff:
+                    return None
+        lscore = _similarity(self.common(other), lensum)
+        if cutoff is not None and lscore <= cutoff:
+            return None
+        return lscore
+
+
+def ratio(word, other):
+    """The similarity of two strings, like Levenshtein.ratio()."""
+    return Pattern(word).ratio(other)
+
+
+def _score(word, keywords, folded, score, histograms=None):
+    """The unsorted (score, keyword) tuples of the keywords scoring better
+    than score, ``folded`` being the lowercased keywords and
+    ``histograms`` their character counts."""
+    res = []
+    lowered = word.lower()
+    if USE_LEVENSHTEIN:
+        ratio = Levenshtein.ratio
+        for item, folded_item in zip(keywords, folded):
+            if lowered in folded_item:
+                # if the word is a substring always include it
+                lscore = 1
+            else:
+                lscore = ratio(word, item)
+            if lscore > score:
+                res.append((lscore, item))
+    else:
+        # No levenshtein module around, use the built-in matcher.
+        pattern = Pattern(word)
+        if histograms is None:
+            histograms = [None] * len(keywords)
+        for item, folded_item, histogram in zip(keywords, folded, histograms):
+            if lowered in folded_item:
+                lscore = 1
+            else:
+                lscore = pattern.ratio(item, score, histogram)
+            if lscore is not None and lscore > score:
+                res.append((lscore, item))
+    return res
+
+
+def _score_partition(words, keywords, score):
+    """Scores the words against a partition of the keywords, in a worker
+    process."""
+    return Scorer(keywords)._score_serial(words, score)
+
+
+def _processes():
+    return min(config.SCORING_PROCESSES or 1, os.cpu_count() or 1)
+
+
+@contextmanager
+def parallel_scoring():
+    """Lets the scorers used within the block score in worker processes.
+
+    Entered by the background worker only. Concurrent requests each
+    starting a pool would start more processes than there are CPUs.
+    """
+    parallel = getattr(_worker, "parallel", False)
+    _worker.parallel = True
+    try:
+        yield
+    finally:
+        _worker.parallel = parallel
+
+
+class Scorer:
+    """Scores words against ``keywords``, lowercased once."""
+
+    def __init__(self, keywords):
+        self.keywords = tuple(keywords)
+        self.folded = tuple(keyword.lower() for keyword in self.keywords)
+        self.histograms = None
+
+    def __len__(self):
+        return len(self.keywords)
+
+    def score(self, word, score):
+        """Returns (score, keyword) tuples for the keywords scoring better
+        than score, best matches first."""
+        return self.score_many([word], score)[word]
+
+    def score_many(self, words, score, num=None):
+        """Returns a dict of the (score, keyword) tuples of each word, like
+        score(), with at most ``num`` tuples per word.
+        """
+        words = list(dict.fromkeys(words))
+        processes = _processes()
+        if (
+            getattr(_worker, "parallel", False)
+            and processes > 1
+            and len(self.keywords) > processes
+            and len(words) * len(self.keywords) > config.PARALLEL_SCORING
+        ):
+            scored = self._score_parallel(words, score, processes)
+        else:
+            scored = self._score_serial(words, score)
+        result = {}
+        for word, res in zip(words, scored):
+            # Sort by score and alphabet (high scores on top of list)
+            res.sort(reverse=True)
+            result[word] = res[:num]
+        return result
+
+    def _score_parallel(self, words, score, processes):
+        """Scores the words against partitions of the keywords in a pool of
+        spawned processes, shut down before returning."""
+        size = -(-len(self.keywords) // processes)
+        partitions = [
+            self.keywords[i : i + size] for i in range(0, len(self.keywords), size)
+        ]
+        scored = [[] for word in words]
+        context = multiprocessing.get_context("spawn")
+        try:
+            with ProcessPoolExecutor(len(partitions), mp_context=context) as pool:
+                futures = [
+                    pool.submit(_score_partition, words, partition, score)
+                    for partition in partitions
+                ]
+                for future in futures:
+                    for res, partial in zip(scored, future.result()):
+                        res.extend(partial)
+        except (OSError, RuntimeError):
+            logger.exception("Could not score in worker processes")
+            return self._score_serial(words, score)
+        return scored
+
+    def _score_serial(self, words, score):
+        if not USE_LEVENSHTEIN and len(words) > 1 and self.histograms is None:
+            # counted once for all words
+            self.histograms = [
+                Counter(keyword) if len(keyword) > HISTOGRAM_LENGTH else None
+                for keyword in self.keywords
+            ]
+        return [
+            _score(word, self.keywords, self.folded, score, self.histograms)
+            for word in words
+        ]
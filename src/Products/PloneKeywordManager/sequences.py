@@ -0,0 +1,81 @@
+"""Lazy sequences over the cached keyword lists, see cache.py.
+
+The keyword indexes keep their keywords in an OOBTree, ordered by code
+point, while the keyword manager lists them case-insensitively. The cached
+tuple sorted by cache.sort_key() serves as the case-insensitive key
+structure: pages and prefixes are found in it by bisection and only the
+keywords shown are read, instead of copying the whole list per request.
+"""
+
+from Products.PloneKeywordManager.cache import sort_key
+
+import bisect
+
+# sorts after any keyword starting with a given prefix
+_HIGHEST = "\U0010ffff"
+
+
+def prefix_bounds(keywords, prefix):
+    """Returns the (start, end) positions of the keywords starting with
+    ``prefix``, case-insensitively, in a tuple sorted by sort_key().
+    """
+    prefix = prefix.lower()
+    start = bisect.bisect_left(keywords, (prefix,), key=sort_key)
+    end = bisect.bisect_left(keywords, (prefix + _HIGHEST,), key=sort_key)
+    return start, end
+
+
+def initials(keywords):
+    """Returns the distinct lowercased first characters of the keywords, a
+    tuple sorted by sort_key(), reading one keyword per initial.
+    """
+    result = []
+    position = 0
+    while position < len(keywords):
+        initial = keywords[position].lower()[:1]
+        if initial:
+            result.append(initial)
+        position = bisect.bisect_left(
+            keywords, (initial + _HIGHEST,), key=sort_key, lo=position + 1
+        )
+    return result
+
+
+class KeywordSequence:
+    """A read-only sequence of the keywords from ``start`` to ``end`` of a
+    keyword tuple, in reverse order with ``reverse``. The tuple is shared,
+    items are only read when accessed.
+    """
+
+    def __init__(self, keywords, start=0, end=None, reverse=False):
+        self.keywords = keywords
+        self.start = start
+        self.end = len(keywords) if end is None else end
+        self.reverse = reverse
+
+    def __len__(self):
+        return max(self.end - self.start, 0)
+
+    def _position(self, i):
+        if self.reverse:
+            return self.end - 1 - i
+        return self.start + i
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [
+                self.keywords[self._position(j)] for j in range(*i.indices(len(self)))
+            ]
+        length = len(self)
+        if i < 0:
+            i += length
+        if not 0 <= i < length:
+            raise IndexError("keyword sequence index out of range")
+        return self.keywords[self._position(i)]
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self.keywords[self._position(i)]
+
+    def __repr__(self):
+        return f"<KeywordSequence of {len(self)} keywords>"
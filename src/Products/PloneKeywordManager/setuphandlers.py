@@ -1,8 +1,10 @@
-from plone import api
 from Products.CMFPlone.interfaces import INonInstallable
 from Products.PloneKeywordManager.compat import to_str
+from Products.PloneKeywordManager.transfer import import_keywords
 from zope.interface import implementer
 
+import io
+
 
 @implementer(INonInstallable)
 class HiddenProfiles:
@@ -11,26 +13,26 @@ class HiddenProfiles:
         return ["Products.PloneKeywordManager:uninstall"]
 
 
+def _lines(context, filename):
+    """Iterates over the lines of a file of the profile without reading it
+    all at once, if the import context allows to."""
+    openDataFile = getattr(context, "openDataFile", None)
+    if openDataFile is not None:
+        data = openDataFile(filename)
+        if data is None:
+            return None
+        return io.TextIOWrapper(data, encoding="utf-8-sig", newline="")
+    data = context.readDataFile(filename)
+    if data is None:
+        return None
+    return io.StringIO(to_str(data), newline="")
+
+
 def importKeywords(context):
-    """Create a document with an empty body to setup all keywords"""
-    keywords = context.readDataFile("keywords.txt")
+    """Create documents with an empty body to setup all keywords listed in
+    keywords.txt, see transfer.import_keywords()."""
+    keywords = _lines(context, "keywords.txt")
     if keywords is None:
         return
-
-    keywords = to_str(keywords)
-    keywordlist = [i for i in keywords.split("\n") if i]
-    if len(keywordlist) < 1:
-        return
-
-    portal = context.getSite()
-    cid = "keywords"
-    doc = getattr(portal, cid, None)
-
-    if doc is None:
-        doc = api.content.create(
-            container=portal, type="Document", id=cid, title="Subjects"
-        )
-
-    doc.setSubject(keywordlist)
-    doc.exclude_from_nav = True
-    doc.reindexObject()
+    with keywords:
+        import_keywords(context.getSite(), keywords)
@@ -0,0 +1,31 @@
+from BTrees.OOBTree import OOBTree
+from plone import api
+from zope.annotation.interfaces import IAnnotations
+
+ANNOTATION_KEY = "Products.PloneKeywordManager"
+
+
+def _key(name):
+    return f"{ANNOTATION_KEY}.{name}"
+
+
+def get_storage(name, factory=OOBTree, portal=None):
+    """Return the persistent storage ``name`` kept in the annotations of the
+    portal, creating it with ``factory`` if it does not exist yet.
+    """
+    if portal is None:
+        portal = api.portal.get()
+    annotations = IAnnotations(portal)
+    storage = annotations.get(_key(name))
+    if storage is None:
+        storage = annotations[_key(name)] = factory()
+    return storage
+
+
+def query_storage(name, portal=None):
+    """Like get_storage, but never writes: returns None if the storage
+    does not exist yet. Use this on read-only code paths.
+    """
+    if portal is None:
+        portal = api.portal.get()
+    return IAnnotations(portal).get(_key(name))
@@ -1,6 +1,9 @@
 from plone.app.testing import setRoles
 from plone.app.testing import TEST_USER_ID
 from Products.PloneKeywordManager.interfaces import IKeywordManager
+from Products.PloneKeywordManager.locks import _run
+from Products.PloneKeywordManager.locks import LEASES
+from Products.PloneKeywordManager.storage import query_storage
 from Products.PloneKeywordManager.testing import PLONEKEYWORDMANAGER_INTEGRATION_TESTING
 from zope.component import getMultiAdapter
 from zope.component import getUtility
@@ -17,6 +20,16 @@ class BaseIntegrationTestCase(unittest.TestCase):
         self.request = self.layer["request"]
         setRoles(self.portal, TEST_USER_ID, ["Manager"])
         self.pkm = getUtility(IKeywordManager)
+        self.addCleanup(self._clearLeases)
+
+    def _clearLeases(self):
+        # leases are committed in transactions of their own, see locks.py
+        def clear(portal):
+            leases = query_storage(LEASES, portal=portal)
+            if leases:
+                leases.clear()
+
+        _run(clear, self.portal)
 
 
 class PKMTestCase(BaseIntegrationTestCase):
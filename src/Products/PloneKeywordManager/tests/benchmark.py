@@ -0,0 +1,192 @@
+"""Helpers to measure how much work keyword operations do."""
+
+from plone import api
+from Products.CMFCore.CMFCatalogAware import CatalogAware
+from Products.ZCatalog.CatalogBrains import AbstractCatalogBrain
+from unittest import mock
+
+import bisect
+import itertools
+import json
+import platform
+import random
+import time
+
+SYLLABLES = ("ka", "lo", "mi", "ne", "pu", "ra", "si", "to", "ve", "zu")
+
+
+class ObjectLoadCounter:
+    """Counts the content objects woken up through catalog brains while
+    the counter is active.
+    """
+
+    def __init__(self):
+        self.loads = 0
+
+    def _counting(self, method):
+        counter = self
+
+        def wrapper(brain, *args, **kwargs):
+            counter.loads += 1
+            return method(brain, *args, **kwargs)
+
+        return wrapper
+
+    def __enter__(self):
+        self._patches = [
+            mock.patch.object(
+                AbstractCatalogBrain,
+                name,
+                self._counting(getattr(AbstractCatalogBrain, name)),
+            )
+            for name in ("getObject", "_unrestrictedGetObject")
+        ]
+        for patch in self._patches:
+            patch.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        for patch in self._patches:
+            patch.stop()
+
+
+def create_documents(container, count, keywords):
+    """Create ``count`` documents, ``keywords(i)`` returns the subjects of
+    the i-th one.
+    """
+    documents = []
+    for i in range(count):
+        doc = api.content.create(container=container, type="Document", id=f"bench{i}")
+        doc.setSubject(keywords(i))
+        doc.reindexObject()
+        documents.append(doc)
+    return documents
+
+
+class ReindexCounter:
+    """Counts the calls to reindexObject() and the indexes they update
+    while the counter is active. Reindexing all indexes is counted as "*".
+    """
+
+    def __init__(self):
+        self.calls = 0
+        self.indexes = {}
+
+    def __enter__(self):
+        counter = self
+        reindexObject = CatalogAware.reindexObject
+
+        def wrapper(obj, idxs=(), *args, **kwargs):
+            counter.calls += 1
+            for name in idxs or ["*"]:
+                counter.indexes[name] = counter.indexes.get(name, 0) + 1
+            return reindexObject(obj, list(idxs), *args, **kwargs)
+
+        self._patch = mock.patch.object(CatalogAware, "reindexObject", wrapper)
+        self._patch.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._patch.stop()
+
+
+def make_vocabulary(size, seed=0):
+    """Returns ``size`` distinct made-up keywords, in random order."""
+    rnd = random.Random(seed)
+    keywords = set()
+    while len(keywords) < size:
+        word = "".join(rnd.choices(SYLLABLES, k=rnd.randint(2, 5)))
+        # some case variants, like real vocabularies have
+        keywords.add(word.capitalize() if rnd.random() < 0.1 else word)
+    keywords = sorted(keywords)
+    rnd.shuffle(keywords)
+    return keywords
+
+
+def zipf_assignment(vocabulary, per_object=3, exponent=1.1, seed=0):
+    """Returns a function giving the keywords of the i-th object: 1 to
+    ``per_object`` keywords drawn from ``vocabulary`` with a Zipf
+    distribution, the first keywords being the most used.
+    """
+    weights = itertools.accumulate(
+        1.0 / rank**exponent for rank in range(1, len(vocabulary) + 1)
+    )
+    cumulative = list(weights)
+    total = cumulative[-1]
+
+    def keywords(i):
+        rnd = random.Random(seed * 1000003 + i)
+        count = rnd.randint(1, per_object)
+        return sorted(
+            {
+                vocabulary[bisect.bisect_left(cumulative, rnd.random() * total)]
+                for n in range(count)
+            }
+        )
+
+    return keywords
+
+
+def generate_site(container, objects, keywords, per_object=3, seed=0):
+    """Creates ``objects`` documents using a vocabulary of ``keywords``
+    keywords with a Zipf distribution. Returns the vocabulary, most used
+    keywords first.
+    """
+    vocabulary = make_vocabulary(keywords, seed)
+    create_documents(
+        container, objects, zipf_assignment(vocabulary, per_object, seed=seed)
+    )
+    return vocabulary
+
+
+class Benchmark:
+    """Times operations and counts the objects they load and reindex.
+
+    The results are collected in ``results`` and can be written as JSON
+    along with the parameters of the site, see write().
+    """
+
+    def __init__(self, **parameters):
+        self.parameters = parameters
+        self.results = {}
+
+    def measure(self, name, operation, repeat=1):
+        """Runs ``operation`` ``repeat`` times and records the best time.
+        Returns the result of the last run."""
+        best = None
+        with ObjectLoadCounter() as loads, ReindexCounter() as reindexes:
+            for i in range(repeat):
+                start = time.perf_counter()
+                result = operation()
+                elapsed = time.perf_counter() - start
+                best = elapsed if best is None else min(best, elapsed)
+        self.results[name] = {
+            "seconds": best,
+            "repeat": repeat,
+            "loads": loads.loads // repeat,
+            "reindexes": reindexes.calls // repeat,
+            "reindexed_indexes": reindexes.indexes,
+        }
+        return result
+
+    def report(self):
+        """The results as a dictionary."""
+        return {
+            "parameters": self.parameters,
+            "python": platform.python_version(),
+            "time": time.time(),
+            "results": self.results,
+        }
+
+    def write(self, path):
+        with open(path, "w") as f:
+            json.dump(self.report(), f, indent=2, sort_keys=True)
+
+    def summary(self):
+        lines = []
+        for name, result in self.results.items():
+            lines.append(
+                f"{name}: {result['seconds'] * 1000:.1f} ms, "
+                f"{result['loads']} loads, {result['reindexes']} reindexes"
+            )
+        return "\n".join(lines)
@@ -0,0 +1,44 @@
+from plone import api
+from Products.PloneKeywordManager.accessors import AttributeAccessor
+from Products.PloneKeywordManager.accessors import KeywordFieldStrategy
+from Products.PloneKeywordManager.accessors import MethodAccessor
+from Products.PloneKeywordManager.tests.base import PKMTestCase
+from unittest import mock
+
+
+class AccessorsTestCase(PKMTestCase):
+    def setUp(self):
+        super().setUp()
+        self.documents = []
+        for i in range(3):
+            doc = api.content.create(
+                container=self.portal, type="Document", id=f"doc{i}"
+            )
+            doc.setSubject(["foo"])
+            doc.reindexObject()
+            self.documents.append(doc)
+
+    def test_dublincore_setter(self):
+        accessor = self.pkm.getAccessor(self.documents[0], "Subject")
+        self.assertIsInstance(accessor, MethodAccessor)
+        accessor.set(self.documents[1], ["bar"])
+        self.assertEqual(self.documents[1].Subject(), ("bar",))
+        self.assertEqual(accessor.get(self.documents[1]), ("bar",))
+
+    def test_dexterity_attribute(self):
+        self.portal.portal_catalog.addIndex("getFoo", "KeywordIndex")
+        accessor = self.pkm.getAccessor(self.documents[0], "getFoo")
+        self.assertIsInstance(accessor, AttributeAccessor)
+        self.assertEqual(accessor.attributeName, "foo")
+
+    def test_strategy_is_asked_once_per_type(self):
+        with mock.patch.object(
+            KeywordFieldStrategy,
+            "accessor",
+            autospec=True,
+            side_effect=KeywordFieldStrategy.accessor,
+        ) as accessor:
+            self.pkm.change(["foo"], "bar")
+        self.assertEqual(accessor.call_count, 1)
+        for doc in self.documents:
+            self.assertEqual(doc.Subject(), ("bar",))
@@ -0,0 +1,167 @@
+from BTrees.LOBTree import LOBTree
+from plone import api
+from Products.PloneKeywordManager.audit import AUDIT
+from Products.PloneKeywordManager.audit import DELTAS
+from Products.PloneKeywordManager.audit import get_deltas
+from Products.PloneKeywordManager.audit import log_operation
+from Products.PloneKeywordManager.audit import pack_uids
+from Products.PloneKeywordManager.audit import read_log
+from Products.PloneKeywordManager.audit import unpack_uids
+from Products.PloneKeywordManager.jobs import enqueue
+from Products.PloneKeywordManager.jobs import run_job
+from Products.PloneKeywordManager.storage import get_storage
+from Products.PloneKeywordManager.tests.base import PKMTestCase
+from unittest import mock
+from zope.component import getMultiAdapter
+
+import time
+
+
+class AuditTestCase(PKMTestCase):
+    def setUp(self):
+        super().setUp()
+        self.docs = []
+        for i, subject in enumerate([["a", "b"], ["b"], ["c"]]):
+            doc = api.content.create(
+                container=self.portal, type="Document", id=f"doc{i}"
+            )
+            doc.setSubject(subject)
+            doc.reindexObject()
+            self.docs.append(doc)
+
+    def test_pack_uids(self):
+        uids = [doc.UID() for doc in self.docs]
+        self.assertEqual(len(pack_uids(uids)), 48)
+        self.assertEqual(unpack_uids(pack_uids(uids)), uids)
+        self.assertEqual(unpack_uids(pack_uids(["not-a-uid"])), ["not-a-uid"])
+
+    def test_operations_are_logged(self):
+        self.pkm.change(["a", "b"], "x")
+        self.pkm.delete(["c"])
+        self.pkm.applyRules({"x": "y"})
+        entries, before = read_log()
+        self.assertIsNone(before)
+        self.assertEqual([e.operation for e in entries], ["rules", "delete", "change"])
+        change = entries[-1]
+        self.assertEqual(change.index, "Subject")
+        self.assertEqual(change.keywords, ("a", "b"))
+        self.assertEqual(change.new, "x")
+        self.assertEqual(change.user, "test_user_1_")
+        self.assertEqual(change.count, 2)
+        uids = [uid for removed, added, uids in get_deltas(change.key) for uid in uids]
+        self.assertEqual(sorted(uids), sorted(d.UID() for d in self.docs[:2]))
+        self.assertEqual(entries[0].new, ("y",))
+        # the UIDs are only kept with the deltas
+        record = get_storage(AUDIT, factory=LOBTree)[change.key]
+        self.assertEqual(record[6:], (change.duration, 2))
+
+    def test_preview_is_not_logged(self):
+        self.pkm.delete(["c"], preview=True)
+        self.assertEqual(read_log(), ([], None))
+
+    def test_paging_and_filters(self):
+        for i in range(5):
+            log_operation("delete", "Subject", [f"k{i}"], None, None, 0, 0.1)
+        log_operation("change", "Subject", ["Plone"], "plone", None, 0, 0.1)
+        entries, before = read_log(size=2, operation="delete")
+        self.assertEqual([e.keywords for e in entries], [("k4",), ("k3",)])
+        entries, before = read_log(size=3, before=before, operation="delete")
+        self.assertEqual([e.keywords for e in entries], [("k2",), ("k1",), ("k0",)])
+        self.assertIsNone(before)
+        self.assertEqual(len(read_log(keyword="PLONE")[0]), 1)
+        self.assertEqual(read_log(user="someone")[0], [])
+        self.assertEqual(read_log(since=time.time() + 60)[0], [])
+
+    def test_log_view(self):
+        self.pkm.change(["a"], "x")
+        self.request.form["operation"] = "change"
+        view = getMultiAdapter((self.portal, self.request), name="prefs_keywords_log")
+        html = view()
+        self.assertIn('id="keyword-log"', html)
+        self.assertIsNone(view.nextUrl())
+
+
+class RevertTestCase(PKMTestCase):
+    def setUp(self):
+        super().setUp()
+        self.docs = []
+        for i, subject in enumerate([["a", "b"], ["b", "x"], ["c"]]):
+            doc = api.content.create(
+                container=self.portal, type="Document", id=f"doc{i}"
+            )
+            doc.setSubject(subject)
+            doc.reindexObject()
+            self.docs.append(doc)
+
+    def last_key(self):
+        return read_log(size=1)[0][0].key
+
+    def test_deltas_are_grouped(self):
+        self.pkm.change(["a", "b"], "x")
+        deltas = sorted(get_deltas(self.last_key()))
+        self.assertEqual(
+            deltas,
+            [
+                (("a", "b"), ("x",), [self.docs[0].UID()]),
+                (("b",), (), [self.docs[1].UID()]),
+            ],
+        )
+
+    def test_revert_change(self):
+        self.pkm.change(["a", "b"], "x")
+        self.assertEqual(self.pkm.revert(self.last_key()), 2)
+        self.assertEqual(sorted(self.docs[0].Subject()), ["a", "b"])
+        self.assertEqual(sorted(self.docs[1].Subject()), ["b", "x"])
+        self.assertEqual(self.pkm.getKeywords(), ["a", "b", "c", "x"])
+        self.assertEqual(read_log(size=1)[0][0].operation, "revert")
+
+    def test_revert_delete_and_the_revert(self):
+        self.pkm.delete(["c"])
+        self.pkm.revert(self.last_key())
+        self.assertEqual(self.docs[2].Subject(), ("c",))
+        self.pkm.revert(self.last_key())
+        self.assertEqual(self.docs[2].Subject(), ())
+
+    def test_changed_objects_are_not_loaded(self):
+        self.pkm.change(["a"], "z")
+        key = self.last_key()
+        self.docs[0].setSubject(["b"])
+        self.docs[0].reindexObject()
+        with mock.patch.object(
+            self.pkm, "updateObject", wraps=self.pkm.updateObject
+        ) as update:
+            self.assertEqual(self.pkm.revert(key), 0)
+        update.assert_not_called()
+        self.assertEqual(self.docs[0].Subject(), ("b",))
+
+    def test_unknown_operation(self):
+        with self.assertRaises(ValueError):
+            self.pkm.revert(1)
+
+    def test_revert_from_log_view(self):
+        self.pkm.delete(["c"])
+        self.request.form.update({"form.button.Revert": "1", "key": self.last_key()})
+        view = getMultiAdapter((self.portal, self.request), name="prefs_keywords_log")
+        view()
+        self.assertEqual(self.docs[2].Subject(), ("c",))
+
+    def test_revert_in_background(self):
+        self.pkm.delete(["c"])
+        job = enqueue("revert", ["c"], log_key=self.last_key())
+        with mock.patch("transaction.commit"):
+            run_job(job)
+        self.assertEqual(job.status, "done")
+        self.assertEqual(self.docs[2].Subject(), ("c",))
+
+    def test_revert_counts_objects_once(self):
+        # logged twice, as a retried chunk used to be
+        uid = self.docs[2].UID()
+        self.docs[2].setSubject(["d"])
+        self.docs[2].reindexObject()
+        key = log_operation("change", "Subject", ["c"], "d", None, 2, 0.1)
+        get_storage(DELTAS, factory=LOBTree)[key] = (
+            ((("c",), ("d",)), pack_uids([uid, uid])),
+        )
+        self.assertEqual(self.pkm.revert(key), 1)
+        self.assertEqual(self.docs[2].Subject(), ("c",))
+        self.assertEqual(read_log(size=1)[0][0].count, 1)
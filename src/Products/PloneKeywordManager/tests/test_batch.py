@@ -0,0 +1,158 @@
+from plone import api
+from plone.app.testing import setRoles
+from plone.app.testing import TEST_USER_ID
+from Products.PloneKeywordManager.audit import get_deltas
+from Products.PloneKeywordManager.audit import read_log
+from Products.PloneKeywordManager.batch import checkpoint_key
+from Products.PloneKeywordManager.batch import CHECKPOINTS
+from Products.PloneKeywordManager.batch import get_checkpoint
+from Products.PloneKeywordManager.interfaces import IKeywordManager
+from Products.PloneKeywordManager.storage import query_storage
+from Products.PloneKeywordManager.testing import PLONEKEYWORDMANAGER_FUNCTIONAL_TESTING
+from Products.PloneKeywordManager.tests.base import PKMTestCase
+from unittest import mock
+from ZODB.POSException import ConflictError
+from zope.component import getUtility
+
+import transaction
+import unittest
+
+
+class BatchedOperationsTestCase(PKMTestCase):
+    def setUp(self):
+        super().setUp()
+        self.documents = []
+        for i in range(5):
+            doc = api.content.create(
+                container=self.portal, type="Document", id=f"doc{i}"
+            )
+            doc.setSubject(["foo", f"bar{i}"])
+            doc.reindexObject()
+            self.documents.append(doc)
+
+    def test_change_in_small_batches(self):
+        count = self.pkm.change(["foo"], "baz", batch_size=2)
+        self.assertEqual(count, 5)
+        for doc in self.documents:
+            self.assertIn("baz", doc.Subject())
+            self.assertNotIn("foo", doc.Subject())
+
+    def test_delete_in_small_batches(self):
+        count = self.pkm.delete(["foo"], batch_size=2)
+        self.assertEqual(count, 5)
+        for doc in self.documents:
+            self.assertNotIn("foo", doc.Subject())
+        self.assertNotIn("foo", self.pkm.getKeywords())
+
+
+class CommittedBatchesTestCase(unittest.TestCase):
+
+    layer = PLONEKEYWORDMANAGER_FUNCTIONAL_TESTING
+
+    def setUp(self):
+        self.portal = self.layer["portal"]
+        setRoles(self.portal, TEST_USER_ID, ["Manager"])
+        self.pkm = getUtility(IKeywordManager)
+        for i in range(5):
+            doc = api.content.create(
+                container=self.portal, type="Document", id=f"doc{i}"
+            )
+            doc.setSubject(["foo", "Foo"])
+            doc.reindexObject()
+        transaction.commit()
+
+    def test_resume_from_checkpoint(self):
+        # Pretend a previous run already handled doc0 before it was interrupted
+        rid = api.content.find(id="doc0")[0].getRID()
+        key = checkpoint_key("change", "Subject", ["Foo", "foo"], "Foo", None)
+        get_checkpoint(key).done.insert(rid)
+        transaction.commit()
+
+        with mock.patch.object(self.pkm, "updateObject") as updateObject:
+            count = self.pkm.change(["foo", "Foo"], "Foo", batch_size=2, commit=True)
+
+        self.assertEqual(count, 5)
+        self.assertEqual(updateObject.call_count, 4)
+        self.assertNotIn(key, query_storage(CHECKPOINTS))
+
+    def test_conflicting_batch_is_retried(self):
+        commit = transaction.commit
+        conflicts = []
+
+        def conflicting_commit():
+            if not conflicts:
+                conflicts.append(True)
+                raise ConflictError()
+            commit()
+
+        with mock.patch(
+            "Products.PloneKeywordManager.batch.transaction.commit",
+            side_effect=conflicting_commit,
+        ):
+            count = self.pkm.change(["foo"], "bar", batch_size=2, commit=True)
+
+        self.assertEqual(conflicts, [True])
+        self.assertEqual(count, 5)
+        for i in range(5):
+            self.assertNotIn("foo", self.portal[f"doc{i}"].Subject())
+            self.assertIn("bar", self.portal[f"doc{i}"].Subject())
+        # the retried batch is logged once
+        [entry], before = read_log(size=1)
+        self.assertEqual(entry.count, 5)
+        self.assertEqual(len(get_deltas(entry.key)[0][2]), 5)
+        self.assertEqual(self.pkm.revert(entry.key), 5)
+
+    def test_checkpoint_survives_conflict_of_first_batch(self):
+        commit = transaction.commit
+        commits = []
+
+        def interrupted_commit():
+            commits.append(True)
+            if len(commits) == 1:
+                raise ConflictError()
+            if len(commits) == 3:
+                raise RuntimeError("interrupted")
+            commit()
+
+        with mock.patch(
+            "Products.PloneKeywordManager.batch.transaction.commit",
+            side_effect=interrupted_commit,
+        ):
+            with self.assertRaises(RuntimeError):
+                self.pkm.change(["foo"], "bar", batch_size=2, commit=True)
+        transaction.abort()
+
+        key = checkpoint_key("change", "Subject", ["foo"], "bar", None)
+        self.assertEqual(len(query_storage(CHECKPOINTS)[key].done), 2)
+        with mock.patch.object(self.pkm, "updateObject") as updateObject:
+            self.assertEqual(
+                self.pkm.change(["foo"], "bar", batch_size=2, commit=True), 5
+            )
+        self.assertEqual(updateObject.call_count, 3)
+
+    def test_interrupted_operation_can_be_reverted(self):
+        commit = transaction.commit
+        commits = []
+
+        def interrupted_commit():
+            commits.append(True)
+            if len(commits) == 2:
+                raise RuntimeError("interrupted")
+            commit()
+
+        with mock.patch(
+            "Products.PloneKeywordManager.batch.transaction.commit",
+            side_effect=interrupted_commit,
+        ):
+            with self.assertRaises(RuntimeError):
+                self.pkm.change(["foo"], "bar", batch_size=2, commit=True)
+        transaction.abort()
+
+        # the changes of the committed batch have been logged with it
+        [entry], before = read_log(size=1)
+        self.assertEqual(entry.count, 2)
+        [(removed, added, uids)] = get_deltas(entry.key)
+        self.assertEqual((removed, added), (("foo",), ("bar",)))
+        self.assertEqual(len(uids), 2)
+        self.assertEqual(self.pkm.revert(entry.key), 2)
+        self.assertEqual(len(api.content.find(Subject="bar")), 0)
@@ -0,0 +1,178 @@
+from plone.app.testing import setRoles
+from plone.app.testing import TEST_USER_ID
+from Products.PloneKeywordManager import cache
+from Products.PloneKeywordManager.interfaces import IKeywordManager
+from Products.PloneKeywordManager.testing import PLONEKEYWORDMANAGER_FUNCTIONAL_TESTING
+from Products.PloneKeywordManager.tests.base import PKMTestCase
+from Products.PloneKeywordManager.tests.benchmark import Benchmark
+from Products.PloneKeywordManager.tests.benchmark import create_documents
+from Products.PloneKeywordManager.tests.benchmark import generate_site
+from Products.PloneKeywordManager.tests.benchmark import ObjectLoadCounter
+from Products.PloneKeywordManager.vocabulary import KeywordVocabulary
+from zope.component import getMultiAdapter
+from zope.component import getUtility
+
+import os
+import random
+import time
+import transaction
+import unittest
+
+# Set e.g. PKM_BENCHMARK_SIZE=5000 to benchmark a bigger site and report
+# the numbers. PKM_BENCHMARK_KEYWORDS sets the number of distinct keywords
+# of the scaling benchmark, PKM_BENCHMARK_OUTPUT a file to write its
+# results to as JSON.
+SIZE = int(os.environ.get("PKM_BENCHMARK_SIZE", 40))
+KEYWORDS = int(os.environ.get("PKM_BENCHMARK_KEYWORDS", SIZE * 2))
+OUTPUT = os.environ.get("PKM_BENCHMARK_OUTPUT")
+REPORT = "PKM_BENCHMARK_SIZE" in os.environ
+
+
+class ObjectLoadsTestCase(PKMTestCase):
+    """Objects used to be loaded for every catalog hit, now only the
+    objects whose keywords actually change are loaded.
+    """
+
+    def setUp(self):
+        super().setUp()
+        # half of the documents only use the keyword we merge into
+        create_documents(
+            self.portal,
+            SIZE,
+            lambda i: ["Plone", "plone"] if i % 2 else ["Plone"],
+        )
+
+    def report(self, operation, hits, loads):
+        if REPORT:
+            print(f"\n{operation}: {loads} objects loaded, before: {hits}")
+
+    def test_merge_loads_changed_objects_only(self):
+        with ObjectLoadCounter() as counter:
+            hits = self.pkm.change(["plone", "Plone"], "Plone")
+        self.report("merge", hits, counter.loads)
+        self.assertEqual(hits, SIZE)
+        self.assertEqual(counter.loads, SIZE // 2)
+        self.assertEqual(self.pkm.getKeywordLength("plone"), 0)
+        self.assertEqual(self.pkm.getKeywordLength("Plone"), SIZE)
+
+    def test_noop_rename_loads_nothing(self):
+        with ObjectLoadCounter() as counter:
+            hits = self.pkm.change(["Plone"], "Plone")
+        self.report("rename to itself", hits, counter.loads)
+        self.assertEqual(hits, SIZE)
+        self.assertEqual(counter.loads, 0)
+
+
+class FuzzySearchTestCase(PKMTestCase):
+    """Fuzzy searches used to score every keyword, with the trigram
+    vocabulary only the candidates are scored.
+    """
+
+    def setUp(self):
+        super().setUp()
+        rnd = random.Random(SIZE)
+        syllables = ["ka", "lo", "mi", "ne", "pu", "ra", "si", "to", "ve", "zu"]
+        self.keywords = sorted(
+            {
+                "".join(rnd.choices(syllables, k=rnd.randint(2, 5)))
+                for i in range(SIZE * 25)
+            }
+        )
+        self.vocabulary = KeywordVocabulary()
+        for keyword in self.keywords:
+            self.vocabulary.add(keyword)
+        self.words = rnd.sample(self.keywords, 10)
+
+    def timed(self, search):
+        start = time.perf_counter()
+        results = [search(word) for word in self.words]
+        return time.perf_counter() - start, results
+
+    def test_trigram_search(self):
+        scan_time, scanned = self.timed(
+            lambda word: self.pkm.getScoredMatches(word, self.keywords, 100000, 0.5)
+        )
+        trigram_time, found = self.timed(
+            lambda word: self.pkm.getScoredMatches(
+                word, self.vocabulary.candidates(word), 100000, 0.5
+            )
+        )
+        if REPORT:
+            print(
+                f"\nfuzzy search in {len(self.keywords)} keywords: "
+                f"scan {scan_time / len(self.words) * 1000:.1f} ms, "
+                f"trigrams {trigram_time / len(self.words) * 1000:.1f} ms"
+            )
+        for word, scan, trigram in zip(self.words, scanned, found):
+            # the best matches are found, the candidates are scored alike
+            best = self.pkm.scoreMatches(word, self.vocabulary.candidates(word), 0.5)
+            self.assertIn((1, word), best)
+            self.assertEqual(best[0][0], 1)
+            self.assertTrue(set(trigram) <= set(scan))
+
+
+class ScalingBenchmarkTestCase(unittest.TestCase):
+    """Times the keyword manager on a site of SIZE documents using
+    KEYWORDS keywords with a Zipf distribution, like real tag clouds.
+    """
+
+    layer = PLONEKEYWORDMANAGER_FUNCTIONAL_TESTING
+
+    def setUp(self):
+        self.portal = self.layer["portal"]
+        self.request = self.layer["request"]
+        setRoles(self.portal, TEST_USER_ID, ["Manager"])
+        self.pkm = getUtility(IKeywordManager)
+        self.vocabulary = generate_site(self.portal, SIZE, KEYWORDS, seed=SIZE)
+        transaction.commit()
+        self.benchmark = Benchmark(objects=SIZE, keywords=KEYWORDS, per_object=3)
+
+    def render(self, **form):
+        cache.clear_request_cache()
+        self.request.form.clear()
+        self.request.form.update(form)
+        view = getMultiAdapter((self.portal, self.request), name="prefs_keywords_view")
+        return view()
+
+    def test_scaling(self):
+        measure = self.benchmark.measure
+        used = self.pkm.getKeywords()
+        # the most used keywords that are actually used
+        popular = [k for k in self.vocabulary if k in used]
+        word = popular[len(popular) // 2]
+
+        cache._keyword_lists.clear()
+        measure("getKeywords (cold)", self.pkm.getKeywords)
+        measure("getKeywords", self.pkm.getKeywords, repeat=5)
+        counts = measure("getKeywordCounts", self.pkm.getKeywordCounts, repeat=5)
+        measure(
+            "getKeywordLength", lambda: self.pkm.getKeywordLength(popular[0]), repeat=5
+        )
+        measure(
+            "getScoredMatches",
+            lambda: self.pkm.getScoredMatches(word, used, 7, 0.6),
+            repeat=3,
+        )
+        measure("searchKeywords", lambda: self.pkm.searchKeywords(word), repeat=3)
+        measure("view", self.render, repeat=3)
+        measure("view with similar keywords", lambda: self.render(similar="1"))
+
+        merged = counts[popular[0]] + counts[popular[1]]
+        hits = measure("change", lambda: self.pkm.change(popular[1:2], popular[0]))
+        transaction.commit()
+        deleted = measure("delete", lambda: self.pkm.delete([word]))
+        transaction.commit()
+
+        if REPORT:
+            print("\n" + self.benchmark.summary())
+        if OUTPUT:
+            self.benchmark.write(OUTPUT)
+
+        results = self.benchmark.results
+        self.assertLessEqual(results["change"]["loads"], hits)
+        self.assertEqual(results["change"]["reindexes"], results["change"]["loads"])
+        self.assertLessEqual(self.pkm.getKeywordLength(popular[0]), merged)
+        self.assertEqual(self.pkm.getKeywordLength(popular[1]), 0)
+        self.assertEqual(results["delete"]["loads"], deleted)
+        self.assertEqual(self.pkm.getKeywordLength(word), 0)
+        self.assertEqual(results["getKeywords"]["loads"], 0)
@@ -0,0 +1,89 @@
+from plone import api
+from plone.app.testing import setRoles
+from plone.app.testing import TEST_USER_ID
+from Products.CMFPlone.CatalogTool import CatalogTool
+from Products.PloneKeywordManager.cache import clear_request_cache
+from Products.PloneKeywordManager.interfaces import IKeywordManager
+from Products.PloneKeywordManager.testing import PLONEKEYWORDMANAGER_FUNCTIONAL_TESTING
+from Products.PloneKeywordManager.tests.base import PKMTestCase
+from Products.PluginIndexes.KeywordIndex.KeywordIndex import KeywordIndex
+from unittest import mock
+from zope.component import getUtility
+
+import transaction
+import unittest
+
+
+class RequestCacheTestCase(PKMTestCase):
+    def test_keyword_indexes_are_looked_up_once(self):
+        with mock.patch.object(
+            CatalogTool,
+            "index_objects",
+            autospec=True,
+            side_effect=CatalogTool.index_objects,
+        ) as index_objects:
+            indexes = self.pkm.getKeywordIndexes()
+            self.assertEqual(self.pkm.getKeywordIndexes(), indexes)
+        self.assertIn("Subject", indexes)
+        self.assertEqual(index_objects.call_count, 1)
+
+    def test_clear_request_cache(self):
+        self.assertNotIn("Language", self.pkm.getKeywordIndexes())
+        self.portal.portal_catalog.addIndex("Language", "KeywordIndex")
+        clear_request_cache()
+        self.assertIn("Language", self.pkm.getKeywordIndexes())
+
+    def test_field_name_for_index(self):
+        self.assertEqual(self.pkm.fieldNameForIndex("Subject"), "Subject")
+        self.assertEqual(self.pkm.fieldNameForIndex("Subject"), "Subject")
+        with self.assertRaises(ValueError):
+            self.pkm.fieldNameForIndex("NoSuchIndex")
+
+
+class KeywordListCacheTestCase(unittest.TestCase):
+
+    layer = PLONEKEYWORDMANAGER_FUNCTIONAL_TESTING
+
+    def setUp(self):
+        self.portal = self.layer["portal"]
+        setRoles(self.portal, TEST_USER_ID, ["Manager"])
+        self.pkm = getUtility(IKeywordManager)
+        self.document = api.content.create(
+            container=self.portal, type="Document", id="document"
+        )
+        self.document.setSubject(["b", "A", "c", "a"])
+        self.document.reindexObject()
+        transaction.commit()
+
+    def uniqueValues(self):
+        return mock.patch.object(
+            KeywordIndex,
+            "uniqueValues",
+            autospec=True,
+            side_effect=KeywordIndex.uniqueValues,
+        )
+
+    def test_sorted_list_is_cached(self):
+        with self.uniqueValues() as uniqueValues:
+            self.assertEqual(self.pkm.getKeywords(), ["A", "a", "b", "c"])
+            self.assertEqual(self.pkm.getKeywords(), ["A", "a", "b", "c"])
+        self.assertEqual(uniqueValues.call_count, 1)
+
+    def test_list_is_patched_by_operations(self):
+        self.pkm.getKeywords()
+        with self.uniqueValues() as uniqueValues:
+            self.pkm.change(["a", "A"], "B")
+            transaction.commit()
+            self.assertEqual(self.pkm.getKeywords(), ["B", "b", "c"])
+            self.pkm.delete(["c"])
+            transaction.commit()
+            self.assertEqual(self.pkm.getKeywords(), ["B", "b"])
+        self.assertEqual(uniqueValues.call_count, 0)
+
+    def test_uncommitted_changes_are_not_cached(self):
+        self.pkm.getKeywords()
+        self.document.setSubject(["d"])
+        self.document.reindexObject()
+        self.assertEqual(self.pkm.getKeywords(), ["d"])
+        transaction.abort()
+        self.assertEqual(self.pkm.getKeywords(), ["A", "a", "b", "c"])
@@ -0,0 +1,89 @@
+from plone import api
+from plone.app.testing import setRoles
+from plone.app.testing import TEST_USER_ID
+from Products.PloneKeywordManager.interfaces import IKeywordManager
+from Products.PloneKeywordManager.testing import PLONEKEYWORDMANAGER_FUNCTIONAL_TESTING
+from Products.PloneKeywordManager.vocabulary import update_vocabularies
+from unittest import mock
+from zope.component import getMultiAdapter
+from zope.component import getUtility
+
+import transaction
+import unittest
+
+
+class KeywordCountsTestCase(unittest.TestCase):
+
+    layer = PLONEKEYWORDMANAGER_FUNCTIONAL_TESTING
+
+    def setUp(self):
+        self.portal = self.layer["portal"]
+        self.request = self.layer["request"]
+        setRoles(self.portal, TEST_USER_ID, ["Manager"])
+        self.pkm = getUtility(IKeywordManager)
+        subjects = [["a", "b", "c"], ["b", "c"], ["c"]]
+        for i, subject in enumerate(subjects):
+            doc = api.content.create(
+                container=self.portal, type="Document", id=f"doc{i}"
+            )
+            doc.setSubject(subject)
+            doc.reindexObject()
+        transaction.commit()
+
+    def test_counts(self):
+        self.assertEqual(self.pkm.getKeywordCounts(), {"a": 1, "b": 2, "c": 3})
+        self.assertEqual(
+            self.pkm.getKeywordCounts(keywords=["b", "d"]), {"b": 2, "d": 0}
+        )
+        self.assertEqual(self.pkm.getKeywordLength("c"), 3)
+
+    def test_all_counts_are_not_copied(self):
+        counts = self.pkm.getKeywordCounts()
+        with self.assertRaises(TypeError):
+            counts["a"] = 5
+        self.assertEqual(
+            self.pkm.getKeywordCounts(context=self.portal.doc1), {"b": 1, "c": 1}
+        )
+
+    def test_sort_on_count(self):
+        self.assertEqual(
+            self.pkm.getKeywords(sort_on="count", reverse=True), ["c", "b", "a"]
+        )
+        self.assertEqual(self.pkm.getKeywords(sort_on="count"), ["a", "b", "c"])
+        with self.assertRaises(ValueError):
+            self.pkm.getKeywords(sort_on="title")
+
+    def test_counts_are_patched_by_operations(self):
+        self.pkm.getKeywordCounts()
+        self.pkm.change(["a"], "c")
+        transaction.commit()
+        with mock.patch("Products.PloneKeywordManager.cache.row_length") as row_length:
+            self.assertEqual(self.pkm.getKeywordCounts(), {"b": 2, "c": 3})
+        row_length.assert_not_called()
+
+    def test_view_counts_all_keywords_at_once(self):
+        self.request.form["order"] = "most_used"
+        view = getMultiAdapter((self.portal, self.request), name="prefs_keywords_view")
+        self.assertEqual(list(view.getKeywords("Subject")), ["c", "b", "a"])
+        with mock.patch.object(
+            self.pkm, "getKeywordCounts", wraps=self.pkm.getKeywordCounts
+        ) as getKeywordCounts:
+            counts = [view.getNumObjects(k, "Subject") for k in ("a", "b", "c")]
+        self.assertEqual(counts, [1, 2, 3])
+        self.assertEqual(getKeywordCounts.call_count, 1)
+
+    def test_keywords_state(self):
+        state = self.pkm.getKeywordsState()
+        self.assertEqual(len(state), 1)
+        self.assertEqual(self.pkm.getKeywordsState(), state)
+        similar = self.pkm.getKeywordsState(similar=True)
+        self.assertEqual(similar[0], state[0])
+        # linking the new keywords changes the similar keywords only
+        update_vocabularies()
+        self.assertEqual(self.pkm.getKeywordsState(), state)
+        self.assertNotEqual(self.pkm.getKeywordsState(similar=True), similar)
+        self.pkm.change(["a"], "c")
+        # not known until committed
+        self.assertIsNone(self.pkm.getKeywordsState())
+        transaction.commit()
+        self.assertNotEqual(self.pkm.getKeywordsState(), state)
@@ -0,0 +1,69 @@
+from plone import api
+from Products.PloneKeywordManager.duplicates import duplicate_groups
+from Products.PloneKeywordManager.duplicates import normalize
+from Products.PloneKeywordManager.tests.base import PKMTestCase
+from zope.component import getMultiAdapter
+
+import unittest
+
+
+class NormalizeTestCase(unittest.TestCase):
+    def test_normalize(self):
+        self.assertEqual(normalize("Café"), "cafe")
+        self.assertEqual(normalize("  STRASSE  "), "strasse")
+        self.assertEqual(normalize("Straße"), "strasse")
+        self.assertEqual(normalize("open\t source"), "open source")
+        self.assertEqual(normalize("Plone!?"), "plone")
+        self.assertEqual(normalize("..."), "...")
+
+    def test_groups(self):
+        counts = {"cafe": 1, "Café": 3, "Plone": 2, "plone.": 1, "Zope": 5}
+        groups = duplicate_groups(sorted(counts), counts)
+        self.assertEqual(
+            [(g["keywords"], g["target"], g["total"]) for g in groups],
+            [(["Café", "cafe"], "Café", 4), (["Plone", "plone."], "Plone", 3)],
+        )
+
+
+class DuplicatesReportTestCase(PKMTestCase):
+    def setUp(self):
+        super().setUp()
+        for i, subject in enumerate([["Café", "cafe"], ["Café"], ["Plone", "plone!"]]):
+            doc = api.content.create(
+                container=self.portal, type="Document", id=f"doc{i}"
+            )
+            doc.setSubject(subject)
+            doc.reindexObject()
+
+    def test_duplicate_keywords(self):
+        groups = self.pkm.getDuplicateKeywords()
+        # doc0 uses both spellings but is counted once
+        self.assertEqual(
+            [(g["keywords"], g["total"]) for g in groups],
+            [(["Café", "cafe"], 2), (["Plone", "plone!"], 1)],
+        )
+
+    def test_merge_from_report(self):
+        view = getMultiAdapter(
+            (self.portal, self.request), name="prefs_keywords_duplicates"
+        )
+        self.assertIn("plone!", view())
+
+        self.request.form.update(
+            {
+                "form.button.Merge": "1",
+                "keywords": ["Café", "cafe"],
+                "changeto": "Café",
+                "field": "Subject",
+                "duplicates": "1",
+            }
+        )
+        view = getMultiAdapter((self.portal, self.request), name="prefs_keywords_view")
+        view()
+        self.assertIn(
+            "/prefs_keywords_duplicates?", self.request.response.getHeader("Location")
+        )
+        self.assertEqual(
+            [g["keywords"] for g in self.pkm.getDuplicateKeywords()],
+            [["Plone", "plone!"]],
+        )
@@ -0,0 +1,69 @@
+from plone import api
+from Products.PloneKeywordManager.tests.base import PKMTestCase
+from zope.component import getMultiAdapter
+
+import json
+
+
+class KeywordGridTestCase(PKMTestCase):
+    def setUp(self):
+        super().setUp()
+        for i in range(3):
+            doc = api.content.create(
+                container=self.portal, type="Document", id=f"doc{i}"
+            )
+            doc.setSubject(["Keyword %03d" % k for k in range(i * 100, 250)])
+            doc.reindexObject()
+
+    def rows(self, **form):
+        self.request.form.update(form)
+        view = getMultiAdapter((self.portal, self.request), name="prefs_keywords_rows")
+        return json.loads(view())
+
+    def test_range(self):
+        data = self.rows(field="Subject", b_start=10, b_size=3)
+        self.assertEqual(data["total"], 250)
+        self.assertEqual(data["start"], 10)
+        self.assertEqual(
+            data["rows"],
+            [
+                ["Keyword 010", 1, "keyword-010"],
+                ["Keyword 011", 1, "keyword-011"],
+                ["Keyword 012", 1, "keyword-012"],
+            ],
+        )
+        self.assertEqual(
+            self.request.response.getHeader("Content-Type"), "application/json"
+        )
+
+    def test_order_and_prefix(self):
+        data = self.rows(order="most_used", b_size=1)
+        self.assertEqual(data["rows"], [["Keyword 200", 3, "keyword-200"]])
+        data = self.rows(order="keyword", prefix="x")
+        self.assertEqual(data, {"total": 0, "start": 0, "rows": []})
+
+    def test_size_is_capped(self):
+        self.assertEqual(len(self.rows(b_size=1000)["rows"]), 250)
+        with self.subTest("max_size"):
+            self.request.form["b_size"] = 1000
+            view = getMultiAdapter(
+                (self.portal, self.request), name="prefs_keywords_rows"
+            )
+            view.max_size = 20
+            self.assertEqual(len(json.loads(view())["rows"]), 20)
+
+    def test_bad_request(self):
+        self.assertIn("error", self.rows(b_start="x"))
+        self.assertEqual(self.request.response.getStatus(), 400)
+        self.assertIn("error", self.rows(field="nonexistent", b_start=0))
+        self.assertEqual(self.request.response.getStatus(), 404)
+
+    def test_grid_is_rendered(self):
+        self.request.form.update({"field": "Subject", "grid": "1"})
+        view = getMultiAdapter((self.portal, self.request), name="prefs_keywords_view")
+        html = view()
+        self.assertIn('id="keyword-grid"', html)
+        self.assertIn('data-total="250"', html)
+        self.assertIn("prefs_keywords_rows?field=Subject", html)
+        # the keywords are fetched by the grid, not listed in the page
+        self.assertNotIn('id="keyword-keyword-000"', html)
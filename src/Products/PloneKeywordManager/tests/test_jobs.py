@@ -0,0 +1,137 @@
+from plone import api
+from plone.app.testing import setRoles
+from plone.app.testing import TEST_USER_ID
+from plone.protect.authenticator import createToken
+from Products.PloneKeywordManager import config
+from Products.PloneKeywordManager import jobs
+from Products.PloneKeywordManager.batch import checkpoint_key
+from Products.PloneKeywordManager.batch import get_checkpoint
+from Products.PloneKeywordManager.testing import PLONEKEYWORDMANAGER_FUNCTIONAL_TESTING
+from zExceptions import Forbidden
+from zope.component import getMultiAdapter
+
+import json
+import time
+import transaction
+import unittest
+
+
+class KeywordJobsTestCase(unittest.TestCase):
+
+    layer = PLONEKEYWORDMANAGER_FUNCTIONAL_TESTING
+
+    def setUp(self):
+        self.portal = self.layer["portal"]
+        self.request = self.layer["request"]
+        setRoles(self.portal, TEST_USER_ID, ["Manager"])
+        for i in range(3):
+            doc = api.content.create(
+                container=self.portal, type="Document", id=f"doc{i}"
+            )
+            doc.setSubject(["foo", "bar"])
+            doc.reindexObject()
+        transaction.commit()
+
+    def test_view_queues_job(self):
+        self.request.form.update(
+            {
+                "form.button.Merge": "1",
+                "keywords": ["foo"],
+                "changeto": "baz",
+                "field": "Subject",
+                "background": True,
+            }
+        )
+        view = getMultiAdapter((self.portal, self.request), name="prefs_keywords_view")
+        view()
+        self.assertIn("job=", self.request.response.getHeader("Location"))
+        self.assertEqual(len(jobs.pending_jobs()), 1)
+        # nothing changed yet
+        self.assertIn("foo", self.portal.doc0.Subject())
+
+    def test_worker_runs_jobs(self):
+        job = jobs.enqueue("change", ["foo"], "baz")
+        delete_job = jobs.enqueue("delete", ["bar"], context=self.portal.doc0)
+        transaction.commit()
+
+        self.request.form["_authenticator"] = createToken()
+        self.request["REQUEST_METHOD"] = "POST"
+        view = getMultiAdapter(
+            (self.portal, self.request), name="prefs_keywords_worker"
+        )
+        result = json.loads(view())
+        self.assertEqual([j["status"] for j in result], [jobs.DONE, jobs.DONE])
+        self.assertEqual(jobs.pending_jobs(), [])
+        for i in range(3):
+            self.assertIn("baz", self.portal[f"doc{i}"].Subject())
+            self.assertNotIn("foo", self.portal[f"doc{i}"].Subject())
+        self.assertNotIn("bar", self.portal.doc0.Subject())
+        self.assertIn("bar", self.portal.doc1.Subject())
+
+        self.request.form["job"] = job.id
+        view = getMultiAdapter(
+            (self.portal, self.request), name="prefs_keywords_progress"
+        )
+        progress = json.loads(view())
+        self.assertEqual(progress["status"], jobs.DONE)
+        self.assertEqual(progress["done"], 3)
+        self.assertEqual(progress["total"], 3)
+        self.assertEqual(jobs.get_job(delete_job.id).done, 1)
+
+    def test_failing_job(self):
+        job = jobs.enqueue("change", ["foo"], "baz")
+        job.user = "removed-user"
+        transaction.commit()
+        jobs.process_jobs()
+        self.assertEqual(job.status, jobs.FAILED)
+        self.assertTrue(job.errors)
+        self.assertIn("foo", self.portal.doc0.Subject())
+
+    def test_stalled_job_is_resumed(self):
+        job = jobs.enqueue("change", ["foo"], "baz")
+        job.status = jobs.RUNNING
+        job.started = job.heartbeat = time.time()
+        # the first batch had been committed when the worker died
+        rid = api.content.find(id="doc0")[0].getRID()
+        key = checkpoint_key("change", "Subject", ["foo"], "baz", None)
+        get_checkpoint(key).done.insert(rid)
+        transaction.commit()
+        self.assertEqual(jobs.pending_jobs(), [])
+
+        job.heartbeat -= config.LEASE_TIMEOUT + 1
+        transaction.commit()
+        self.assertEqual(jobs.pending_jobs(), [job])
+        jobs.process_jobs()
+        self.assertEqual(job.status, jobs.DONE)
+        self.assertEqual(job.done, 3)
+        # not updated again
+        self.assertIn("foo", self.portal.doc0.Subject())
+        for i in (1, 2):
+            self.assertEqual(sorted(self.portal[f"doc{i}"].Subject()), ["bar", "baz"])
+
+    def test_worker_needs_a_post_with_authenticator(self):
+        job = jobs.enqueue("change", ["foo"], "baz")
+        transaction.commit()
+        view = getMultiAdapter(
+            (self.portal, self.request), name="prefs_keywords_worker"
+        )
+        with self.assertRaises(Forbidden):
+            view()
+        self.request["REQUEST_METHOD"] = "POST"
+        with self.assertRaises(Forbidden):
+            view()
+        self.assertEqual(job.status, jobs.PENDING)
+
+    def test_finished_jobs_are_pruned(self):
+        done = jobs.enqueue("change", ["foo"], "baz")
+        failed = jobs.enqueue("change", ["foo"], "baz")
+        pending = jobs.enqueue("change", ["foo"], "baz")
+        done.status, failed.status = jobs.DONE, jobs.FAILED
+        done.finished = failed.finished = time.time()
+        self.assertEqual(jobs.prune_jobs(), 0)
+        failed.finished -= config.JOB_RETENTION + 1
+        self.assertEqual(jobs.prune_jobs(), 1)
+        self.assertIsNone(jobs.get_job(failed.id))
+        later = time.time() + config.JOB_RETENTION + 1
+        self.assertEqual(jobs.prune_jobs(now=later), 1)
+        self.assertEqual(jobs.pending_jobs(), [pending])
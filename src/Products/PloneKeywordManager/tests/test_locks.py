@@ -0,0 +1,217 @@
+from BTrees.OOBTree import OOBTree
+from plone import api
+from Products.PloneKeywordManager import config
+from Products.PloneKeywordManager.audit import read_log
+from Products.PloneKeywordManager.jobs import enqueue
+from Products.PloneKeywordManager.jobs import PENDING
+from Products.PloneKeywordManager.jobs import run_job
+from Products.PloneKeywordManager.locks import _run
+from Products.PloneKeywordManager.locks import find_lease
+from Products.PloneKeywordManager.locks import Lease
+from Products.PloneKeywordManager.locks import leased
+from Products.PloneKeywordManager.locks import LEASES
+from Products.PloneKeywordManager.locks import OperationLease
+from Products.PloneKeywordManager.locks import OperationLocked
+from Products.PloneKeywordManager.storage import query_storage
+from Products.PloneKeywordManager.tests.base import PKMTestCase
+from Products.statusmessages.interfaces import IStatusMessage
+from transaction import TransactionManager
+from unittest import mock
+from ZODB.POSException import ConflictError
+from zope.component import getMultiAdapter
+
+import time
+import transaction
+import unittest
+
+
+class FindLeaseTestCase(unittest.TestCase):
+    def setUp(self):
+        self.leases = OOBTree()
+        self.leases[("Subject", "a")] = (("1", "/plone/a", "admin", time.time() + 60),)
+        self.leases[("Subject", "b")] = (("2", None, "admin", time.time() - 1),)
+
+    def test_keywords(self):
+        keyword, lease = find_lease(self.leases, "Subject", ["x", "a"])
+        self.assertEqual(keyword, "a")
+        self.assertEqual(lease.id, "1")
+        self.assertIsNone(find_lease(self.leases, "Language", ["a"]))
+        # expired
+        self.assertIsNone(find_lease(self.leases, "Subject", ["b"]))
+        self.assertIsNone(find_lease(None, "Subject", ["a"]))
+
+    def test_paths(self):
+        for path in (None, "/plone", "/plone/a", "/plone/a/b"):
+            self.assertIsNotNone(find_lease(self.leases, "Subject", ["a"], path))
+        for path in ("/plone/ab", "/plone/b"):
+            self.assertIsNone(find_lease(self.leases, "Subject", ["a"], path))
+
+
+class LeaseTestCase(PKMTestCase):
+    def setUp(self):
+        super().setUp()
+        self.docs = []
+        for i, subject in enumerate([["a", "b"], ["b"], ["c"]]):
+            doc = api.content.create(
+                container=self.portal, type="Document", id=f"doc{i}"
+            )
+            doc.setSubject(subject)
+            doc.reindexObject()
+            self.docs.append(doc)
+
+    def hold(self, keywords, path=None):
+        """Leases the keywords as another operation would."""
+        lease = OperationLease("Subject", keywords, path, user="someone")
+        lease.acquire()
+        self.addCleanup(lease.release)
+        return lease
+
+    def leases(self):
+        return _run(lambda portal: dict(query_storage(LEASES, portal=portal) or {}))
+
+    def test_leased(self):
+        with leased("Subject", ["a", "b"], commit=True) as lease:
+            self.assertEqual(
+                self.leases()[("Subject", "a")],
+                ((lease.id, None, "test_user_1_", lease.expires),),
+            )
+            with self.assertRaises(OperationLocked) as raised:
+                with leased("Subject", ["b", "c"], commit=True):
+                    pass
+            self.assertEqual(raised.exception.keyword, "b")
+            with leased("Subject", ["c"], commit=True):
+                pass
+            self.assertNotIn(("Subject", "c"), self.leases())
+        self.assertEqual(self.leases(), {})
+
+    def test_lease_is_held_until_the_transaction_ends(self):
+        with leased("Subject", ["a", "b"]):
+            pass
+        self.assertEqual(len(self.leases()), 2)
+        transaction.abort()
+        self.assertEqual(self.leases(), {})
+        with leased("Subject", ["a"]):
+            pass
+        # as the transaction does once committed
+        for hook, args, kws in transaction.get().getAfterCommitHooks():
+            hook(True, *args, **kws)
+        self.assertEqual(self.leases(), {})
+
+    def test_transaction_is_not_locked_by_its_leases(self):
+        with leased("Subject", ["a"]):
+            pass
+        with leased("Subject", ["a", "b"]):
+            pass
+        leases = self.leases()
+        self.assertEqual(len(leases[("Subject", "a")]), 2)
+        # other transactions are
+        self.assertIsNotNone(find_lease(leases, "Subject", ["b"]))
+
+    def test_expired_lease(self):
+        lease = self.hold(["a"])
+        with mock.patch.object(config, "LEASE_TIMEOUT", 0):
+            self.hold(["b"])
+        lease.release()
+        with leased("Subject", ["b"]):
+            # the expired lease has been dropped
+            self.assertEqual(
+                [Lease(*record).user for record in self.leases()[("Subject", "b")]],
+                ["test_user_1_"],
+            )
+
+    def test_renew(self):
+        lease = self.hold(["a"])
+        expires = lease.expires
+        lease.renew()
+        self.assertEqual(lease.expires, expires)
+        with mock.patch.object(config, "LEASE_TIMEOUT", 10000):
+            lease.renew()
+        self.assertGreater(lease.expires, expires)
+        self.assertEqual(self.leases()[("Subject", "a")][0][3], lease.expires)
+
+    def test_concurrent_leases(self):
+        # leases of two transactions on other keywords are merged, on the
+        # same keyword they conflict
+        self.hold(["x"])
+        db = self.portal._p_jar.db()
+
+        def write(manager, keyword):
+            connection = db.open(transaction_manager=manager)
+            self.addCleanup(connection.close)
+            portal = connection.get(self.portal._p_oid)
+            lease = OperationLease("Subject", [keyword], user="someone")
+            lease.expires = time.time() + 60
+            lease._write(portal, query_storage(LEASES, portal=portal))
+            return lease
+
+        first, second = TransactionManager(), TransactionManager()
+        write(first, "a")
+        write(second, "b")
+        first.commit()
+        second.commit()
+        self.assertEqual(
+            sorted(self.leases()),
+            [("Subject", "a"), ("Subject", "b"), ("Subject", "x")],
+        )
+        first, second = TransactionManager(), TransactionManager()
+        write(first, "c")
+        write(second, "c")
+        first.commit()
+        with self.assertRaises(ConflictError):
+            second.commit()
+        second.abort()
+        _run(lambda portal: query_storage(LEASES, portal=portal).clear())
+
+    def test_overlapping_change_is_rejected(self):
+        self.hold(["x"])
+        with self.assertRaises(OperationLocked):
+            self.pkm.change(["a"], "x")
+        self.assertEqual(self.docs[0].Subject(), ("a", "b"))
+        self.assertEqual(self.pkm.delete(["c"]), 1)
+        # the lease of an operation is released with its transaction
+        self.assertEqual(list(self.leases()), [("Subject", "c"), ("Subject", "x")])
+        transaction.abort()
+        self.assertEqual(list(self.leases()), [("Subject", "x")])
+
+    def test_other_folders_are_not_locked(self):
+        folder = api.content.create(container=self.portal, type="Folder", id="f")
+        self.hold(["a"], "/plone/f")
+        self.assertEqual(self.pkm.change(["b"], "x", context=self.portal.doc1), 1)
+        with self.assertRaises(OperationLocked):
+            self.pkm.change(["a"], "x", context=folder)
+
+    def test_locked_job_stays_pending(self):
+        self.hold(["c"])
+        job = enqueue("delete", ["c"])
+        with mock.patch("transaction.commit"), mock.patch("transaction.abort"):
+            run_job(job)
+        self.assertEqual(job.status, PENDING)
+        self.assertEqual(self.docs[2].Subject(), ("c",))
+
+    def test_view_rejects_locked_keywords(self):
+        self.hold(["b"])
+        self.request.form.update(
+            {
+                "form.button.Delete": "1",
+                "keywords": ["b"],
+                "field": "Subject",
+            }
+        )
+        view = getMultiAdapter((self.portal, self.request), name="prefs_keywords_view")
+        view()
+        [message] = IStatusMessage(self.request).show()
+        self.assertEqual(message.type, "error")
+        self.assertIn("someone", message.message)
+        self.assertEqual(self.docs[1].Subject(), ("b",))
+
+    def test_log_rejects_locked_revert(self):
+        self.pkm.change(["c"], "d")
+        self.hold(["d"])
+        self.request.form.update(
+            {"form.button.Revert": "1", "key": str(read_log(size=1)[0][0].key)}
+        )
+        getMultiAdapter((self.portal, self.request), name="prefs_keywords_log")()
+        [message] = IStatusMessage(self.request).show()
+        self.assertEqual(message.type, "error")
+        self.assertIn("someone", message.message)
+        self.assertEqual(self.docs[2].Subject(), ("d",))
@@ -0,0 +1,68 @@
+from plone import api
+from Products.PloneKeywordManager.preview import estimated_cost
+from Products.PloneKeywordManager.preview import record_cost
+from Products.PloneKeywordManager.tests.base import PKMTestCase
+from Products.PloneKeywordManager.tests.benchmark import ObjectLoadCounter
+from zope.component import getMultiAdapter
+
+
+class PreviewTestCase(PKMTestCase):
+    def setUp(self):
+        super().setUp()
+        self.folder = api.content.create(
+            container=self.portal, type="Folder", id="folder"
+        )
+        for container, id, subject in [
+            (self.portal, "doc", ["foo", "bar"]),
+            (self.portal, "news", ["Foo"]),
+            (self.folder, "doc", ["foo"]),
+        ]:
+            obj = api.content.create(
+                container=container,
+                type="News Item" if id == "news" else "Document",
+                id=id,
+            )
+            obj.setSubject(subject)
+            obj.reindexObject()
+
+    def test_preview_change(self):
+        with ObjectLoadCounter() as counter:
+            preview = self.pkm.change(["foo", "Foo"], "Foo", preview=True)
+        self.assertEqual(counter.loads, 0)
+        self.assertEqual(preview["found"], 3)
+        # the news item already uses Foo only
+        self.assertEqual(preview["changed"], 2)
+        self.assertEqual(preview["portal_types"], {"Document": 2})
+        self.assertEqual(sorted(preview["paths"]), ["/plone/doc", "/plone/folder/doc"])
+        self.assertIsNone(preview["estimate"])
+        # nothing changed
+        self.assertEqual(self.portal.doc.Subject(), ("foo", "bar"))
+
+    def test_preview_delete_in_folder(self):
+        preview = self.pkm.delete(["foo", "bar"], context=self.folder, preview=True)
+        self.assertEqual(preview["changed"], 1)
+        self.assertEqual(preview["paths"], ["/plone/folder/doc"])
+
+    def test_estimate(self):
+        self.pkm.delete(["bar"])
+        cost = estimated_cost("Subject")
+        self.assertGreater(cost, 0)
+        record_cost("Subject", cost * 2, 1)
+        self.assertGreater(estimated_cost("Subject"), cost)
+        preview = self.pkm.delete(["foo"], preview=True)
+        self.assertAlmostEqual(preview["estimate"], estimated_cost("Subject") * 2)
+
+    def test_preview_view(self):
+        self.request.form.update(
+            {
+                "form.button.Preview": "1",
+                "keywords": ["foo"],
+                "changeto": "baz",
+                "field": "Subject",
+            }
+        )
+        view = getMultiAdapter((self.portal, self.request), name="prefs_keywords_view")
+        html = view()
+        self.assertIn('id="keyword-preview"', html)
+        self.assertIn("/plone/folder/doc", html)
+        self.assertEqual(self.portal.doc.Subject(), ("foo", "bar"))
@@ -0,0 +1,70 @@
+from plone import api
+from plone.app.testing import setRoles
+from plone.app.testing import TEST_USER_ID
+from Products.CMFCore.indexing import processQueue
+from Products.PloneKeywordManager.interfaces import IKeywordManager
+from Products.PloneKeywordManager.jobs import process_reindex_queue
+from Products.PloneKeywordManager.testing import PLONEKEYWORDMANAGER_FUNCTIONAL_TESTING
+from Products.PloneKeywordManager.tests.base import PKMTestCase
+from zope.component import getUtility
+
+import transaction
+import unittest
+
+
+def search(**kw):
+    return [b.getId for b in api.content.find(**kw)]
+
+
+class ReindexTestCase(PKMTestCase):
+    def setUp(self):
+        super().setUp()
+        self.document = api.content.create(
+            container=self.portal, type="Document", id="document"
+        )
+        self.document.setSubject(["Aardvark", "Zebra"])
+        self.document.reindexObject()
+
+    def test_searchabletext_is_updated(self):
+        stats = {}
+        self.pkm.change(["Aardvark"], "Okapi", stats=stats)
+        self.assertEqual(search(SearchableText="Okapi"), ["document"])
+        self.assertEqual(search(SearchableText="Aardvark"), [])
+        self.assertEqual(sorted(stats["reindex"]), ["SearchableText", "Subject"])
+
+    def test_searchabletext_without_keywords_is_skipped(self):
+        other = api.content.create(container=self.portal, type="Document", id="other")
+        processQueue()
+        # the keywords never made it into the text index of this one
+        other.subject = ["Aardvark"]
+        other.reindexObject(idxs=["Subject"])
+        stats = {}
+        self.pkm.change(["Aardvark"], "Okapi", stats=stats)
+        self.assertEqual(stats["skipped"], {"SearchableText": 1})
+        self.assertEqual(search(SearchableText="Okapi"), ["document"])
+        self.assertEqual(sorted(search(Subject="Okapi")), ["document", "other"])
+
+
+class DeferredReindexTestCase(unittest.TestCase):
+
+    layer = PLONEKEYWORDMANAGER_FUNCTIONAL_TESTING
+
+    def setUp(self):
+        self.portal = self.layer["portal"]
+        setRoles(self.portal, TEST_USER_ID, ["Manager"])
+        self.pkm = getUtility(IKeywordManager)
+        document = api.content.create(
+            container=self.portal, type="Document", id="document"
+        )
+        document.setSubject(["Aardvark"])
+        document.reindexObject()
+        transaction.commit()
+
+    def test_deferred_searchabletext(self):
+        stats = {}
+        self.pkm.delete(["Aardvark"], defer=("SearchableText",), stats=stats)
+        self.assertEqual(stats["deferred"], {"SearchableText": 1})
+        self.assertEqual(search(Subject="Aardvark"), [])
+        self.assertEqual(search(SearchableText="Aardvark"), ["document"])
+        self.assertEqual(process_reindex_queue(), 1)
+        self.assertEqual(search(SearchableText="Aardvark"), [])
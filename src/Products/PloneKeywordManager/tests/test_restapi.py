@@ -0,0 +1,164 @@
+from plone import api
+from Products.PloneKeywordManager.restapi.pagination import decode_cursor
+from Products.PloneKeywordManager.restapi.pagination import encode_cursor
+from Products.PloneKeywordManager.restapi.pagination import etag_matches
+from Products.PloneKeywordManager.restapi.pagination import page
+from Products.PloneKeywordManager.restapi.pagination import validators
+from Products.PloneKeywordManager.tests.base import PKMTestCase
+from unittest import mock
+
+import json
+import unittest
+
+try:
+    import plone.restapi  # noqa: F401
+except ImportError:
+    HAS_RESTAPI = False
+else:
+    HAS_RESTAPI = True
+
+
+class PaginationTestCase(unittest.TestCase):
+
+    keywords = ["apple", "Banana", "cherry", "date", "Elder"]
+    counts = {"apple": 3, "Banana": 1, "cherry": 3, "date": 2, "Elder": 1}
+
+    def pages(self, keywords, size, **kw):
+        result = []
+        cursor = None
+        while True:
+            items, cursor = page(keywords, self.counts, size, cursor, **kw)
+            result.append(items)
+            if cursor is None:
+                return result
+
+    def test_keyword_order(self):
+        self.assertEqual(
+            self.pages(self.keywords, 2),
+            [["apple", "Banana"], ["cherry", "date"], ["Elder"]],
+        )
+
+    def test_reversed_keyword_order(self):
+        self.assertEqual(
+            self.pages(self.keywords, 2, reverse=True),
+            [["Elder", "date"], ["cherry", "Banana"], ["apple"]],
+        )
+
+    def test_count_order(self):
+        keywords = ["apple", "cherry", "date", "Banana", "Elder"]
+        self.assertEqual(
+            self.pages(keywords, 2, sort_on="count", reverse=True),
+            [["apple", "cherry"], ["date", "Banana"], ["Elder"]],
+        )
+
+    def test_cursor_survives_removed_keyword(self):
+        items, cursor = page(self.keywords, self.counts, 2)
+        keywords = [k for k in self.keywords if k != "Banana"]
+        self.assertEqual(page(keywords, self.counts, 2, cursor)[0], ["cherry", "date"])
+
+    def test_cursor(self):
+        self.assertEqual(decode_cursor(encode_cursor("é", 2)), ("é", 2))
+        with self.assertRaises(ValueError):
+            decode_cursor("nope")
+
+    def test_validators(self):
+        serial = b"\x03\xd3\x1c\x3a\x00\x00\x00\x00"
+        self.assertEqual(validators(None), (None, None))
+        self.assertEqual(validators(((3, None),)), ('W/"3"', None))
+        etag, modified = validators(((3, serial),))
+        self.assertEqual(etag, 'W/"3-03d31c3a00000000"')
+        self.assertTrue(modified.endswith("GMT"))
+        self.assertEqual(
+            validators(((3, serial), (2, None))),
+            ('W/"3-03d31c3a00000000-2"', modified),
+        )
+        # other parameters, other tags
+        first = validators(((3, serial),), "a")[0]
+        self.assertTrue(first.startswith('W/"3-03d31c3a00000000-'))
+        self.assertNotEqual(first, validators(((3, serial),), "b")[0])
+
+    def test_etag_matches(self):
+        etag = 'W/"3-03d3"'
+        self.assertTrue(etag_matches(etag, etag))
+        self.assertTrue(etag_matches('"3-03d3"', etag))
+        self.assertTrue(etag_matches('"x", W/"3-03d3" ', etag))
+        self.assertTrue(etag_matches('"a,b", "3-03d3"', etag))
+        self.assertTrue(etag_matches(" * ", etag))
+        self.assertFalse(etag_matches('"a,b"', etag))
+        self.assertFalse(etag_matches('W/"3-03d"', etag))
+        self.assertFalse(etag_matches(None, etag))
+        self.assertFalse(etag_matches("*", None))
+
+
+@unittest.skipUnless(HAS_RESTAPI, "plone.restapi is not installed")
+class ServicesTestCase(PKMTestCase):
+    def setUp(self):
+        super().setUp()
+        for i, subject in enumerate([["a", "b"], ["b", "c"]]):
+            doc = api.content.create(
+                container=self.portal, type="Document", id=f"doc{i}"
+            )
+            doc.setSubject(subject)
+            doc.reindexObject()
+
+    def service(self, factory, *params):
+        service = factory(self.portal, self.request)
+        service.params = list(params)
+        return service.reply()
+
+    def test_list_keywords(self):
+        from Products.PloneKeywordManager.restapi.services import KeywordsGet
+
+        self.request.form.update({"b_size": "2", "sort_on": "count"})
+        self.request.form["sort_order"] = "descending"
+        result = self.service(KeywordsGet, "Subject")
+        self.assertEqual(result["items_total"], 3)
+        self.assertEqual(
+            result["items"],
+            [{"keyword": "b", "count": 2}, {"keyword": "a", "count": 1}],
+        )
+        self.assertIn("cursor=", result["batching"]["next"])
+
+    def test_similar_keywords(self):
+        from Products.PloneKeywordManager.restapi.services import KeywordsGet
+        from Products.PloneKeywordManager.vocabulary import build_vocabulary
+        from Products.PloneKeywordManager.vocabulary import update_vocabularies
+
+        self.portal.doc1.setSubject(["b", "c", "keyword", "keywords"])
+        self.portal.doc1.reindexObject()
+        build_vocabulary("Subject")
+        with mock.patch("transaction.commit"):
+            update_vocabularies()
+        self.request.form.update({"fields": "keyword,similar", "prefix": "key"})
+        result = self.service(KeywordsGet, "Subject")
+        self.assertEqual(
+            result["items"],
+            [
+                {"keyword": "keyword", "similar": ["keywords"]},
+                {"keyword": "keywords", "similar": ["keyword"]},
+            ],
+        )
+
+    def test_etag(self):
+        from Products.PloneKeywordManager.restapi.services import KeywordsGet
+
+        # the index has not been changed by the current transaction
+        state = ((3, b"\x03\xd3\x1c\x3a\x00\x00\x00\x00"),)
+        with mock.patch.object(self.pkm, "getKeywordsState", return_value=state):
+            self.service(KeywordsGet, "Subject")
+            etag = self.request.response.getHeader("ETag")
+            self.request.form["b_size"] = "1"
+            self.service(KeywordsGet, "Subject")
+            self.assertNotEqual(self.request.response.getHeader("ETag"), etag)
+            del self.request.form["b_size"]
+            self.request.environ["HTTP_IF_NONE_MATCH"] = f'"x", {etag[2:]}'
+            self.service(KeywordsGet, "Subject")
+        self.assertEqual(self.request.response.getStatus(), 304)
+
+    def test_merge(self):
+        from Products.PloneKeywordManager.restapi.services import KeywordsPost
+
+        self.request["BODY"] = json.dumps({"keywords": ["a", "c"], "target": "d"})
+        result = self.service(KeywordsPost, "Subject", "merge")
+        self.assertEqual(result, {"updated": 2})
+        self.assertEqual(self.pkm.getKeywords(), ["b", "d"])
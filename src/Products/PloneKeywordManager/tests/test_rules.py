@@ -0,0 +1,125 @@
+from collections import namedtuple
+from plone import api
+from Products.PloneKeywordManager import jobs
+from Products.PloneKeywordManager.rules import parse_rules
+from Products.PloneKeywordManager.tests.base import PKMTestCase
+from Products.PloneKeywordManager.tests.benchmark import ObjectLoadCounter
+from Products.statusmessages.interfaces import IStatusMessage
+from unittest import mock
+from zope.component import getMultiAdapter
+from ZPublisher.HTTPRequest import FileUpload
+
+import io
+import tempfile
+import unittest
+
+FieldStorage = namedtuple("FieldStorage", ("file", "headers", "filename", "name"))
+
+
+class ParseRulesTestCase(unittest.TestCase):
+    def test_csv(self):
+        data = "old,new\nfoo,bar\r\nbaz,\nqux\n\n"
+        self.assertEqual(parse_rules(data), {"foo": "bar", "baz": None, "qux": None})
+        with self.assertRaises(ValueError):
+            parse_rules("a,b,c")
+
+    def test_json(self):
+        self.assertEqual(
+            parse_rules(b'{"foo": "bar", "baz": null}'), {"foo": "bar", "baz": None}
+        )
+        self.assertEqual(parse_rules('[["foo", "bar"]]'), {"foo": "bar"})
+        with self.assertRaises(ValueError):
+            parse_rules('{"foo": 1}')
+        with self.assertRaises(ValueError):
+            parse_rules("{", "json")
+
+
+class ApplyRulesTestCase(PKMTestCase):
+    def setUp(self):
+        super().setUp()
+        self.documents = []
+        for i, subject in enumerate([["a", "b", "c"], ["b", "keep"], ["keep"]]):
+            doc = api.content.create(
+                container=self.portal, type="Document", id=f"doc{i}"
+            )
+            doc.setSubject(subject)
+            doc.reindexObject()
+            self.documents.append(doc)
+
+    def test_apply_rules(self):
+        rules = {"a": "x", "b": "a", "c": None}
+        with (
+            ObjectLoadCounter() as counter,
+            mock.patch.object(
+                self.pkm, "updateObject", wraps=self.pkm.updateObject
+            ) as updateObject,
+        ):
+            count = self.pkm.applyRules(rules)
+        self.assertEqual(count, 2)
+        self.assertEqual(counter.loads, 2)
+        self.assertEqual(updateObject.call_count, 2)
+        # rules are not chained: b becomes a, a becomes x
+        self.assertEqual(self.documents[0].Subject(), ("x", "a"))
+        self.assertEqual(self.documents[1].Subject(), ("a", "keep"))
+        self.assertEqual(self.documents[2].Subject(), ("keep",))
+        self.assertEqual(self.pkm.getKeywords(), ["a", "keep", "x"])
+
+    def upload(self, data, filename, background=False, upload=None):
+        if upload is None:
+            upload = io.BytesIO(data)
+            upload.filename = filename
+        self.request.form.update(
+            {
+                "form.button.ApplyRules": "1",
+                "field": "Subject",
+                "rules_file": upload,
+                "background": background,
+            }
+        )
+        view = getMultiAdapter((self.portal, self.request), name="prefs_keywords_view")
+        return view()
+
+    def test_upload(self):
+        self.upload(b"b,z\nkeep,\n", "rules.csv")
+        self.assertEqual(self.documents[1].Subject(), ("z",))
+        self.assertEqual(self.documents[2].Subject(), ())
+
+    def test_file_upload(self):
+        # what the form gets: a FileUpload of a temporary file
+        file = tempfile.TemporaryFile()
+        self.addCleanup(file.close)
+        file.write("b,z\nkeep,\n".encode("utf-8-sig"))
+        file.seek(0)
+        storage = FieldStorage(file, {}, "rules.csv", "rules_file")
+        self.upload(None, None, upload=FileUpload(storage))
+        self.assertEqual(self.documents[1].Subject(), ("z",))
+        self.assertEqual(self.documents[2].Subject(), ())
+        [message] = IStatusMessage(self.request).show()
+        self.assertEqual(message.message, "Applied 2 rule(s) to 3 object(s).")
+
+    def test_upload_in_background(self):
+        self.upload(b'{"b": "z"}', "rules.json", background=True)
+        self.assertIn("job=", self.request.response.getHeader("Location"))
+        (job,) = jobs.pending_jobs()
+        self.assertEqual(job.rules, {"b": "z"})
+        self.assertIn("b", self.documents[1].Subject())
+
+    def test_invalid_upload(self):
+        self.upload(b"{", "rules.json")
+        self.assertIn("b", self.documents[1].Subject())
+
+    def test_invalid_line_applies_nothing(self):
+        data = b"b,z\n" + b"keep,kept\n" * 1000 + b"x,y,z\n"
+        with mock.patch("transaction.abort") as abort:
+            self.upload(data, "rules.csv")
+        abort.assert_called_once()
+        self.assertEqual(self.documents[1].Subject(), ("b", "keep"))
+        [message] = IStatusMessage(self.request).show()
+        self.assertIn("line 1002", message.message)
+
+    def test_upload_is_not_chained(self):
+        # more rules than a batch, b -> a is not followed by a -> x
+        data = b"b,a\n" + b"".join(b"k%d,l%d\n" % (i, i) for i in range(600))
+        self.upload(data + b"a,x\n", "rules.csv")
+        self.assertEqual(self.documents[0].Subject(), ("x", "a", "c"))
+        self.assertEqual(self.documents[1].Subject(), ("a", "keep"))
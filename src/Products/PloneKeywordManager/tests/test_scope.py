@@ -0,0 +1,79 @@
+from BTrees.IIBTree import IISet
+from plone import api
+from Products.CMFCore.indexing import processQueue
+from Products.PloneKeywordManager.scope import scope_path
+from Products.PloneKeywordManager.scope import scoped_counts
+from Products.PloneKeywordManager.tests.base import PKMTestCase
+from unittest import mock
+from zope.component import getMultiAdapter
+
+
+class ScopeTestCase(PKMTestCase):
+    def setUp(self):
+        super().setUp()
+        self.subsite = api.content.create(
+            container=self.portal, type="Folder", id="subsite"
+        )
+        for container, subjects in (
+            (self.subsite, [["a", "b"], ["b"]]),
+            (self.portal, [["b", "c"]]),
+        ):
+            for i, subject in enumerate(subjects):
+                doc = api.content.create(
+                    container=container, type="Document", id=f"doc{i}"
+                )
+                doc.setSubject(subject)
+                doc.reindexObject()
+
+    def test_scope_path(self):
+        self.assertIsNone(scope_path(None))
+        self.assertIsNone(scope_path(self.portal))
+        self.assertEqual(scope_path(self.subsite), "/plone/subsite")
+
+    def test_scoped_keywords(self):
+        self.assertEqual(self.pkm.getKeywords(context=self.subsite), ["a", "b"])
+        self.assertEqual(
+            self.pkm.getKeywords(sort_on="count", reverse=True, context=self.subsite),
+            ["b", "a"],
+        )
+        self.assertEqual(self.pkm.getKeywords(context=self.portal), ["a", "b", "c"])
+        self.assertEqual(self.pkm.getInitials(context=self.subsite), ["a", "b"])
+
+    def test_scoped_counts(self):
+        self.assertEqual(
+            self.pkm.getKeywordCounts(context=self.subsite), {"a": 1, "b": 2}
+        )
+        self.assertEqual(self.pkm.getKeywordLength("c", context=self.subsite), 0)
+        self.assertEqual(self.pkm.getKeywordLength("b"), 3)
+
+    def test_both_strategies_agree(self):
+        processQueue()
+        catalog = api.portal.get_tool("portal_catalog")
+        index = catalog._catalog.getIndex("Subject")
+        rids = catalog._catalog.getIndex("path")._apply_index(
+            {"path": {"query": "/plone/subsite"}}
+        )[0]
+        expected = {"a": 1, "b": 2}
+        self.assertEqual(scoped_counts(index, rids), expected)
+        # more record ids than keywords, the rows are intersected instead
+        rids = IISet(list(rids) + [-1, -2])
+        self.assertEqual(scoped_counts(index, rids), expected)
+
+    def test_counted_once_per_request(self):
+        with mock.patch(
+            "Products.PloneKeywordManager.scope.scoped_counts",
+            return_value={"a": 1},
+        ) as counts:
+            self.pkm.getKeywords(context=self.subsite)
+            self.pkm.getKeywordCounts(context=self.subsite)
+        counts.assert_called_once()
+
+    def test_scoped_search(self):
+        self.assertEqual(self.pkm.searchKeywords("c", context=self.subsite), [])
+        self.assertEqual(self.pkm.searchKeywords("c"), ["c"])
+
+    def test_view_on_subsite(self):
+        view = getMultiAdapter((self.subsite, self.request), name="prefs_keywords_view")
+        self.assertEqual(list(view.getKeywords("Subject")), ["a", "b"])
+        self.assertEqual(view.getNumObjects("b", "Subject"), 2)
+        self.assertIn("/plone/subsite", view())
@@ -0,0 +1,109 @@
+from plone import api
+from Products.PloneKeywordManager import config
+from Products.PloneKeywordManager.scoring import parallel_scoring
+from Products.PloneKeywordManager.scoring import Pattern
+from Products.PloneKeywordManager.scoring import ratio
+from Products.PloneKeywordManager.scoring import Scorer
+from Products.PloneKeywordManager.scoring import USE_LEVENSHTEIN
+from Products.PloneKeywordManager.tests.base import PKMTestCase
+from unittest import mock
+from zope.component import getMultiAdapter
+
+import random
+import unittest
+
+if USE_LEVENSHTEIN:
+    import Levenshtein
+
+KEYWORDS = ["plone", "Plone", "plone6", "clone", "zope", "python", "pyramid", "Zope2"]
+
+
+class ScorerTestCase(unittest.TestCase):
+    def test_ratio(self):
+        # twice the longest common subsequence over the summed length
+        self.assertEqual(ratio("plone", "clone"), 0.8)
+        self.assertEqual(ratio("zope", "Zope2"), 1 - 3 / 9)
+        self.assertEqual(ratio("pyton", "python"), 1 - 1 / 11)
+        self.assertEqual(ratio("", ""), 1.0)
+        self.assertEqual(ratio("abc", ""), 0.0)
+
+    def test_cutoff(self):
+        pattern = Pattern("plone")
+        self.assertEqual(pattern.ratio("clone", 0.6), 0.8)
+        self.assertIsNone(pattern.ratio("clone", 0.8))
+        # rejected by length and by characters
+        self.assertIsNone(pattern.ratio("pl", 0.6))
+        with mock.patch.object(pattern, "common") as common:
+            self.assertIsNone(pattern.ratio("x" * 20 + "plone", 0.6))
+            self.assertIsNone(pattern.ratio("z" * 30, 0.1))
+        common.assert_not_called()
+
+    @unittest.skipUnless(USE_LEVENSHTEIN, "python-Levenshtein is not installed")
+    def test_same_scores_as_levenshtein(self):
+        rnd = random.Random(0)
+        for i in range(1000):
+            word = "".join(rnd.choices("abcAB -ü", k=rnd.randint(0, 20)))
+            other = "".join(rnd.choices("abcAB -ü", k=rnd.randint(0, 70)))
+            self.assertEqual(ratio(word, other), Levenshtein.ratio(word, other))
+
+    def test_ranking(self):
+        scored = Scorer(KEYWORDS).score("plone", 0.6)
+        self.assertEqual(
+            scored,
+            [(1, "plone6"), (1, "plone"), (1, "Plone"), (0.8, "clone")],
+        )
+
+    def test_score_many(self):
+        scorer = Scorer(KEYWORDS)
+        scored = scorer.score_many(["zope", "plone", "zope"], 0.6, num=2)
+        self.assertEqual(list(scored), ["zope", "plone"])
+        self.assertEqual(scored["plone"], scorer.score("plone", 0.6)[:2])
+        self.assertEqual([item for lscore, item in scored["zope"]], ["zope", "Zope2"])
+
+    def test_parallel_scoring(self):
+        keywords = [f"{word}{i}" for i in range(50) for word in KEYWORDS]
+        words = ["plone", "zope", "python"]
+        expected = Scorer(keywords).score_many(words, 0.6)
+        with (
+            mock.patch.multiple(config, PARALLEL_SCORING=0, SCORING_PROCESSES=2),
+            mock.patch("os.cpu_count", return_value=2),
+            mock.patch.object(
+                Scorer, "_score_parallel", wraps=Scorer(keywords)._score_parallel
+            ) as parallel,
+        ):
+            # requests score serially
+            self.assertEqual(Scorer(keywords).score_many(words, 0.6), expected)
+            parallel.assert_not_called()
+            with parallel_scoring():
+                self.assertEqual(Scorer(keywords).score_many(words, 0.6), expected)
+            parallel.assert_called_once()
+
+
+class SimilarKeywordsTestCase(PKMTestCase):
+    def setUp(self):
+        super().setUp()
+        doc = api.content.create(container=self.portal, type="Document", id="doc")
+        doc.setSubject(KEYWORDS)
+        doc.reindexObject()
+
+    @mock.patch(
+        "Products.PloneKeywordManager.tool.KeywordManager.getSimilarKeywords",
+        return_value=None,
+    )
+    def test_page_is_scored_in_one_call(self, vocabulary):
+        # without a vocabulary the keywords of the page are scored
+        view = getMultiAdapter((self.portal, self.request), name="prefs_keywords_view")
+        batch = view.getKeywords("Subject", b_size=100)
+        with mock.patch.object(
+            view.pkm, "scoreManyMatches", wraps=view.pkm.scoreManyMatches
+        ) as score:
+            similar = {
+                keyword: view.getSimilarKeywords(keyword, "Subject", batch, 7, 0.6)
+                for keyword in batch
+            }
+        score.assert_called_once()
+        for keyword in batch:
+            self.assertEqual(
+                similar[keyword],
+                self.pkm.getScoredMatches(keyword, list(batch), 7, 0.6),
+            )
@@ -0,0 +1,69 @@
+from plone import api
+from Products.PloneKeywordManager.sequences import initials
+from Products.PloneKeywordManager.sequences import KeywordSequence
+from Products.PloneKeywordManager.sequences import prefix_bounds
+from Products.PloneKeywordManager.tests.base import PKMTestCase
+from zope.component import getMultiAdapter
+
+import unittest
+
+KEYWORDS = ("apple", "Banana", "berry", "Blue", "cherry", "Mango", "melon")
+
+
+class SequenceTestCase(unittest.TestCase):
+    def test_prefix_bounds(self):
+        self.assertEqual(prefix_bounds(KEYWORDS, "b"), (1, 4))
+        self.assertEqual(prefix_bounds(KEYWORDS, "BL"), (3, 4))
+        self.assertEqual(prefix_bounds(KEYWORDS, "z"), (7, 7))
+
+    def test_initials(self):
+        self.assertEqual(initials(KEYWORDS), ["a", "b", "c", "m"])
+        self.assertEqual(initials(()), [])
+
+    def test_sequence(self):
+        sequence = KeywordSequence(KEYWORDS, 1, 4)
+        self.assertEqual(len(sequence), 3)
+        self.assertEqual(list(sequence), ["Banana", "berry", "Blue"])
+        self.assertEqual(sequence[-1], "Blue")
+        self.assertEqual(sequence[1:], ["berry", "Blue"])
+        with self.assertRaises(IndexError):
+            sequence[3]
+
+    def test_reversed_sequence(self):
+        sequence = KeywordSequence(KEYWORDS, 5, reverse=True)
+        self.assertEqual(list(sequence), ["melon", "Mango"])
+        self.assertEqual(sequence[:1], ["melon"])
+
+    def test_only_the_page_is_read(self):
+        class Keywords(tuple):
+            read = 0
+
+            def __getitem__(self, i):
+                Keywords.read += 1
+                return super().__getitem__(i)
+
+        sequence = KeywordSequence(Keywords(KEYWORDS * 1000))
+        self.assertEqual(len(sequence[30:45]), 15)
+        self.assertEqual(Keywords.read, 15)
+
+
+class PrefixTestCase(PKMTestCase):
+    def setUp(self):
+        super().setUp()
+        doc = api.content.create(container=self.portal, type="Document", id="doc")
+        doc.setSubject(list(KEYWORDS))
+        doc.reindexObject()
+
+    def test_get_keywords_with_prefix(self):
+        self.assertEqual(self.pkm.getKeywords(prefix="M"), ["Mango", "melon"])
+        self.assertEqual(self.pkm.getKeywords(sort_on="count", prefix="bl"), ["Blue"])
+        self.assertEqual(self.pkm.getInitials(), ["a", "b", "c", "m"])
+
+    def test_view_lists_keywords_with_prefix(self):
+        self.request.form["prefix"] = "b"
+        view = getMultiAdapter((self.portal, self.request), name="prefs_keywords_view")
+        batch = view.getKeywords("Subject", b_size=2)
+        self.assertEqual(batch.sequence_length, 3)
+        self.assertEqual(list(batch), ["Banana", "berry"])
+        self.assertIn("prefix=m", view.prefixUrl("m"))
+        self.assertIn('id="keyword_initials"', view())
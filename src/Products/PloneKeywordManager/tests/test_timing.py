@@ -0,0 +1,151 @@
+from plone import api
+from plone.protect.authenticator import createToken
+from Products.PloneKeywordManager.interfaces import IKeywordTimingEvent
+from Products.PloneKeywordManager.tests.base import PKMTestCase
+from Products.PloneKeywordManager.timing import KeywordTimingEvent
+from Products.PloneKeywordManager.timing import stats
+from Products.PloneKeywordManager.timing import TimingStats
+from zExceptions import Forbidden
+from zope.component import getGlobalSiteManager
+from zope.component import getMultiAdapter
+
+import unittest
+
+
+class TimingStatsTestCase(unittest.TestCase):
+    def test_totals(self):
+        totals = TimingStats(collecting=True)
+        for duration in (0.1, 0.3):
+            totals.add(
+                KeywordTimingEvent(
+                    "change", "Subject", duration, {"query": 0.05}, {"updated": 2}
+                )
+            )
+        [change] = totals.summary()
+        self.assertEqual(change["operation"], "change")
+        self.assertEqual(change["calls"], 2)
+        self.assertAlmostEqual(change["duration"], 0.4)
+        self.assertEqual(change["max"], 0.3)
+        self.assertEqual(change["durations"], {"query": 0.1})
+        self.assertEqual(change["counters"], {"updated": 4})
+        totals.reset()
+        self.assertEqual(totals.summary(), [])
+
+
+class TimingEventsTestCase(PKMTestCase):
+    def setUp(self):
+        super().setUp()
+        for i, subject in enumerate([["a", "b"], ["b"], ["c"]]):
+            doc = api.content.create(
+                container=self.portal, type="Document", id=f"doc{i}"
+            )
+            doc.setSubject(subject)
+            doc.reindexObject()
+        self.events = []
+        gsm = getGlobalSiteManager()
+        gsm.registerHandler(self.events.append, (IKeywordTimingEvent,))
+        self.addCleanup(
+            gsm.unregisterHandler, self.events.append, (IKeywordTimingEvent,)
+        )
+
+    def test_change(self):
+        self.pkm.change(["a", "b"], "x")
+        [event] = [e for e in self.events if e.operation == "change"]
+        self.assertEqual(event.indexName, "Subject")
+        self.assertEqual(event.counters, {"found": 2, "updated": 2})
+        self.assertEqual(
+            set(event.durations),
+            {
+                "query",
+                "check",
+                "getObject",
+                "read",
+                "getSetter",
+                "write",
+                "reindex",
+                "catalog",
+                "commit",
+            },
+        )
+        self.assertGreaterEqual(event.duration, sum(event.durations.values()))
+
+    def test_unchanged_objects_are_counted(self):
+        self.pkm.delete(["a", "x"])
+        self.pkm.change(["b"], "b")
+        change, delete = sorted(
+            (e for e in self.events if e.operation in ("change", "delete")),
+            key=lambda e: e.operation,
+        )
+        self.assertEqual(delete.counters, {"found": 1, "updated": 1})
+        self.assertEqual(change.counters, {"found": 2, "unchanged": 2})
+
+    def test_update_object(self):
+        doc = self.portal.doc2
+        self.pkm.updateObject(doc, "Subject", ["d"])
+        [event] = self.events
+        self.assertEqual(event.operation, "updateObject")
+        self.assertEqual(set(event.durations), {"getSetter", "write", "reindex"})
+
+    def test_listing_and_scoring(self):
+        self.pkm.getKeywords(prefix="b")
+        self.pkm.getScoredMatches("b", ["a", "b", "bb"], 7, 0.6)
+        keywords, scored = self.events
+        self.assertEqual(keywords.operation, "getKeywords")
+        self.assertEqual(set(keywords.durations), {"index", "sort", "prefix", "list"})
+        self.assertEqual(keywords.counters, {"keywords": 1})
+        self.assertEqual(scored.operation, "getScoredMatches")
+        self.assertEqual(scored.counters, {"candidates": 3, "matches": 2})
+
+
+class TimingsViewTestCase(PKMTestCase):
+    def setUp(self):
+        super().setUp()
+        self.addCleanup(setattr, stats, "collecting", stats.collecting)
+        stats.collecting = False
+        stats.reset()
+        self.addCleanup(stats.reset)
+
+    def view(self, **form):
+        self.request.form.update(form)
+        self.request.form["_authenticator"] = createToken()
+        self.request["REQUEST_METHOD"] = "POST"
+        return getMultiAdapter(
+            (self.portal, self.request), name="prefs_keywords_timings"
+        )
+
+    def test_collecting(self):
+        self.pkm.getKeywords()
+        self.assertEqual(stats.summary(), [])
+        self.view(**{"form.button.Start": "1"})()
+        self.assertTrue(stats.collecting)
+        self.pkm.getKeywords()
+        self.pkm.getKeywords()
+        view = getMultiAdapter(
+            (self.portal, self.request), name="prefs_keywords_timings"
+        )
+        [operation] = view.getStats()
+        self.assertEqual(operation["operation"], "getKeywords")
+        self.assertEqual(operation["calls"], 2)
+        self.assertEqual(
+            {stage["name"] for stage in operation["stages"]} - {"other"},
+            {"index", "sort", "list"},
+        )
+
+    def test_buttons_need_a_post_with_authenticator(self):
+        view = self.view(**{"form.button.Start": "1"})
+        self.request["REQUEST_METHOD"] = "GET"
+        with self.assertRaises(Forbidden):
+            view()
+        self.request["REQUEST_METHOD"] = "POST"
+        del self.request.form["_authenticator"]
+        with self.assertRaises(Forbidden):
+            view()
+        self.assertFalse(stats.collecting)
+
+    def test_render_and_reset(self):
+        stats.collecting = True
+        self.pkm.getKeywords()
+        html = self.view()()
+        self.assertIn('id="keyword-timings"', html)
+        self.view(**{"form.button.Reset": "1"})()
+        self.assertEqual(stats.summary(), [])
@@ -0,0 +1,103 @@
+from plone import api
+from Products.PloneKeywordManager.setuphandlers import importKeywords
+from Products.PloneKeywordManager.tests.base import PKMTestCase
+from Products.PloneKeywordManager.transfer import apply_rules
+from Products.PloneKeywordManager.transfer import export_chunks
+from Products.PloneKeywordManager.transfer import import_keywords
+from unittest import mock
+from zope.component import getMultiAdapter
+
+import io
+import json
+
+
+class ExportTestCase(PKMTestCase):
+    def setUp(self):
+        super().setUp()
+        for i, subject in enumerate([["a", "b"], ["b", "c, d"]]):
+            doc = api.content.create(
+                container=self.portal, type="Document", id=f"doc{i}"
+            )
+            doc.setSubject(subject)
+            doc.reindexObject()
+
+    def test_csv(self):
+        chunks = list(export_chunks(["Subject"], size=2))
+        self.assertEqual(len(chunks), 2)
+        self.assertEqual(
+            "".join(chunks).splitlines(),
+            ["keyword,index,count", "a,Subject,1", "b,Subject,2", '"c, d",Subject,1'],
+        )
+
+    def test_jsonl(self):
+        lines = "".join(export_chunks(["Subject"], "jsonl")).splitlines()
+        self.assertEqual(
+            json.loads(lines[1]), {"keyword": "b", "index": "Subject", "count": 2}
+        )
+        self.assertEqual(len(lines), 3)
+
+    def test_export_view(self):
+        self.request.form.update({"field": "Subject", "format": "jsonl"})
+        view = getMultiAdapter(
+            (self.portal, self.request), name="prefs_keywords_export"
+        )
+        with mock.patch.object(self.request.response, "write") as write:
+            view()
+        self.assertEqual(
+            self.request.response.getHeader("Content-Type"),
+            "application/x-ndjson; charset=utf-8",
+        )
+        self.assertIn(b'"keyword": "a"', write.call_args_list[0][0][0])
+
+
+class ImportTestCase(PKMTestCase):
+    def test_import_keywords(self):
+        doc = api.content.create(container=self.portal, type="Document", id="doc")
+        doc.setSubject(["used"])
+        doc.reindexObject()
+        added = import_keywords(
+            self.portal, iter(["a", "used", "b", "a", "c", " ", "d", "e"]), size=2
+        )
+        self.assertEqual(added, 5)
+        self.assertEqual(self.portal.keywords.Subject(), ("a", "b"))
+        self.assertEqual(self.portal["keywords-2"].Subject(), ("c", "d"))
+        self.assertEqual(self.portal["keywords-3"].Subject(), ("e",))
+        # the carrier with room left is filled up first
+        self.assertEqual(import_keywords(self.portal, ["e", "f", "g"], size=2), 2)
+        self.assertEqual(self.portal["keywords-3"].Subject(), ("e", "f"))
+        self.assertEqual(self.portal["keywords-4"].Subject(), ("g",))
+
+    def test_apply_rules_in_chunks(self):
+        import_keywords(self.portal, ["a", "b", "c"])
+        count = apply_rules(iter([("a", "x"), ("b", None), ("c", "y")]), size=2)
+        self.assertEqual(count, 2)
+        self.assertEqual(self.pkm.getKeywords(), ["x", "y"])
+
+    def test_profile_import_streams_files(self):
+        files = {"keywords.txt": b"apple\npear\n"}
+
+        class StreamingContext:
+            def openDataFile(self, filename):
+                data = files.get(filename)
+                return io.BytesIO(data) if data is not None else None
+
+            def getSite(self):
+                return api.portal.get()
+
+        importKeywords(StreamingContext())
+        self.assertEqual(self.portal.keywords.Subject(), ("apple", "pear"))
+
+    def test_upload_keywords(self):
+        upload = io.BytesIO(b"keyword,index,count\nkiwi,Subject,3\n")
+        upload.filename = "keywords.csv"
+        self.request.form.update(
+            {
+                "form.button.ApplyRules": "1",
+                "field": "Subject",
+                "rules_file": upload,
+                "import_mode": "keywords",
+            }
+        )
+        view = getMultiAdapter((self.portal, self.request), name="prefs_keywords_view")
+        view()
+        self.assertEqual(self.portal.keywords.Subject(), ("kiwi",))
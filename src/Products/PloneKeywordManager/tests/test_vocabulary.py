@@ -0,0 +1,165 @@
+from plone import api
+from Products.CMFCore.indexing import processQueue
+from Products.PloneKeywordManager.tests.base import PKMTestCase
+from Products.PloneKeywordManager.vocabulary import build_vocabulary
+from Products.PloneKeywordManager.vocabulary import get_vocabulary
+from Products.PloneKeywordManager.vocabulary import KeywordVocabulary
+from Products.PloneKeywordManager.vocabulary import trigrams
+from Products.PloneKeywordManager.vocabulary import update_vocabularies
+from unittest import mock
+from zope.component import getMultiAdapter
+
+import unittest
+
+
+class KeywordVocabularyTestCase(unittest.TestCase):
+    def setUp(self):
+        self.vocabulary = KeywordVocabulary()
+        for keyword in ("Keyword", "keywords", "Plone", "Python", "Zope"):
+            self.vocabulary.add(keyword)
+
+    def test_trigrams(self):
+        self.assertEqual(trigrams("Ab"), {"  a", " ab", "ab "})
+
+    def test_candidates(self):
+        self.assertEqual(
+            sorted(self.vocabulary.candidates("keyword")), ["Keyword", "keywords"]
+        )
+        # substrings are always candidates
+        self.assertEqual(self.vocabulary.candidates("ope"), ["Zope"])
+        self.assertEqual(self.vocabulary.candidates("xyz"), [])
+
+    def test_add_does_not_write_the_vocabulary(self):
+        # concurrent edits adding keywords only write the BTrees
+        state = self.vocabulary.__getstate__()
+        self.vocabulary.add("Plone 6")
+        self.assertEqual(self.vocabulary.__getstate__(), state)
+        self.assertEqual(len(set(self.vocabulary.ids.values())), 6)
+
+    def test_add_and_remove(self):
+        self.assertFalse(self.vocabulary.add("Zope"))
+        self.assertEqual(len(self.vocabulary), 5)
+        self.assertTrue(self.vocabulary.remove("Zope"))
+        self.assertFalse(self.vocabulary.remove("Zope"))
+        self.assertNotIn("Zope", self.vocabulary)
+        self.assertEqual(self.vocabulary.candidates("Zope"), [])
+        self.assertEqual(len(self.vocabulary), 4)
+
+    def test_link(self):
+        def scorer(word, possibilities, score):
+            return [(0.9, p) for p in sorted(possibilities)]
+
+        self.vocabulary.link("Keyword", scorer)
+        self.assertEqual(self.vocabulary.similar["Keyword"], ((0.9, "keywords"),))
+        # linked both ways
+        self.assertEqual(self.vocabulary.similar["keywords"], ((0.9, "Keyword"),))
+        self.vocabulary.remove("Keyword")
+        self.assertNotIn("Keyword", self.vocabulary.similar)
+
+    def test_prune(self):
+        def scorer(word, possibilities, score):
+            return [(0.9, p) for p in sorted(possibilities)]
+
+        self.vocabulary.link("Keyword", scorer, size=1)
+        self.vocabulary.add("Keywordmanager")
+        self.assertEqual(self.vocabulary.similar["Keyword"], ((0.9, "keywords"),))
+        self.assertEqual(
+            self.vocabulary.prune({"Keyword", "Keywordmanager"}, scorer),
+            ["Plone", "Python", "Zope", "keywords"],
+        )
+        self.assertEqual(len(self.vocabulary), 2)
+        self.assertNotIn("keywords", self.vocabulary.similar)
+        # linked again with the keywords left
+        self.assertEqual(self.vocabulary.similar["Keyword"], ((0.9, "Keywordmanager"),))
+
+
+class SearchKeywordsTestCase(PKMTestCase):
+    def setUp(self):
+        super().setUp()
+        self.document = api.content.create(
+            container=self.portal, type="Document", id="document"
+        )
+        self.document.setSubject(["Keyword", "keywords", "Plone", "Zope"])
+        self.document.reindexObject()
+        processQueue()
+        self.update()
+
+    def update(self):
+        """Runs the worker part linking new keywords."""
+        with mock.patch("transaction.commit"):
+            return update_vocabularies()
+
+    def test_new_keywords_are_added(self):
+        self.assertIn("Keyword", get_vocabulary("Subject"))
+        self.document.setSubject(["Keyword", "Keywordmanager"])
+        self.document.reindexObject(idxs=["Subject"])
+        processQueue()
+        self.assertIn("Keywordmanager", get_vocabulary("Subject"))
+        # linked by the worker, not while saving the content
+        self.assertEqual(self.pkm.getSimilarKeywords("Keywordmanager"), [])
+        self.assertEqual(self.update(), 1)
+        self.assertEqual(self.pkm.getSimilarKeywords("Keywordmanager"), ["Keyword"])
+        self.assertEqual(self.update(), 0)
+
+    def test_search(self):
+        self.assertEqual(
+            self.pkm.searchKeywords("keyword", score=0.6),
+            ["keywords", "Keyword"],
+        )
+        self.assertEqual(self.pkm.searchKeywords("ope", score=0.6), ["Zope"])
+
+    def test_unused_keywords_are_skipped(self):
+        self.document.setSubject(["Plone"])
+        self.document.reindexObject()
+        processQueue()
+        self.assertIn("Keyword", get_vocabulary("Subject"))
+        self.assertEqual(self.pkm.searchKeywords("keyword", score=0.6), [])
+        self.update()
+        self.assertNotIn("Keyword", get_vocabulary("Subject"))
+        self.assertEqual(len(get_vocabulary("Subject")), 1)
+        build_vocabulary("Subject")
+        self.assertEqual(list(get_vocabulary("Subject").ids), ["Plone"])
+
+    def test_build_leaves_linking_to_the_worker(self):
+        with mock.patch.object(self.pkm, "scoreMatches") as scoreMatches:
+            build_vocabulary("Subject")
+        scoreMatches.assert_not_called()
+        self.assertEqual(self.pkm.getSimilarKeywords("Keyword"), [])
+        with mock.patch("transaction.commit") as commit:
+            self.assertEqual(update_vocabularies(), 4)
+        self.assertEqual(commit.call_count, 2)
+        self.assertEqual(self.pkm.getSimilarKeywords("Keyword"), ["keywords"])
+
+    def test_similar_keywords(self):
+        other = api.content.create(container=self.portal, type="Document", id="other")
+        other.setSubject(["Keywords"])
+        other.reindexObject()
+        processQueue()
+        self.update()
+        # both contain the keyword and score alike, whichever was added first
+        self.assertEqual(
+            self.pkm.getSimilarKeywords("Keyword"), ["keywords", "Keywords"]
+        )
+        self.assertEqual(self.pkm.getSimilarKeywords("Keyword", num=1), ["keywords"])
+        self.assertEqual(self.pkm.getSimilarKeywords("Zope"), [])
+        other.setSubject([])
+        other.reindexObject()
+        processQueue()
+        self.assertEqual(self.pkm.getSimilarKeywords("Keyword"), ["keywords"])
+        # the place of the removed keyword is left to others
+        self.update()
+        self.assertNotIn("Keywords", get_vocabulary("Subject").similar)
+        self.assertEqual(self.pkm.getSimilarKeywords("Keyword"), ["keywords"])
+
+    def test_similar_keywords_are_loaded_on_request(self):
+        view = getMultiAdapter((self.portal, self.request), name="prefs_keywords_view")
+        with mock.patch.object(
+            self.pkm, "getSimilarKeywords", return_value=[]
+        ) as getSimilarKeywords:
+            view()
+            getSimilarKeywords.assert_not_called()
+            self.request.form["similar"] = "1"
+            view()
+        self.assertEqual(getSimilarKeywords.call_count, 4)
+        self.assertIn("similar=1", view.showSimilarUrl(True))
+        self.assertNotIn("similar", view.showSimilarUrl(False))
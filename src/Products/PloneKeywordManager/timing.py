@@ -0,0 +1,126 @@
+"""Timings of the stages of the keyword operations.
+
+change(), delete(), applyRules(), revert(), updateObject(), getKeywords()
+and getScoredMatches() time their stages, e.g. the catalog query, loading
+the objects, writing the field and reindexing, and count what they did.
+Once done they notify a KeywordTimingEvent with the seconds spent in each
+stage, subscribers may log them or send them to a monitoring system.
+
+The TimingStats of this module sums up the events of this process while
+collecting, see config.COLLECT_TIMINGS. They are shown on the timings page
+of the control panel, so slow operations can be diagnosed on a production
+site without a profiler.
+"""
+
+from Products.PloneKeywordManager import config
+from Products.PloneKeywordManager.interfaces import IKeywordTimingEvent
+from zope.event import notify
+from zope.interface import implementer
+
+import threading
+import time
+
+
+@implementer(IKeywordTimingEvent)
+class KeywordTimingEvent:
+    def __init__(self, operation, indexName, duration, durations, counters):
+        self.operation = operation
+        self.indexName = indexName
+        self.duration = duration
+        self.durations = durations
+        self.counters = counters
+
+
+class Timing:
+    """Adds up the seconds spent in the stages of an operation.
+
+    A stage is timed from a perf_counter() start, add() returns the current
+    time to start the next stage with::
+
+        start = time.perf_counter()
+        brains = catalog(query)
+        start = timing.add("query", start)
+    """
+
+    def __init__(self, operation, indexName=None):
+        self.operation = operation
+        self.indexName = indexName
+        self.durations = {}
+        self.counters = {}
+        self.start = time.perf_counter()
+
+    def add(self, stage, start):
+        now = time.perf_counter()
+        self.durations[stage] = self.durations.get(stage, 0.0) + now - start
+        return now
+
+    def count(self, name, number=1):
+        self.counters[name] = self.counters.get(name, 0) + number
+
+    def notify(self):
+        """Notifies the KeywordTimingEvent of the operation."""
+        notify(
+            KeywordTimingEvent(
+                self.operation,
+                self.indexName,
+                time.perf_counter() - self.start,
+                dict(self.durations),
+                dict(self.counters),
+            )
+        )
+
+
+class TimingStats:
+    """Sums up the timing events of each operation in this process."""
+
+    def __init__(self, collecting=False):
+        self.collecting = collecting
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.operations = {}
+            self.since = time.time()
+
+    def add(self, event):
+        with self.lock:
+            totals = self.operations.get(event.operation)
+            if totals is None:
+                totals = self.operations[event.operation] = {
+                    "calls": 0,
+                    "duration": 0.0,
+                    "max": 0.0,
+                    "durations": {},
+                    "counters": {},
+                }
+            totals["calls"] += 1
+            totals["duration"] += event.duration
+            totals["max"] = max(totals["max"], event.duration)
+            for name, seconds in event.durations.items():
+                totals["durations"][name] = totals["durations"].get(name, 0.0) + seconds
+            for name, number in event.counters.items():
+                totals["counters"][name] = totals["counters"].get(name, 0) + number
+
+    def summary(self):
+        """Returns a list of the totals of each operation, by operation, as
+        dicts with the keys of add() plus the name of the operation."""
+        with self.lock:
+            return [
+                dict(
+                    totals,
+                    operation=operation,
+                    durations=dict(totals["durations"]),
+                    counters=dict(totals["counters"]),
+                )
+                for operation, totals in sorted(self.operations.items())
+            ]
+
+
+stats = TimingStats(config.COLLECT_TIMINGS)
+
+
+def collect(event):
+    """Adds a timing event to the stats while collecting."""
+    if stats.collecting:
+        stats.add(event)
@@ -2,31 +2,59 @@
 # See also LICENSE.txt
 from AccessControl import ClassSecurityInfo
 from Acquisition import aq_base
+from BTrees.IIBTree import multiunion
 from plone import api
-from plone.dexterity.interfaces import IDexterityContent
 from Products.CMFCore.indexing import processQueue
 from Products.PloneKeywordManager import config
+from Products.PloneKeywordManager import logger
+from Products.PloneKeywordManager.accessors import getFieldValue
+from Products.PloneKeywordManager.audit import get_deltas
+from Products.PloneKeywordManager.audit import get_entry
+from Products.PloneKeywordManager.audit import OperationLog
+from Products.PloneKeywordManager.batch import BatchProcessor
+from Products.PloneKeywordManager.batch import checkpoint_key
+from Products.PloneKeywordManager.batch import clear_checkpoint
+from Products.PloneKeywordManager.batch import get_checkpoint
+from Products.PloneKeywordManager.cache import count_order
+from Products.PloneKeywordManager.cache import index_state
+from Products.PloneKeywordManager.cache import keyword_counts
+from Products.PloneKeywordManager.cache import keywords_by_count
+from Products.PloneKeywordManager.cache import patch_sorted_keywords
+from Products.PloneKeywordManager.cache import request_cache
+from Products.PloneKeywordManager.cache import request_memoize
+from Products.PloneKeywordManager.cache import row_length
+from Products.PloneKeywordManager.cache import sorted_keywords
 from Products.PloneKeywordManager.compat import to_str
+from Products.PloneKeywordManager.duplicates import duplicate_groups
+from Products.PloneKeywordManager.interfaces import IKeywordFieldStrategy
 from Products.PloneKeywordManager.interfaces import IKeywordManager
+from Products.PloneKeywordManager.jobs import defer_reindex
+from Products.PloneKeywordManager.locks import leased
+from Products.PloneKeywordManager.preview import preview as preview_operation
+from Products.PloneKeywordManager.preview import record_cost
+from Products.PloneKeywordManager.scope import scope_path
+from Products.PloneKeywordManager.scope import scoped_keywords
+from Products.PloneKeywordManager.scoring import Scorer
+from Products.PloneKeywordManager.sequences import initials
+from Products.PloneKeywordManager.sequences import KeywordSequence
+from Products.PloneKeywordManager.sequences import prefix_bounds
+from Products.PloneKeywordManager.timing import Timing
+from Products.PloneKeywordManager.vocabulary import get_vocabulary
+from types import MappingProxyType
 from zope import interface
+from zope.component import queryAdapter
 
-try:
-    from plone.app.discussion.interfaces import IComment
-except ImportError:
+import functools
+import time
 
-    class IComment:
-        """Dummy class for compatibility with Plone without p.a.discussion installed/available"""
 
-
-# Python imports
-try:
-    import Levenshtein
-
-    USE_LEVENSHTEIN = True
-except ImportError:
-    import difflib
-
-    USE_LEVENSHTEIN = False
+def as_set(value):
+    """The keywords of a field value as a set."""
+    if value is None:
+        return set()
+    if isinstance(value, (list, tuple, set, frozenset)):
+        return set(value)
+    return {value}
 
 
 @interface.implementer(IKeywordManager)
@@ -42,12 +70,45 @@ class KeywordManager:
         return list(idxs)
 
     @security.protected(config.MANAGE_KEYWORDS_PERMISSION)
-    def change(self, old_keywords, new_keyword, context=None, indexName="Subject"):
+    def change(
+        self,
+        old_keywords,
+        new_keyword,
+        context=None,
+        indexName="Subject",
+        batch_size=None,
+        commit=False,
+        progress=None,
+        defer=None,
+        stats=None,
+        preview=False,
+    ):
         """Updates all objects using the old_keywords.
 
         Objects using the old_keywords will be using the new_keyword
         afterwards.
 
+        Objects are processed in chunks of ``batch_size``. With ``commit``
+        every chunk is committed in its own transaction and the operation
+        resumes where it stopped if it is interrupted and called again.
+        ``progress`` is called with the number of objects handled so far and
+        the total after every chunk.
+
+        Text indexes are only reindexed if they hold the removed keywords for
+        an object. Reindexing the indexes in ``defer`` (by default
+        config.DEFERRED_REINDEX) is left to the background worker. If a
+        ``stats`` dictionary is passed, it is filled with the time spent
+        reindexing each index, see updateObject().
+
+        With ``preview`` nothing is changed, a dictionary telling how many
+        and which objects would be updated is returned instead, see
+        preview.preview().
+
+        The old and new keywords are leased while the objects are updated,
+        until the transaction ends unless ``commit`` is true. If another
+        operation holds a lease on one of them for overlapping objects,
+        locks.OperationLocked is raised, see locks.py.
+
         Returns the number of objects that have been updated.
         """
 
@@ -57,6 +118,18 @@ class KeywordManager:
             query["path"] = "/".join(context.getPhysicalPath())
 
         new_keyword = to_str(new_keyword)
+        old_set = set(old_keywords)
+
+        def newKeywords(current):
+            return (current - old_set) | {new_keyword}
+
+        if preview:
+            return preview_operation(
+                indexName, old_keywords, newKeywords, query.get("path")
+            )
+
+        timing = Timing("change", indexName)
+        start = time.perf_counter()
         try:
             querySet = api.content.find(**query)
         except UnicodeDecodeError:
@@ -65,43 +138,91 @@ class KeywordManager:
             ]
             query[indexName] = old_keywords
             querySet = api.content.find(**query)
+        timing.add("query", start)
 
-        for item in querySet:
-            obj = item.getObject()
-            # #MOD Dynamic field getting
+        old_set = set(old_keywords)
 
-            value = self.getFieldValue(obj, indexName)
+        def newValue(value):
             if isinstance(value, (list, tuple)):
                 # MULTIVALUED FIELD
                 value = set(value)
-                value = value - set(old_keywords)
+                value = value - old_set
                 value.add(new_keyword)
                 value = list(value)
             elif isinstance(value, set):
-                value = value - set(old_keywords)
+                value = value - old_set
                 value.add(new_keyword)
             else:
                 # MONOVALUED FIELD
                 value = new_keyword
-
-            self.updateObject(obj, indexName, value)
-
-        return len(querySet)
+            return value
+
+        key = checkpoint_key(
+            "change", indexName, sorted(old_keywords), new_keyword, query.get("path")
+        )
+        log = OperationLog(
+            "change", indexName, old_keywords, new_keyword, query.get("path")
+        )
+        touched = list(old_keywords) + [new_keyword]
+        with leased(indexName, touched, query.get("path"), commit) as lease:
+            count = self._process(
+                querySet,
+                indexName,
+                touched,
+                newKeywords,
+                newValue,
+                key,
+                batch_size,
+                commit,
+                lease.watch(progress),
+                defer,
+                stats,
+                log,
+                timing,
+            )
+        log.save()
+        timing.notify()
+        return count
 
     @security.protected(config.MANAGE_KEYWORDS_PERMISSION)
-    def delete(self, keywords, context=None, indexName="Subject"):
+    def delete(
+        self,
+        keywords,
+        context=None,
+        indexName="Subject",
+        batch_size=None,
+        commit=False,
+        progress=None,
+        defer=None,
+        stats=None,
+        preview=False,
+    ):
         """Removes the keywords from all objects using it.
 
+        See change() for the other arguments.
+
         Returns the number of objects that have been updated.
         """
         query = {indexName: keywords}
         if context is not None:
             query["path"] = "/".join(context.getPhysicalPath())
+
+        deleted = set(keywords)
+
+        def newKeywords(current):
+            return current - deleted
+
+        if preview:
+            return preview_operation(
+                indexName, keywords, newKeywords, query.get("path")
+            )
+
+        timing = Timing("delete", indexName)
+        start = time.perf_counter()
         querySet = api.content.find(**query)
+        timing.add("query", start)
 
-        for item in querySet:
-            obj = item.getObject()
-            value = self.getFieldValue(obj, indexName)
+        def newValue(value):
             if isinstance(value, (list, tuple)):
                 # MULTIVALUED
                 value = list(value)
@@ -109,51 +230,567 @@ class KeywordManager:
                     while element in value:
                         value.remove(element)
             elif type(value) is set:
-                value = value - set(keywords)
+                value = value - deleted
             else:
                 # MONOVALUED
                 value = None
+            return value
+
+        key = checkpoint_key("delete", indexName, sorted(keywords), query.get("path"))
+        log = OperationLog("delete", indexName, keywords, None, query.get("path"))
+        with leased(indexName, keywords, query.get("path"), commit) as lease:
+            count = self._process(
+                querySet,
+                indexName,
+                keywords,
+                newKeywords,
+                newValue,
+                key,
+                batch_size,
+                commit,
+                lease.watch(progress),
+                defer,
+                stats,
+                log,
+                timing,
+            )
+        log.save()
+        timing.notify()
+        return count
+
+    @security.protected(config.MANAGE_KEYWORDS_PERMISSION)
+    def applyRules(
+        self,
+        rules,
+        context=None,
+        indexName="Subject",
+        batch_size=None,
+        commit=False,
+        progress=None,
+        defer=None,
+        stats=None,
+        preview=False,
+    ):
+        """Applies many rename rules at once.
+
+        ``rules`` maps old keywords to new keywords, or to None to delete
+        them. All rules are applied together, renamed keywords are not
+        renamed again by other rules. The objects using any of the old
+        keywords are found with a single catalog query and each of them is
+        updated once.
+
+        See change() for the other arguments.
+
+        Returns the number of objects that have been updated.
+        """
+        rules = {k: to_str(v) if v is not None else None for k, v in rules.items()}
+        if not rules:
+            return 0
+        query = {indexName: list(rules)}
+        if context is not None:
+            query["path"] = "/".join(context.getPhysicalPath())
+
+        def rename(keyword):
+            return rules.get(keyword, keyword)
+
+        def newKeywords(current):
+            return {rename(k) for k in current} - {None}
 
-            self.updateObject(obj, indexName, value)
+        if preview:
+            return preview_operation(
+                indexName, list(rules), newKeywords, query.get("path")
+            )
 
-        return len(querySet)
+        timing = Timing("applyRules", indexName)
+        start = time.perf_counter()
+        querySet = api.content.find(**query)
+        timing.add("query", start)
+
+        def newValue(value):
+            if isinstance(value, (list, tuple)):
+                # MULTIVALUED FIELD, keeps the order
+                renamed = []
+                for element in value:
+                    element = rename(element)
+                    if element is not None and element not in renamed:
+                        renamed.append(element)
+                value = renamed
+            elif isinstance(value, set):
+                value = {rename(k) for k in value} - {None}
+            else:
+                # MONOVALUED FIELD
+                value = rename(value)
+            return value
+
+        touched = list(rules) + [v for v in rules.values() if v is not None]
+        key = checkpoint_key(
+            "rules", indexName, sorted(rules.items()), query.get("path")
+        )
+        log = OperationLog(
+            "rules", indexName, tuple(rules), tuple(rules.values()), query.get("path")
+        )
+        with leased(indexName, touched, query.get("path"), commit) as lease:
+            count = self._process(
+                querySet,
+                indexName,
+                touched,
+                newKeywords,
+                newValue,
+                key,
+                batch_size,
+                commit,
+                lease.watch(progress),
+                defer,
+                stats,
+                log,
+                timing,
+            )
+        log.save()
+        timing.notify()
+        return count
 
-    def updateObject(self, obj, indexName, value):
+    @security.protected(config.MANAGE_KEYWORDS_PERMISSION)
+    def revert(
+        self,
+        key,
+        batch_size=None,
+        commit=False,
+        progress=None,
+        defer=None,
+        stats=None,
+    ):
+        """Reverts the logged operation ``key``, see audit.read_log().
+
+        The objects the operation updated get back the keywords they lost
+        and lose the ones they gained. They are found by UID and updated
+        like in change(), one group of objects sharing the same change at a
+        time. Objects whose keywords have changed since, i.e. that miss a
+        keyword the operation added or use one it removed again, are left
+        alone without being loaded.
+
+        The revert is logged itself and can be reverted in turn. See
+        change() for the other arguments.
+
+        Returns the number of objects that have been updated, each counted
+        once.
+        """
+        entry = get_entry(key)
+        deltas = get_deltas(key)
+        if entry is None or deltas is None:
+            raise ValueError(f"No revertable operation {key}")
+        indexName = entry.index
+        log = OperationLog("revert", indexName, entry.keywords, entry.new, entry.path)
+        timing = Timing("revert", indexName)
+        touched = set()
+        for removed, added, uids in deltas:
+            touched.update(removed)
+            touched.update(added)
+        seen = set()
+        with leased(indexName, touched, entry.path, commit) as lease:
+            for removed, added, uids in deltas:
+                removed, added = set(removed), set(added)
+                # operations logged before their chunks were logged on commit
+                # may list an object retried after a conflict twice
+                uids = [uid for uid in uids if uid not in seen]
+                seen.update(uids)
+
+                def newKeywords(current, removed=removed, added=added):
+                    if not added <= current or removed & current:
+                        # changed since the operation
+                        return current
+                    return (current - added) | removed
+
+                def newValue(value, removed=removed, added=added):
+                    current = as_set(value)
+                    if not added <= current or removed & current:
+                        return value
+                    if isinstance(value, (list, tuple)):
+                        value = [v for v in value if v not in added]
+                        value.extend(sorted(removed))
+                    elif isinstance(value, (set, frozenset)):
+                        value = (value - added) | removed
+                    else:
+                        # MONOVALUED FIELD
+                        value = next(iter(removed), None)
+                    return value
+
+                start = time.perf_counter()
+                querySet = api.content.find(UID=uids)
+                timing.add("query", start)
+                self._process(
+                    querySet,
+                    indexName,
+                    list(removed | added),
+                    newKeywords,
+                    newValue,
+                    checkpoint_key("revert", key, sorted(removed), sorted(added)),
+                    batch_size,
+                    commit,
+                    lease.watch(progress),
+                    defer,
+                    stats,
+                    log,
+                    timing,
+                )
+        log.save()
+        timing.notify()
+        return log.count
+
+    def _process(
+        self,
+        querySet,
+        indexName,
+        touched,
+        newKeywords,
+        newValue,
+        key,
+        batch_size=None,
+        commit=False,
+        progress=None,
+        defer=None,
+        stats=None,
+        log=None,
+        timing=None,
+    ):
+        """Rewrite the field of the objects found in chunks.
+
+        ``newKeywords`` computes the keywords an object ends up with from the
+        set the index holds for it. Objects for which this is the same set are
+        skipped without being loaded. The others are loaded and ``newValue``
+        computes the new field value from the current one.
+
+        Committing chunks are tracked in a persistent checkpoint, which is
+        removed once the operation is complete.
+
+        ``touched`` are the keywords that may appear in or vanish from the
+        index, the cached keyword list is patched accordingly.
+
+        The updated objects and the keywords they lost and gained are
+        written to ``log``, an audit.OperationLog, along with every chunk,
+        and the time it took is added to it. The time spent in each stage is
+        added to ``timing``, a timing.Timing. Objects are only counted once
+        their chunk has been saved, a chunk retried after a conflict is not
+        counted twice.
+        """
+        catalog = api.portal.get_tool("portal_catalog")
+        index = catalog._catalog.getIndex(indexName)
+        if timing is None:
+            timing = Timing("process", indexName)
+
+        def process(brain):
+            """Returns the UID of an updated object with the keywords it
+            lost and gained, None if it is left unchanged."""
+            start = time.perf_counter()
+            removed = None
+            indexed = index.getEntryForObject(brain.getRID(), None)
+            if indexed is not None:
+                indexed = set(indexed)
+                keywords = newKeywords(indexed)
+                if keywords == indexed:
+                    timing.add("check", start)
+                    return None
+                removed = indexed - keywords
+            start = timing.add("check", start)
+            # The catalog query already checked the permissions
+            obj = brain._unrestrictedGetObject()
+            start = timing.add("getObject", start)
+            current = self.getFieldValue(obj, indexName)
+            value = newValue(current)
+            timing.add("read", start)
+            self.updateObject(obj, indexName, value, removed, defer, stats, timing)
+            if indexed is None:
+                indexed, keywords = as_set(current), as_set(value)
+            return brain.UID, indexed - keywords, keywords - indexed
+
+        def store(results):
+            if log is not None:
+                log.add([result for result in results if result is not None])
+
+        timing.count("found", len(querySet))
+        start = time.perf_counter()
+        if not commit:
+            state = index_state(index)
+            processor = BatchProcessor(
+                batch_size=batch_size, progress=progress, timing=timing
+            )
+            results = processor(querySet, process, store)
+            patch_sorted_keywords(index, state, touched)
+            self._record(log, timing, indexName, results, time.perf_counter() - start)
+            return len(querySet)
+
+        # Other transactions may change the index between our commits, so
+        # the cached keyword list is rebuilt instead of patched.
+
+        done = len(get_checkpoint(key).done)
+        if done:
+            logger.info("Resuming keyword operation, %d objects already done", done)
+        processor = BatchProcessor(
+            batch_size=batch_size,
+            commit=True,
+            checkpoint=key,
+            progress=progress,
+            timing=timing,
+        )
+        results = processor(querySet, process, store)
+        self._record(log, timing, indexName, results, time.perf_counter() - start)
+        count = len(get_checkpoint(key).done)
+        clear_checkpoint(key)
+        return count
+
+    def _record(self, log, timing, indexName, results, duration):
+        updated = [result for result in results if result is not None]
+        if updated:
+            timing.count("updated", len(updated))
+        if len(results) > len(updated):
+            timing.count("unchanged", len(results) - len(updated))
+        record_cost(indexName, duration, len(updated))
+        if log is not None:
+            log.duration += duration
+
+    def updateObject(
+        self,
+        obj,
+        indexName,
+        value,
+        removed=None,
+        defer=None,
+        stats=None,
+        timing=None,
+    ):
+        """Sets the field behind indexName and reindexes the object.
+
+        ``removed`` are the keywords the object loses, they are used to tell
+        whether text indexes need to be updated, see _getReindexList(). If
+        ``stats`` is a dictionary, every index is reindexed on its own and
+        the time spent is added up in ``stats["reindex"]``, while
+        ``stats["skipped"]`` and ``stats["deferred"]`` count the indexes that
+        have not been reindexed.
+
+        The time spent is added to the ``timing`` of the calling operation,
+        without one an event is notified for the object, see timing.py.
+        """
+        notify = timing is None
+        if notify:
+            timing = Timing("updateObject", indexName)
+        start = time.perf_counter()
         updateField = self.getSetter(obj, indexName)
+        start = timing.add("getSetter", start)
         if updateField is not None:
             updateField(value)
-            idxs = self._getFullIndexList(indexName)
-            obj.reindexObject(idxs=idxs)
+            start = timing.add("write", start)
+            idxs = self._getReindexList(obj, indexName, removed, defer, stats)
+            if stats is None:
+                obj.reindexObject(idxs=idxs)
+            else:
+                self._timedReindex(obj, idxs, stats)
+            timing.add("reindex", start)
+        if notify:
+            timing.notify()
 
-    @security.protected(config.MANAGE_KEYWORDS_PERMISSION)
-    def getKeywords(self, indexName="Subject"):
-        processQueue()
-        if indexName not in self.getKeywordIndexes():
-            raise ValueError(f"{indexName} is not a valid field")
+    def _getReindexList(self, obj, indexName, removed=None, defer=None, stats=None):
+        """The indexes to update after the keywords of obj changed.
+
+        Indexes in config.REINDEX_IF_INDEXED are skipped if none of the
+        ``removed`` keywords is indexed for obj, and handed to the
+        background worker if they are in ``defer``.
+        """
+        if defer is None:
+            defer = config.DEFERRED_REINDEX
+        idxs = self._getFullIndexList(indexName)
+        deferred = []
+        for name in config.REINDEX_IF_INDEXED:
+            if name in idxs:
+                continue
+            if removed is not None and not self._isIndexed(obj, name, removed):
+                self._count(stats, "skipped", name)
+            elif name in defer:
+                deferred.append(name)
+                self._count(stats, "deferred", name)
+            else:
+                idxs.append(name)
+        if deferred:
+            defer_reindex(obj, deferred)
+        return idxs
 
+    def _isIndexed(self, obj, indexName, keywords):
+        """Tells whether the words of any of the keywords are in the text
+        index ``indexName`` for obj. Returns True if it cannot tell.
+        """
         catalog = api.portal.get_tool("portal_catalog")
-        keywords = [x for x in catalog.uniqueValuesFor(indexName) if x is not None]
-        keywords.sort(key=lambda x: x.lower())
+        try:
+            index = catalog._catalog.getIndex(indexName)
+        except KeyError:
+            return False
+        getLexicon = getattr(index, "getLexicon", None)
+        rid = catalog.getrid("/".join(obj.getPhysicalPath()))
+        if getLexicon is None or rid is None:
+            return True
+        try:
+            indexed = set(index.index.get_words(rid))
+        except KeyError:
+            return True
+        lexicon = getLexicon()
+        wids = [wid for k in keywords for wid in lexicon.termToWordIds(to_str(k))]
+        if not wids:
+            # only stop words, we cannot tell
+            return True
+        return not indexed.isdisjoint(wids)
+
+    def _timedReindex(self, obj, idxs, stats):
+        catalog = api.portal.get_tool("portal_catalog")
+        timings = stats.setdefault("reindex", {})
+        for i, name in enumerate(idxs):
+            start = time.perf_counter()
+            # metadata is updated only once, along with the first index
+            catalog.reindexObject(obj, idxs=[name], update_metadata=i == 0)
+            processQueue()
+            timings[name] = timings.get(name, 0.0) + time.perf_counter() - start
+
+    def _count(self, stats, key, name):
+        if stats is not None:
+            counts = stats.setdefault(key, {})
+            counts[name] = counts.get(name, 0) + 1
 
-        # can we turn this into a yield?
+    @security.protected(config.MANAGE_KEYWORDS_PERMISSION)
+    def getKeywords(
+        self,
+        indexName="Subject",
+        sort_on="keyword",
+        reverse=False,
+        prefix=None,
+        context=None,
+    ):
+        """Returns the keywords of the index sorted case-insensitively, or
+        with ``sort_on="count"`` by the number of objects using them.
+
+        The sorted lists are cached until the index changes, see
+        getKeywordSequence().
+        """
+        timing = Timing("getKeywords", indexName)
+        sequence = self._keywordSequence(
+            indexName, sort_on, reverse, prefix, context, timing
+        )
+        start = time.perf_counter()
+        keywords = list(sequence)
+        timing.add("list", start)
+        timing.count("keywords", len(keywords))
+        timing.notify()
         return keywords
 
-    def getKeywordLength(self, key, indexName="Subject"):
+    @security.protected(config.MANAGE_KEYWORDS_PERMISSION)
+    def getKeywordSequence(
+        self,
+        indexName="Subject",
+        sort_on="keyword",
+        reverse=False,
+        prefix=None,
+        context=None,
+    ):
+        """Like getKeywords() but returns a lazy sequence reading the cached
+        list, a page of it only reads the keywords of the page.
+
+        With ``prefix`` only the keywords starting with it, ignoring case,
+        are listed. They are found by bisection in keyword order, sorted by
+        count they are filtered from the whole list.
+
+        With a ``context`` other than the portal only the keywords of the
+        objects below it are listed, see scope.scoped_keywords().
+        """
+        timing = Timing("getKeywords", indexName)
+        sequence = self._keywordSequence(
+            indexName, sort_on, reverse, prefix, context, timing
+        )
+        timing.count("keywords", len(sequence))
+        timing.notify()
+        return sequence
+
+    def _keywordSequence(self, indexName, sort_on, reverse, prefix, context, timing):
+        start = time.perf_counter()
+        index = self._getIndex(indexName)
+        path = scope_path(context)
+        start = timing.add("index", start)
+        if sort_on == "count":
+            if path is None:
+                keywords = keywords_by_count(index, reverse=reverse)
+            else:
+                keywords = count_order(scoped_keywords(index, path), reverse)
+            start = timing.add("sort", start)
+            if prefix:
+                prefix = prefix.lower()
+                keywords = tuple(k for k in keywords if k.lower().startswith(prefix))
+                timing.add("prefix", start)
+            return KeywordSequence(keywords)
+        if sort_on != "keyword":
+            raise ValueError(f"Cannot sort keywords on {sort_on}")
+        if path is None:
+            keywords = sorted_keywords(index)
+        else:
+            keywords = scoped_keywords(index, path).keywords
+        start = timing.add("sort", start)
+        if prefix:
+            bounds = prefix_bounds(keywords, prefix)
+            timing.add("prefix", start)
+        else:
+            bounds = (0, None)
+        return KeywordSequence(keywords, *bounds, reverse)
+
+    @security.protected(config.MANAGE_KEYWORDS_PERMISSION)
+    def getInitials(self, indexName="Subject", context=None):
+        """Returns the lowercased first characters of the keywords of the
+        index, in keyword order."""
+        return initials(self.getKeywordSequence(indexName, context=context).keywords)
+
+    def _getIndex(self, indexName):
         processQueue()
         if indexName not in self.getKeywordIndexes():
             raise ValueError(f"{indexName} is not a valid field")
 
         catalog = api.portal.get_tool("portal_catalog")
-        idx = catalog._catalog.getIndex(indexName)
+        return catalog._catalog.getIndex(indexName)
 
-        try:
-            val = idx._index[key]
-        except KeyError:
-            count = 0
-        else:
-            count = len(val)
+    @security.protected(config.MANAGE_KEYWORDS_PERMISSION)
+    def getKeywordCounts(self, indexName="Subject", keywords=None, context=None):
+        """Returns a mapping of the number of objects per keyword.
 
-        return count
+        Without ``keywords`` all keywords of the index are counted in a
+        single pass, the result is cached until the index changes and
+        returned as a read-only mapping, not copied for every call.
+
+        With a ``context`` other than the portal only the objects below it
+        are counted, the counts are cached for the request.
+        """
+        index = self._getIndex(indexName)
+        path = scope_path(context)
+        if path is not None:
+            counts = scoped_keywords(index, path).counts
+            if keywords is None:
+                return MappingProxyType(counts)
+            return {keyword: counts.get(keyword, 0) for keyword in keywords}
+        if keywords is None:
+            return MappingProxyType(keyword_counts(index))
+        counts = {}
+        for keyword in keywords:
+            row = index._index.get(keyword)
+            counts[keyword] = 0 if row is None else row_length(row)
+        return counts
+
+    def getKeywordLength(self, key, indexName="Subject", context=None):
+        return self.getKeywordCounts(indexName, [key], context)[key]
+
+    @security.protected(config.MANAGE_KEYWORDS_PERMISSION)
+    def getDuplicateKeywords(self, indexName="Subject"):
+        """Returns the groups of keywords of the index that only differ in
+        case, accents, whitespace or trailing punctuation, see
+        duplicates.duplicate_groups().
+        """
+        index = self._getIndex(indexName)
+
+        def total(keywords):
+            # objects using several keywords of a group are counted once
+            # multiunion takes the int rows of keywords used once as they are
+            return len(multiunion([index._index[k] for k in keywords]))
+
+        return duplicate_groups(sorted_keywords(index), keyword_counts(index), total)
 
     @security.protected(config.MANAGE_KEYWORDS_PERMISSION)
     def getScoredMatches(self, word, possibilities, num, score, context=None):
@@ -161,34 +798,105 @@ class KeywordManager:
         compare it to a list of possibilities,
         return max. num matches > score).
         """
-        if not USE_LEVENSHTEIN:
-            # No levenshtein module around. Fall back to difflib
-            return difflib.get_close_matches(word, possibilities, num, score)
+        timing = Timing("getScoredMatches")
+        start = time.perf_counter()
+        scorer = Scorer(possibilities)
+        start = timing.add("prepare", start)
+        matches = scorer.score(word, score)
+        timing.add("score", start)
+        timing.count("candidates", len(scorer))
+        timing.count("matches", len(matches))
+        timing.notify()
+        # Return first n terms without scores
+        return [item[1] for item in matches[:num]]
 
-        # Levenshtein is around, so let's use it.
-        res = []
+    def scoreMatches(self, word, possibilities, score):
+        """Returns (score, match) tuples for the possibilities scoring
+        better than score, best matches first.
+        """
+        return Scorer(possibilities).score(word, score)
 
-        for item in possibilities:
-            if word.lower() in item.lower():
-                # if the word is a substring always include it
-                lscore = 1
-            else:
-                lscore = Levenshtein.ratio(word, item)
+    def scoreManyMatches(self, words, possibilities, score, num=None):
+        """Returns a dict of the (score, match) tuples of each word, like
+        scoreMatches(), with at most num tuples per word. The possibilities
+        are prepared once for all words.
+        """
+        return Scorer(possibilities).score_many(words, score, num)
 
-            if lscore > score:
-                res.append((lscore, item))
+    @security.protected(config.MANAGE_KEYWORDS_PERMISSION)
+    def searchKeywords(
+        self, word, indexName="Subject", num=100000, score=0.5, context=None
+    ):
+        """Returns the keywords of the index matching ``word``, see
+        getScoredMatches().
+
+        If the trigram vocabulary of the index has been built, only the
+        keywords sharing enough trigrams with ``word`` are scored. With a
+        ``context`` only the keywords used below it are searched.
+        """
+        index = self._getIndex(indexName)
+        path = scope_path(context)
+        if path is None:
+            keywords = sorted_keywords(index)
+            used = index._index
+        else:
+            scoped = scoped_keywords(index, path)
+            keywords, used = scoped.keywords, scoped.counts
+        vocabulary = get_vocabulary(indexName)
+        if vocabulary is None or len(word) < 3:
+            possibilities = keywords
+        else:
+            # the vocabulary may still list keywords which are not used anymore
+            possibilities = [
+                keyword for keyword in vocabulary.candidates(word) if keyword in used
+            ]
+        return self.getScoredMatches(word, possibilities, num, score)
 
-        # Sort by score and alphabet (high scores on top of list)
-        res.sort(reverse=True)
+    @security.protected(config.MANAGE_KEYWORDS_PERMISSION)
+    def getSimilarKeywords(self, keyword, indexName="Subject", num=None):
+        """Returns the keywords of the whole index most similar to keyword,
+        as precomputed in its vocabulary. Returns None if the vocabulary of
+        the index has not been built.
+        """
+        vocabulary = get_vocabulary(indexName)
+        if vocabulary is None:
+            return None
+        index = self._getIndex(indexName)
+        similar = [
+            other
+            for lscore, other in vocabulary.similar.get(keyword, ())
+            if other in index._index
+        ]
+        return similar[:num]
 
-        # Return first n terms without scores
-        return [item[1] for item in res[:num]]
+    @security.protected(config.MANAGE_KEYWORDS_PERMISSION)
+    def getKeywordsState(self, indexName="Subject", similar=False):
+        """Identifies the committed state of the keywords of an index, and
+        with ``similar`` of their similar keywords, as a tuple of (counter,
+        serial) pairs, see cache.index_state(). Returns None if it is not
+        known, e.g. while the current transaction changes the index.
+        """
+        state = index_state(self._getIndex(indexName))
+        if state is None:
+            return None
+        vocabulary = get_vocabulary(indexName) if similar else None
+        if vocabulary is None:
+            # without a vocabulary there are no similar keywords
+            return (state,)
+        other = vocabulary.state()
+        if other is None:
+            return None
+        return (state, other)
 
     def getKeywordIndexes(self):
         """Gets a list of indexes from the catalog. Uses config.py to choose the
         meta type and filters out a subset of known indexes that should not be
         managed.
         """
+        return list(self._getKeywordIndexes())
+
+    @request_memoize
+    def _getKeywordIndexes(self):
         catalog = api.portal.get_tool("portal_catalog")
         idxs = catalog.index_objects()
         idxs = [
@@ -197,75 +905,62 @@ class KeywordManager:
             if i.meta_type == config.META_TYPE and i.id not in config.IGNORE_INDEXES
         ]
         idxs.sort()
-        return idxs
+        return tuple(idxs)
 
     @security.private
+    @request_memoize
     def fieldNameForIndex(self, indexName):
         """The name of the index may not be the same as the field on the object, and we need
         the actual field name in order to find its mutator.
         """
         catalog = api.portal.get_tool("portal_catalog")
-        indexObjs = [idx for idx in catalog.index_objects() if idx.getId() == indexName]
         try:
-            fieldName = indexObjs[0].indexed_attrs[0]
+            index = catalog._catalog.getIndex(indexName)
+        except KeyError:
+            raise ValueError(f"Found no index named {indexName}")
+        try:
+            fieldName = index.indexed_attrs[0]
         except IndexError:
             raise ValueError(f"Found no index named {indexName}")
 
         return fieldName
 
+    @security.private
+    def getAccessor(self, obj, indexName):
+        """Gets the IKeywordFieldAccessor for the field behind indexName.
+
+        The IKeywordFieldStrategy adapter of obj is asked once per class and
+        portal_type within a request, the accessor it returns is reused for
+        every other object of that kind. Returns None if the field cannot
+        be written.
+        """
+        base = aq_base(obj)
+        key = (base.__class__, getattr(base, "portal_type", None), indexName)
+        accessors = request_cache("accessors")
+        try:
+            return accessors[key]
+        except KeyError:
+            pass
+        strategy = queryAdapter(obj, IKeywordFieldStrategy)
+        accessor = None
+        if strategy is not None:
+            accessor = strategy.accessor(indexName, self.fieldNameForIndex(indexName))
+        accessors[key] = accessor
+        return accessor
+
     @security.private
     def getSetter(self, obj, indexName):
         """Gets the setter function for the field based on the index name.
 
         Returns None if it can't get the function
         """
-
-        # DefaultDublinCoreImpl:
-        setterName = "set" + indexName
-        if getattr(aq_base(obj), setterName, None) is not None:
-            return getattr(obj, setterName)
-
-        # other
-        fieldName = self.fieldNameForIndex(indexName)
-        field = None
-
-        # Dexterity
-        if IDexterityContent.providedBy(obj):
-            if fieldName.startswith("get"):
-                fieldName = fieldName.lstrip("get_")
-            # heuristics
-            fieldName = fieldName[0].lower() + fieldName[1:]
-            return lambda value: setattr(aq_base(obj), fieldName, value)
-
-        # Always reindex discussion objects, since their values
-        # # will have been acquired
-        if IComment.providedBy(obj):
-            return lambda value: None
-
-        # Anything left is maybe AT content
-        field = getattr(aq_base(obj), "getField", None)
-        # Archetypes:
-        if field:
-            fieldObj = field(fieldName) or field(fieldName.lower())
-            if not fieldObj and fieldName.startswith("get"):
-                fieldName = fieldName.lstrip("get_")
-                fieldName = fieldName[0].lower() + fieldName[1:]
-                fieldObj = obj.getField(fieldName)
-            if fieldObj is not None:
-                return fieldObj.getMutator(obj)
+        accessor = self.getAccessor(obj, indexName)
+        if accessor is None:
             return None
-
-        return None
+        return functools.partial(accessor.set, obj)
 
     def getFieldValue(self, obj, indexName):
-        fieldName = self.fieldNameForIndex(indexName)
-        fieldVal = getattr(obj, fieldName, ())
-        if not fieldVal and fieldName.startswith("get"):
-            fieldName = fieldName.lstrip("get_")
-            fieldName = fieldName[0].lower() + fieldName[1:]
-            fieldVal = getattr(obj, fieldName, ())
-
-        if callable(fieldVal):
-            return fieldVal()
-        else:
-            return fieldVal
+        accessor = self.getAccessor(obj, indexName)
+        if accessor is not None:
+            return accessor.get(obj)
+        return getFieldValue(obj, self.fieldNameForIndex(indexName))
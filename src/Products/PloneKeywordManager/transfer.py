@@ -0,0 +1,160 @@
+"""Exports and imports keywords as streams, in constant memory whatever the
+size of the vocabulary.
+"""
+
+from plone import api
+from Products.CMFCore.indexing import processQueue
+from Products.PloneKeywordManager import config
+from Products.PloneKeywordManager.cache import row_length
+from Products.PloneKeywordManager.interfaces import IKeywordManager
+from zope.component import getUtility
+
+import csv
+import io
+import itertools
+import json
+
+CARRIER_ID = "keywords"
+
+
+def export_rows(indexNames):
+    """Yields (keyword, index, count) for the keywords of the indexes,
+    reading the indexes bucket by bucket.
+    """
+    processQueue()
+    catalog = api.portal.get_tool("portal_catalog")
+    for indexName in indexNames:
+        index = catalog._catalog.getIndex(indexName)
+        for i, (keyword, row) in enumerate(index._index.items()):
+            if keyword is None:
+                continue
+            yield keyword, indexName, row_length(row)
+            if i and i % config.BATCH_SIZE == 0:
+                # drop the buckets read so far from the cache
+                catalog._p_jar.cacheGC()
+
+
+def export_chunks(indexNames, format="csv", size=None):
+    """Yields the export of the indexes as text chunks of about ``size``
+    rows, by default config.BATCH_SIZE. ``format`` is "csv" or "jsonl".
+    """
+    if size is None:
+        size = config.BATCH_SIZE
+    rows = export_rows(indexNames)
+    if format == "csv":
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(("keyword", "index", "count"))
+    elif format != "jsonl":
+        raise ValueError(f"Unknown format {format}")
+    while True:
+        chunk = list(itertools.islice(rows, size))
+        if format == "csv":
+            writer.writerows(chunk)
+            text = buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+        else:
+            text = "".join(
+                json.dumps({"keyword": k, "index": i, "count": c}) + "\n"
+                for k, i, c in chunk
+            )
+        if text:
+            yield text
+        if len(chunk) < size:
+            break
+
+
+def _carrier(portal, number):
+    cid = CARRIER_ID if number == 1 else f"{CARRIER_ID}-{number}"
+    doc = portal.get(cid)
+    if doc is None:
+        doc = api.content.create(
+            container=portal, type="Document", id=cid, title="Subjects"
+        )
+        doc.exclude_from_nav = True
+    return doc
+
+
+def _carry(portal, keywords, size):
+    number = 1
+    while keywords:
+        doc = _carrier(portal, number)
+        subject = list(doc.Subject())
+        room = size - len(subject)
+        if room > 0:
+            doc.setSubject(subject + keywords[:room])
+            doc.reindexObject()
+            keywords = keywords[room:]
+        number += 1
+    processQueue()
+
+
+def iter_keywords(lines, format="txt"):
+    """Yields the keywords of ``lines``, an iterable of text lines such as
+    an open file. ``format`` is "txt" for one keyword per line, or "csv" and
+    "jsonl" as written by export_chunks().
+    """
+    if format == "csv":
+        for i, row in enumerate(csv.reader(lines)):
+            if row and not (i == 0 and row[0] == "keyword"):
+                yield row[0]
+    elif format == "jsonl":
+        for line in lines:
+            if line.strip():
+                yield json.loads(line)["keyword"]
+    else:
+        for line in lines:
+            yield line.rstrip("\r\n")
+
+
+def import_keywords(portal, keywords, size=None):
+    """Makes sure the keywords, an iterable, exist in the Subject index.
+
+    The keywords which are not used yet are added to "carrier" documents
+    named keywords, keywords-2, ..., each of them using at most ``size``
+    keywords, by default config.IMPORT_CHUNK. Returns the number of keywords
+    added.
+    """
+    if size is None:
+        size = config.IMPORT_CHUNK
+    processQueue()
+    catalog = api.portal.get_tool("portal_catalog")
+    index = catalog._catalog.getIndex("Subject")
+    added = 0
+    pending = []
+    seen = set()
+    for keyword in keywords:
+        keyword = keyword.strip()
+        if not keyword or keyword in seen or keyword in index._index:
+            continue
+        pending.append(keyword)
+        seen.add(keyword)
+        if len(pending) >= size:
+            _carry(portal, pending, size)
+            added += len(pending)
+            pending = []
+            seen = set()
+    if pending:
+        _carry(portal, pending, size)
+        added += len(pending)
+    return added
+
+
+def apply_rules(rules, context=None, indexName="Subject", size=None):
+    """Applies the (old, new) ``rules``, an iterable, in chunks of ``size``
+    rules, by default config.BATCH_SIZE, see KeywordManager.applyRules().
+
+    Rules are only applied together within a chunk. Returns the number of
+    objects updated.
+    """
+    if size is None:
+        size = config.BATCH_SIZE
+    pkm = getUtility(IKeywordManager)
+    rules = iter(rules)
+    count = 0
+    while True:
+        chunk = dict(itertools.islice(rules, size))
+        if not chunk:
+            return count
+        count += pkm.applyRules(chunk, context=context, indexName=indexName)
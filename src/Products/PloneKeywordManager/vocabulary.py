@@ -0,0 +1,335 @@
+"""A trigram index over the keywords of the keyword indexes.
+
+Fuzzy searches used to score every keyword of an index. The vocabulary of
+an index maps each trigram to the keywords containing it, so a search only
+scores the keywords sharing enough trigrams with the search string.
+
+The vocabulary also keeps the most similar keywords of each keyword, so
+similar keywords can be shown for the whole index without scoring them on
+every page.
+
+Keywords are added as content is indexed, without writing the vocabulary
+object itself, so concurrent edits adding keywords do not conflict. Their
+similar keywords are left to the background worker, saving content does
+not pay for scoring them, see update_vocabularies(). The worker also
+removes the keywords which are not used anymore, until then searches skip
+them.
+"""
+
+from BTrees.IIBTree import IIBucket
+from BTrees.IIBTree import IITreeSet
+from BTrees.IIBTree import weightedUnion
+from BTrees.IOBTree import IOBTree
+from BTrees.Length import Length
+from BTrees.OIBTree import OIBTree
+from BTrees.OOBTree import OOBTree
+from persistent import Persistent
+from plone import api
+from Products.CMFCore.interfaces import IIndexableObject
+from Products.CMFCore.interfaces import IIndexQueueProcessor
+from Products.PloneKeywordManager import config
+from Products.PloneKeywordManager import logger
+from Products.PloneKeywordManager.cache import counter_state
+from Products.PloneKeywordManager.interfaces import IKeywordManager
+from Products.PloneKeywordManager.storage import get_storage
+from Products.PloneKeywordManager.storage import query_storage
+from zope.component import getUtility
+from zope.component import queryMultiAdapter
+from zope.interface import implementer
+
+import random
+import transaction
+
+VOCABULARIES = "vocabularies"
+# (index, keyword) of the keywords waiting to be linked
+UNLINKED = "unlinked"
+
+
+def trigrams(keyword):
+    """The set of trigrams of the lowercased keyword, padded to also have
+    trigrams for its start and end.
+    """
+    padded = f"  {keyword.lower()} "
+    return {padded[i : i + 3] for i in range(len(padded) - 2)}
+
+
+class KeywordVocabulary(Persistent):
+    # counts the changes of the similar keywords, see state()
+    changes = None
+
+    def __init__(self):
+        self.ids = OIBTree()
+        self.terms = IOBTree()
+        self.grams = OOBTree()
+        self.length = Length()
+        # keyword -> ((score, keyword), ...), most similar first
+        self.similar = OOBTree()
+        self.changes = Length()
+
+    def __len__(self):
+        return self.length()
+
+    def __contains__(self, keyword):
+        return keyword in self.ids
+
+    def state(self):
+        """Identifies the committed state of the similar keywords like
+        cache.index_state(). Returns None if it is not known."""
+        if self.changes is None:
+            # built before the changes were counted
+            return None
+        return counter_state(self.changes)
+
+    def _changed(self):
+        if self.changes is not None:
+            self.changes.change(1)
+
+    def _new_id(self):
+        # Like the record ids of ZCatalog: random ids, then consecutive ones
+        # in this process. Transactions adding keywords concurrently write
+        # different keys of the BTrees, which their conflict resolution
+        # merges, instead of all incrementing a counter.
+        term_id = getattr(self, "_v_next_id", None)
+        while term_id is None or term_id in self.terms:
+            term_id = random.randint(-(2**31), 2**31 - 2)
+        self._v_next_id = term_id + 1
+        return term_id
+
+    def add(self, keyword):
+        if keyword in self.ids:
+            return False
+        term_id = self._new_id()
+        self.ids[keyword] = term_id
+        self.terms[term_id] = keyword
+        for gram in trigrams(keyword):
+            ids = self.grams.get(gram)
+            if ids is None:
+                ids = self.grams[gram] = IITreeSet()
+            ids.insert(term_id)
+        self.length.change(1)
+        return True
+
+    def remove(self, keyword):
+        term_id = self.ids.pop(keyword, None)
+        if term_id is None:
+            return False
+        del self.terms[term_id]
+        if self.similar.pop(keyword, None) is not None:
+            self._changed()
+        for gram in trigrams(keyword):
+            ids = self.grams.get(gram)
+            if ids is not None:
+                ids.remove(term_id)
+                if not ids:
+                    del self.grams[gram]
+        self.length.change(-1)
+        return True
+
+    def prune(self, used, scorer):
+        """Removes the keywords not in ``used`` anymore and links again the
+        keywords which listed one of them as similar, so they get other
+        similar keywords in their place. Returns the removed keywords.
+        """
+        removed = [keyword for keyword in self.ids.keys() if keyword not in used]
+        for keyword in removed:
+            self.remove(keyword)
+        if removed:
+            gone = set(removed)
+            relink = [
+                keyword
+                for keyword, similar in self.similar.items()
+                if any(other in gone for lscore, other in similar)
+            ]
+            for keyword in relink:
+                self.link(keyword, scorer)
+        return removed
+
+    def candidates(self, word, similarity=None):
+        """Returns the keywords that contain ``word`` or share enough
+        trigrams with it to be worth scoring.
+
+        Two keywords are similar enough if the Dice coefficient of their
+        trigram sets reaches ``similarity``, by default
+        config.TRIGRAM_SIMILARITY.
+        """
+        if similarity is None:
+            similarity = config.TRIGRAM_SIMILARITY
+        grams = trigrams(word)
+        word = word.lower()
+        counts = IIBucket()
+        for gram in grams:
+            ids = self.grams.get(gram)
+            if ids is not None:
+                counts = weightedUnion(counts, ids)[1]
+
+        result = []
+        for term_id, shared in counts.items():
+            term = self.terms[term_id]
+            # a keyword has at most len(term) + 1 distinct trigrams
+            if 2.0 * shared / (len(grams) + len(term) + 1) >= similarity:
+                result.append(term)
+            elif word in term.lower():
+                result.append(term)
+        return result
+
+    def link(self, keyword, scorer, size=None, score=None):
+        """Stores the keywords most similar to keyword, and keyword as one
+        of the most similar keywords of those.
+
+        ``scorer`` is KeywordManager.scoreMatches(). At most ``size``
+        keywords scoring better than ``score`` are kept, by default
+        config.SIMILAR_KEYWORDS and config.SIMILARITY_SCORE.
+        """
+        if size is None:
+            size = config.SIMILAR_KEYWORDS
+        if score is None:
+            score = config.SIMILARITY_SCORE
+        candidates = [c for c in self.candidates(keyword) if c != keyword]
+        matches = tuple(scorer(keyword, candidates, score)[:size])
+        self.similar[keyword] = matches
+        self._changed()
+        for lscore, other in matches:
+            current = self.similar.get(other, ())
+            if keyword in [k for s, k in current]:
+                continue
+            # scored the other way round, a keyword containing the other
+            # scores 1 only for the other
+            reverse = scorer(other, [keyword], score)
+            if not reverse:
+                continue
+            lscore = reverse[0][0]
+            if len(current) < size or lscore > current[-1][0]:
+                linked = sorted(current + ((lscore, keyword),), reverse=True)
+                self.similar[other] = tuple(linked[:size])
+
+
+def get_vocabulary(indexName):
+    """Returns the vocabulary of an index, None if it has not been built."""
+    vocabularies = query_storage(VOCABULARIES)
+    if vocabularies is None:
+        return None
+    return vocabularies.get(indexName)
+
+
+def build_vocabulary(indexName):
+    """(Re)builds the vocabulary of a keyword index.
+
+    The keywords are added at once, their similar keywords are left to
+    the background worker, which commits as it links them, see
+    update_vocabularies().
+    """
+    catalog = api.portal.get_tool("portal_catalog")
+    index = catalog._catalog.getIndex(indexName)
+    vocabulary = KeywordVocabulary()
+    unlinked = get_storage(UNLINKED)
+    for keyword in index.uniqueValues():
+        if isinstance(keyword, str):
+            vocabulary.add(keyword)
+            unlinked[(indexName, keyword)] = None
+    get_storage(VOCABULARIES)[indexName] = vocabulary
+    logger.info(
+        "Built vocabulary of %s with %d keywords, to be linked by the worker",
+        indexName,
+        len(vocabulary),
+    )
+    return vocabulary
+
+
+def build_vocabularies(context=None):
+    """Builds the vocabularies of all managed keyword indexes."""
+    for indexName in getUtility(IKeywordManager).getKeywordIndexes():
+        build_vocabulary(indexName)
+
+
+def update_vocabularies(limit=None):
+    """Removes the keywords not used anymore from the vocabularies, then
+    stores the similar keywords of the keywords added since the last run,
+    committing after every config.BATCH_SIZE keywords. Called by the
+    background worker. Returns the number of keywords that have been
+    linked.
+    """
+    vocabularies = query_storage(VOCABULARIES)
+    if not vocabularies:
+        return 0
+    scorer = getUtility(IKeywordManager).scoreMatches
+    catalog = api.portal.get_tool("portal_catalog")
+    for indexName, vocabulary in vocabularies.items():
+        index = catalog._catalog.indexes.get(indexName)
+        if index is not None:
+            removed = vocabulary.prune(index._index, scorer)
+            if removed:
+                logger.info(
+                    "Removed %d unused keywords from the vocabulary of %s",
+                    len(removed),
+                    indexName,
+                )
+    transaction.commit()
+
+    unlinked = query_storage(UNLINKED)
+    if not unlinked:
+        return 0
+    count = 0
+    for indexName, keyword in list(unlinked.keys()):
+        if limit is not None and count >= limit:
+            break
+        del unlinked[(indexName, keyword)]
+        vocabulary = get_vocabulary(indexName)
+        if vocabulary is not None and keyword in vocabulary:
+            vocabulary.link(keyword, scorer)
+        count += 1
+        if count % config.BATCH_SIZE == 0:
+            transaction.commit()
+    transaction.commit()
+    return count
+
+
+@implementer(IIndexQueueProcessor)
+class VocabularyQueueProcessor:
+    """Adds the keywords of indexed objects to the vocabularies and queues
+    them to be linked by update_vocabularies()."""
+
+    def _vocabularies(self):
+        try:
+            return query_storage(VOCABULARIES)
+        except (api.exc.CannotGetPortalError, TypeError):
+            # not within a Plone site
+            return None
+
+    def index(self, obj, attributes=None):
+        vocabularies = self._vocabularies()
+        if not vocabularies:
+            return
+        catalog = api.portal.get_tool("portal_catalog")
+        wrapper = queryMultiAdapter((obj, catalog), IIndexableObject)
+        if wrapper is None:
+            wrapper = obj
+        unlinked = None
+        for indexName, vocabulary in vocabularies.items():
+            if attributes and indexName not in attributes:
+                continue
+            index = catalog._catalog.indexes.get(indexName)
+            if index is None:
+                continue
+            for attr in index.getIndexSourceNames():
+                for keyword in index._get_object_keywords(wrapper, attr):
+                    # only write if the keyword is new
+                    if isinstance(keyword, str) and keyword not in vocabulary:
+                        vocabulary.add(keyword)
+                        if unlinked is None:
+                            unlinked = get_storage(UNLINKED)
+                        unlinked[(indexName, keyword)] = None
+
+    def reindex(self, obj, attributes=None, update_metadata=False):
+        self.index(obj, attributes)
+
+    def unindex(self, obj):
+        pass
+
+    def begin(self):
+        pass
+
+    def commit(self):
+        pass
+
+    def abort(self):
+        pass
@@ -0,0 +1,48 @@
+"""The ``keywords-worker`` script, running the keyword worker of a Plone site
+from cron without going through the web server::
+
+    bin/keywords-worker etc/zope.conf Plone
+
+It runs as the Zope system user, the queued operations still run as the
+users who queued them, see jobs.run_job().
+"""
+
+from AccessControl.SecurityManagement import newSecurityManager
+from AccessControl.SecurityManagement import noSecurityManager
+from AccessControl.users import system
+from Products.PloneKeywordManager.jobs import run_worker
+from Testing.makerequest import makerequest
+from Zope2.Startup.run import make_wsgi_app
+from zope.component.hooks import setSite
+from zope.globalrequest import setRequest
+
+import argparse
+import json
+import Zope2
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Runs the queued keyword operations of a Plone site"
+    )
+    parser.add_argument("zopeconf", help="path to zope.conf")
+    parser.add_argument("site", help="path of the Plone site, e.g. Plone")
+    parser.add_argument(
+        "--limit", type=int, default=None, help="maximum number of jobs to run"
+    )
+    args = parser.parse_args(argv)
+
+    make_wsgi_app({}, args.zopeconf)
+    app = makerequest(Zope2.app())
+    setRequest(app.REQUEST)
+    newSecurityManager(None, system)
+    try:
+        portal = app.unrestrictedTraverse(args.site)
+        setSite(portal)
+        for job in run_worker(limit=args.limit):
+            print(json.dumps(job.progress()))
+    finally:
+        setSite(None)
+        noSecurityManager()
+        setRequest(None)
+        app._p_jar.close()